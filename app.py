@@ -2,27 +2,40 @@
 import os
 import logging
 from datetime import datetime
-import traceback
-import io
+import json
+import uuid
+import queue
+import atexit
+import fcntl
+import hashlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
-from PIL import Image
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Data, File, Field, Epilogue
 from flask_cors import CORS
-import tensorflow as tf
+import metrics
+import structured_logging
+from frame_format import FrameError, parse_frame, frame_to_rgb, resize_pixels
+from image_decode import RESAMPLE_FILTER, open_image, resize_image  # noqa: F401 (RESAMPLE_FILTER : benchmarks)
 
-# Supprimer les messages verbeux de TensorFlow
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+# Instant de démarrage du processus (mesure du temps de démarrage)
+APP_START_TIME = time.time()
+
+# Supprimer les messages verbeux de TensorFlow (avant son import)
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
 
 # Configuration
 app = Flask(__name__)
 CORS(app)
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Logging (texte ou JSON, non bloquant : voir structured_logging.py)
+structured_logging.configure_logging()
 logger = logging.getLogger(__name__)
 
 # ═══════════════════════════════════════════════════════════
@@ -31,16 +44,176 @@ logger = logging.getLogger(__name__)
 BACKEND_URL = os.getenv('BACKEND_URL', 'https://backendagro.onrender.com')
 BACKEND_API_KEY = os.getenv('BACKEND_API_KEY', 'your-secret-key-changez-moi')
 SEND_TO_BACKEND = os.getenv('SEND_TO_BACKEND', 'true').lower() == 'true'
+BACKEND_TIMEOUT = float(os.getenv('BACKEND_TIMEOUT', '10'))
+
+# Envoi asynchrone des résultats au backend
+DELIVERY_ASYNC = os.getenv('DELIVERY_ASYNC', 'true').lower() == 'true'
+DELIVERY_QUEUE_SIZE = int(os.getenv('DELIVERY_QUEUE_SIZE', '1000'))
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', '2'))
+DELIVERY_MAX_RETRIES = int(os.getenv('DELIVERY_MAX_RETRIES', '5'))
+DELIVERY_BACKOFF_BASE = float(os.getenv('DELIVERY_BACKOFF_BASE', '0.5'))
+DELIVERY_SPILL_PATH = os.getenv('DELIVERY_SPILL_PATH', '')
+BACKEND_BULK = os.getenv('BACKEND_BULK', 'false').lower() == 'true'
+DELIVERY_BULK_SIZE = int(os.getenv('DELIVERY_BULK_SIZE', '20'))
 
 # Model configuration
 MODEL_PATH = os.getenv('MODEL_PATH', 'models/tomato_disease_model.h5')
+
+# Backend d'inférence : keras (.h5), tflite (float16) ou tflite-int8 (voir export_tflite.py)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras').lower()
+TFLITE_MODEL_PATH = os.getenv('TFLITE_MODEL_PATH', os.path.splitext(MODEL_PATH)[0] + '_fp16.tflite')
+TFLITE_INT8_MODEL_PATH = os.getenv('TFLITE_INT8_MODEL_PATH', os.path.splitext(MODEL_PATH)[0] + '_int8.tflite')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0')) or None
+
+# Pool de processus d'inférence partagé (voir inference_pool.py et gunicorn.conf.py)
+INFERENCE_POOL_ADDRESS = os.getenv('INFERENCE_POOL_ADDRESS', '')
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '0'))
+INFERENCE_POOL_ENABLED = bool(INFERENCE_POOL_ADDRESS) and INFERENCE_PROCESSES > 0
+MODEL_BACKEND_PATHS = {
+    'keras': MODEL_PATH,
+    'tflite': TFLITE_MODEL_PATH,
+    'tflite-int8': TFLITE_INT8_MODEL_PATH
+}
+MODEL_NAMES = {
+    'keras': 'tomato_disease_model',
+    'tflite': 'tomato_disease_model_tflite',
+    'tflite-int8': 'tomato_disease_model_tflite_int8'
+}
 MODEL_LOADED = False
 model = None
 
+# Registre de modèles versionnés : MODEL_REGISTRY_DIR/<version>/{metadata.json, model.h5, ...}
+MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'models/registry')
+MODEL_ACTIVE_FILE = os.path.join(MODEL_REGISTRY_DIR, 'ACTIVE')
+MODEL_VERSION = os.getenv('MODEL_VERSION', 'latest')
+# Variante servie par 'latest' (train.py variant_name) : une variante basse résolution
+# enregistrée plus récemment ne remplace pas le modèle de référence au redémarrage
+MODEL_VARIANT = os.getenv('MODEL_VARIANT', f"{os.getenv('IMAGE_SIZE', '224')}px")
+MODEL_PINNED_MAX = int(os.getenv('MODEL_PINNED_MAX', '2'))
+MODEL_REGISTRY_FOLLOW = os.getenv('MODEL_REGISTRY_FOLLOW', 'true').lower() == 'true'
+MODEL_ACTIVE_CHECK_INTERVAL = float(os.getenv('MODEL_ACTIVE_CHECK_INTERVAL', '5'))
+DEFAULT_MODEL_VERSION = 'default'
+DEMO_VERSION = 'demo'
+REGISTRY_ARTIFACTS = {
+    'keras': 'model.h5',
+    'tflite': 'model_fp16.tflite',
+    'tflite-int8': 'model_int8.tflite'
+}
+active_model = None
+pinned_models = OrderedDict()
+pinned_models_lock = threading.Lock()
+pinned_loading = {}  # version -> Future du chargement en cours (hors verrou)
+model_swap_lock = threading.Lock()
+model_swap_in_progress = threading.Lock()
+active_version_checked_at = 0.0
+# Liste du registre mise en cache : relue si le dossier change (mtime, vérifiée au plus toutes
+# les MODEL_ACTIVE_CHECK_INTERVAL secondes) ou à chaque rechargement du modèle
+registry_cache = {'versions': None, 'mtime': None, 'checked_at': 0.0}
+registry_cache_lock = threading.Lock()
+
+# Chargement du modèle : background (thread au démarrage), lazy (première requête) ou eager (bloquant)
+MODEL_LOAD_MODE = os.getenv('MODEL_LOAD_MODE', 'background').lower()
+MODEL_WAIT_TIMEOUT = float(os.getenv('MODEL_WAIT_TIMEOUT', '10'))
+MODEL_STATE = 'starting'  # starting | ready | degraded | failed
+model_ready = threading.Event()
+model_loader = None
+model_loader_lock = threading.Lock()
+
+# Mesures de démarrage (secondes depuis APP_START_TIME)
+STARTUP_TIMINGS = {
+    'model_load_seconds': None,
+    'time_to_ready_seconds': None,
+    'time_to_first_healthy_seconds': None,
+    'time_to_first_prediction_seconds': None
+}
+
 # Image configuration
-IMAGE_SIZE = (224, 224)
+# Taille d'entrée par défaut (W, H) ; chaque modèle impose la sienne (metadata input_size ou forme d'entrée)
+IMAGE_SIZE = (int(os.getenv('IMAGE_SIZE', '224')),) * 2
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Filtre de redimensionnement : RESAMPLE_FILTER (nearest, bilinear, bicubic, lanczos...), voir image_decode.py
+
+# Cache des prédictions (0 entrée = désactivé, distance -1 = pas de hash perceptuel)
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '1024'))
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv('PREDICTION_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', '600'))
+PREDICTION_CACHE_PHASH_DISTANCE = int(os.getenv('PREDICTION_CACHE_PHASH_DISTANCE', '-1'))
+
+# Micro-batching des requêtes /predict concurrentes
+MICRO_BATCHING = os.getenv('MICRO_BATCHING', 'true').lower() == 'true'
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '16'))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', '5'))
+
+# Contrôle d'admission : inférences simultanées bornées, file d'attente par voie (live = /predict,
+# /predict-frame ; bulk = lots), délais par requête (en-tête X-Deadline-Ms) ; 0 = désactivé
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', str(BATCH_MAX_SIZE)))
+ADMISSION_BULK_MAX_CONCURRENCY = int(os.getenv('ADMISSION_BULK_MAX_CONCURRENCY', str(max(1, ADMISSION_MAX_CONCURRENCY // 4))))
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '64'))
+ADMISSION_BULK_QUEUE_SIZE = int(os.getenv('ADMISSION_BULK_QUEUE_SIZE', '4'))
+REQUEST_DEADLINE_MS = float(os.getenv('REQUEST_DEADLINE_MS', '10000'))
+BULK_REQUEST_DEADLINE_MS = float(os.getenv('BULK_REQUEST_DEADLINE_MS', '60000'))
+
+# Test-time augmentation : off, adaptive (uniquement sous le seuil de confiance) ou always
+TTA_MODE = os.getenv('TTA_MODE', 'off').lower()
+TTA_CONFIDENCE_THRESHOLD = float(os.getenv('TTA_CONFIDENCE_THRESHOLD', '0.8'))
+TTA_AUGMENTATIONS = [name.strip() for name in os.getenv('TTA_AUGMENTATIONS', 'hflip,vflip,crop').split(',') if name.strip()]
+TTA_CROP_FRACTION = float(os.getenv('TTA_CROP_FRACTION', '0.875'))
+tta_counts = {'images': 0, 'augmented': 0, 'changed': 0}
+tta_counts_lock = threading.Lock()
+
+# État par capteur : saut de l'inférence si la scène n'a pas changé + lissage temporel (0 capteur = désactivé)
+SENSOR_STATE_SIZE = int(os.getenv('SENSOR_STATE_SIZE', '1024'))
+SENSOR_CHANGE_THRESHOLD = float(os.getenv('SENSOR_CHANGE_THRESHOLD', '0.02'))
+SENSOR_HISTOGRAM_THRESHOLD = float(os.getenv('SENSOR_HISTOGRAM_THRESHOLD', '0.05'))
+SENSOR_MAX_REUSE_SECONDS = float(os.getenv('SENSOR_MAX_REUSE_SECONDS', '900'))
+SENSOR_SMOOTHING_WINDOW = int(os.getenv('SENSOR_SMOOTHING_WINDOW', '5'))
+SENSOR_SKIP_BACKEND_UNCHANGED = os.getenv('SENSOR_SKIP_BACKEND_UNCHANGED', 'true').lower() == 'true'
+
+# Limites du streaming /predict-batch/stream
+MAX_BATCH_BYTES = int(os.getenv('MAX_BATCH_BYTES', str(200 * 1024 * 1024)))
+MAX_BATCH_IMAGES = int(os.getenv('MAX_BATCH_IMAGES', '500'))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Traitement des lots /predict-batch
+PREDICT_CHUNK_SIZE = int(os.getenv('PREDICT_CHUNK_SIZE', '32'))
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', str(min(8, os.cpu_count() or 1))))
+decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+# Buffers de prétraitement réutilisés par thread
+_thread_buffers = threading.local()
+
+# ═══════════════════════════════════════════════════════════
+# MÉTRIQUES (/metrics, format Prometheus, voir metrics.py)
+# ═══════════════════════════════════════════════════════════
+REQUEST_LATENCY = metrics.Histogram(
+    'tomato_request_duration_seconds', 'Durée des requêtes HTTP', ('endpoint', 'method', 'status'))
+DECODE_LATENCY = metrics.Histogram('tomato_image_decode_seconds', "Décodage de l'image (JPEG draft + RGB)")
+RESIZE_LATENCY = metrics.Histogram('tomato_image_resize_seconds', "Redimensionnement de l'image")
+INFERENCE_LATENCY = metrics.Histogram('tomato_inference_seconds', 'Appel au modèle pour un lot', ('backend',))
+INFERENCE_BATCH_SIZE = metrics.Histogram(
+    'tomato_inference_batch_size', 'Images par appel au modèle', buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BACKEND_LATENCY = metrics.Histogram(
+    'tomato_backend_delivery_seconds', 'Envoi HTTP au backend Node.js', ('path', 'outcome'))
+IMAGE_BYTES = metrics.Histogram('tomato_image_bytes', 'Taille des images reçues (octets)', buckets=metrics.SIZE_BUCKETS)
+PREDICTIONS_TOTAL = metrics.Counter('tomato_predictions_total', 'Prédictions par classe', ('class', 'mode'))
+DEMO_PREDICTIONS_TOTAL = metrics.Counter('tomato_demo_predictions_total', 'Prédictions simulées (mode démo)')
+ERRORS_TOTAL = metrics.Counter('tomato_errors_total', 'Erreurs par endpoint et type', ('endpoint', 'type'))
+TTA_LATENCY = metrics.Histogram('tomato_tta_seconds', "Appel modèle supplémentaire des vues augmentées (TTA)")
+TTA_IMAGES_TOTAL = metrics.Counter(
+    'tomato_tta_images_total', 'Images par issue TTA (early_exit, augmented, changed)', ('outcome',))
+ADMISSION_QUEUE_WAIT = metrics.Histogram(
+    'tomato_admission_queue_wait_seconds', "Attente avant admission dans le chemin d'inférence", ('lane',))
+ADMISSION_REJECTIONS_TOTAL = metrics.Counter(
+    'tomato_admission_rejections_total', 'Requêtes refusées (queue_full = 429, deadline = 503)', ('lane', 'reason'))
+SENSOR_FRAMES_TOTAL = metrics.Counter(
+    'tomato_sensor_frames_total', 'Trames des capteurs suivis (unchanged = inférence évitée)', ('outcome',))
+
+# Session HTTP partagée (connexions keep-alive vers le backend)
+backend_session = requests.Session()
+backend_session.mount('https://', HTTPAdapter(pool_maxsize=DELIVERY_WORKERS + DECODE_WORKERS))
+backend_session.mount('http://', HTTPAdapter(pool_maxsize=DELIVERY_WORKERS + DECODE_WORKERS))
+
 # ═══════════════════════════════════════════════════════════
 # DICTIONNAIRE DES MALADIES (TOMATOES - ALIGNÉ AVEC MODÈLE)
 # ═══════════════════════════════════════════════════════════
@@ -147,173 +320,773 @@ ARROSAGE_CLASSES = [
 # CHARGEMENT DU MODÈLE
 # ═══════════════════════════════════════════════════════════
 
-def load_model():
-    """Charge le modèle TensorFlow/Keras"""
-    global model, MODEL_LOADED
+def import_tensorflow():
+    """Importe TensorFlow à la demande (plusieurs secondes : jamais à l'import du module)"""
+    import tensorflow as tf
+    return tf
+
+def load_tflite_interpreter():
+    """Retourne la classe Interpreter TFLite (tflite_runtime si installé, sinon TensorFlow)"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        Interpreter = import_tensorflow().lite.Interpreter
+    return Interpreter
+
+class TFLiteModel:
+    """
+    Modèle TFLite exposant la même interface predict() que Keras
+    Gère les entrées/sorties quantifiées (int8/uint8) et les lots de taille variable
+    """
+    
+    def __init__(self, path, num_threads=None):
+        Interpreter = load_tflite_interpreter()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.interpreter.allocate_tensors()
+        self.allocated_batch = int(self.input['shape'][0])
+        # L'interpréteur n'est pas thread-safe
+        self.lock = threading.Lock()
+    
+    def _quantize(self, x):
+        scale, zero_point = self.input['quantization']
+        if np.issubdtype(self.input['dtype'], np.integer) and scale:
+            x = np.round(x / scale + zero_point)
+        return x.astype(self.input['dtype'])
     
+    def _dequantize(self, y):
+        scale, zero_point = self.output['quantization']
+        if np.issubdtype(self.output['dtype'], np.integer) and scale:
+            return (y.astype(np.float32) - zero_point) * scale
+        return y
+    
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x)
+        chunk = batch_size or len(x)
+        outputs = []
+        
+        with self.lock:
+            for start in range(0, len(x), chunk):
+                part = x[start:start + chunk]
+                if len(part) != self.allocated_batch:
+                    self.interpreter.resize_tensor_input(self.input['index'], [len(part), *self.input['shape'][1:]])
+                    self.interpreter.allocate_tensors()
+                    self.allocated_batch = len(part)
+                
+                self.interpreter.set_tensor(self.input['index'], self._quantize(part))
+                self.interpreter.invoke()
+                outputs.append(self._dequantize(self.interpreter.get_tensor(self.output['index'])))
+        
+        return np.concatenate(outputs)
+
+def model_input_size(loaded, metadata):
+    """
+    Taille d'entrée (W, H) d'un modèle : metadata input_size du registre ([H, W] comme IMG_SIZE
+    de train.py), sinon forme d'entrée du modèle Keras/TFLite, sinon IMAGE_SIZE
+    """
+    if metadata.get('input_size'):
+        height, width = metadata['input_size']
+        return (int(width), int(height))
+    if isinstance(loaded, TFLiteModel):
+        shape = loaded.input['shape']
+    else:
+        shape = getattr(loaded, 'input_shape', None)
+    if shape is not None and len(shape) == 4 and shape[1] and shape[2]:
+        return (int(shape[2]), int(shape[1]))
+    return IMAGE_SIZE
+
+class LoadedModel:
+    """Modèle chargé et sa version (référence échangée atomiquement lors d'un rechargement)"""
+    
+    def __init__(self, version, model, metadata, path):
+        self.version = version
+        self.model = model
+        self.metadata = metadata
+        self.path = path
+        self.input_size = model_input_size(model, metadata)
+        self.loaded_at = datetime.now().isoformat()
+    
+    @property
+    def name(self):
+        """Valeur du champ modelUsed des prédictions"""
+        return f"{MODEL_NAMES.get(INFERENCE_BACKEND, INFERENCE_BACKEND)}@{self.version}"
+    
+    def describe(self):
+        return {
+            'version': self.version,
+            'name': self.name,
+            'path': self.path,
+            'input_size': list(self.input_size),
+            'variant': self.metadata.get('variant'),
+            'loaded_at': self.loaded_at
+        }
+
+class ModelArtifactMissing(FileNotFoundError):
+    """Version du registre sans artefact pour INFERENCE_BACKEND (export TFLite non fait)"""
+
+def registry_mtime():
     try:
-        if os.path.exists(MODEL_PATH):
-            logger.info(f"📦 Chargement du modèle depuis {MODEL_PATH}")
-            model = tf.keras.models.load_model(MODEL_PATH)
+        return os.stat(MODEL_REGISTRY_DIR).st_mtime_ns
+    except OSError:
+        return None
+
+def list_model_versions():
+    """
+    Versions du registre (cache, voir registry_cache) : ne pas modifier le dictionnaire retourné
+    Un ajout ou une suppression de version change le mtime du dossier du registre ;
+    une modification de metadata.json est prise en compte au prochain rechargement
+    """
+    now = time.monotonic()
+    with registry_cache_lock:
+        versions = registry_cache['versions']
+        if versions is not None and now - registry_cache['checked_at'] < MODEL_ACTIVE_CHECK_INTERVAL:
+            return versions
+        mtime = registry_mtime()
+        if versions is not None and mtime == registry_cache['mtime']:
+            registry_cache['checked_at'] = now
+            return versions
+    
+    versions = scan_model_versions()
+    with registry_cache_lock:
+        registry_cache.update(versions=versions, mtime=mtime, checked_at=now)
+    return versions
+
+def invalidate_model_versions():
+    with registry_cache_lock:
+        registry_cache['versions'] = None
+
+def scan_model_versions():
+    """
+    Versions du registre MODEL_REGISTRY_DIR : un dossier par version avec metadata.json
+    Sans registre, le modèle unique MODEL_PATH est exposé comme version 'default'
+    """
+    versions = []
+    if os.path.isdir(MODEL_REGISTRY_DIR):
+        for name in os.listdir(MODEL_REGISTRY_DIR):
+            metadata_path = os.path.join(MODEL_REGISTRY_DIR, name, 'metadata.json')
+            if not os.path.isfile(metadata_path):
+                continue
+            try:
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ Métadonnées illisibles pour la version {name}: {e}")
+                continue
+            versions.append((metadata.get('created_at', ''), name, metadata))
+    
+    if not versions:
+        return OrderedDict([(DEFAULT_MODEL_VERSION, {'version': DEFAULT_MODEL_VERSION, 'legacy': True})])
+    
+    return OrderedDict((name, metadata) for _, name, metadata in sorted(versions))
+
+def read_active_version():
+    """Version promue dans le fichier ACTIVE du registre (partagé entre workers)"""
+    try:
+        with open(MODEL_ACTIVE_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def resolve_version(version=None):
+    """
+    Résout 'latest' / None en nom de version ; KeyError si la version n'existe pas
+    'latest' = version la plus récente de la variante MODEL_VARIANT (ou sans variante déclarée),
+    à défaut la plus récente du registre
+    Un nom de variante (metadata 'variant', ex. '160px-a0.75') désigne sa version la plus récente
+    """
+    versions = list_model_versions()
+    if not version or version == 'latest':
+        for name, metadata in reversed(versions.items()):
+            if metadata.get('variant') in (None, MODEL_VARIANT):
+                return name
+        return next(reversed(versions))
+    if version in versions:
+        return version
+    for name, metadata in reversed(versions.items()):
+        if metadata.get('variant') == version:
+            return name
+    raise KeyError(version)
+
+def model_artifact_path(version):
+    """Chemin de l'artefact d'une version pour le backend d'inférence choisi"""
+    metadata = list_model_versions()[version]
+    if metadata.get('legacy'):
+        return MODEL_BACKEND_PATHS.get(INFERENCE_BACKEND, MODEL_PATH)
+    filename = metadata.get('artifacts', {}).get(INFERENCE_BACKEND, REGISTRY_ARTIFACTS.get(INFERENCE_BACKEND))
+    return os.path.join(MODEL_REGISTRY_DIR, version, filename)
+
+def active_model_path():
+    """Chemin de l'artefact actuellement servi (ou qui sera chargé)"""
+    if active_model is not None:
+        return active_model.path
+    try:
+        return model_artifact_path(resolve_version(read_active_version() or MODEL_VERSION))
+    except KeyError:
+        return MODEL_BACKEND_PATHS.get(INFERENCE_BACKEND, MODEL_PATH)
+
+def load_model_version(version):
+    """Charge et préchauffe une version ; lève FileNotFoundError si l'artefact manque"""
+    if INFERENCE_BACKEND not in MODEL_BACKEND_PATHS:
+        raise ValueError(f"Backend d'inférence inconnu: {INFERENCE_BACKEND}")
+    
+    model_path = model_artifact_path(version)
+    if not os.path.exists(model_path):
+        if list_model_versions().get(version, {}).get('legacy'):
+            raise FileNotFoundError(model_path)
+        raise ModelArtifactMissing(
+            f"{model_path} (backend {INFERENCE_BACKEND} absent de la version {version} : "
+            f"python export_tflite.py --version {version})"
+        )
+    
+    if INFERENCE_POOL_ENABLED:
+        # Le modèle est chargé (et préchauffé) par les processus d'inférence
+        from inference_pool import InferencePoolClient
+        logger.info(f"📦 Chargement du modèle {version} dans le pool d'inférence ({INFERENCE_PROCESSES} processus)")
+        loaded = InferencePoolClient(version)
+        loaded.load()
+        return LoadedModel(version, loaded, list_model_versions().get(version, {}), model_path)
+    
+    logger.info(f"📦 Chargement du modèle {version} ({INFERENCE_BACKEND}) depuis {model_path}")
+    if INFERENCE_BACKEND == 'keras':
+        loaded = import_tensorflow().keras.models.load_model(model_path)
+    else:
+        loaded = TFLiteModel(model_path, num_threads=INFERENCE_THREADS)
+    
+    # Préchauffage : le premier appel (traçage du graphe, allocations) ne doit pas tomber sur une requête
+    entry = LoadedModel(version, loaded, list_model_versions().get(version, {}), model_path)
+    width, height = entry.input_size
+    loaded.predict(np.zeros((1, height, width, 3), dtype=np.float32), verbose=0)
+    
+    return entry
+
+def load_model(version=None, promote=False):
+    """
+    Charge une version du modèle, la préchauffe puis l'active par échange de référence
+    Les requêtes en cours terminent sur l'ancienne version
+    Retourne True si la version demandée est active
+    """
+    global model, active_model, MODEL_LOADED, MODEL_STATE
+    
+    started_at = time.time()
+    invalidate_model_versions()
+    
+    try:
+        version = resolve_version(version or read_active_version() or MODEL_VERSION)
+        entry = load_model_version(version)
+        
+        with model_swap_lock:
+            active_model = entry
+            model = entry.model
             MODEL_LOADED = True
-            logger.info("✅ Modèle chargé avec succès")
-        else:
-            logger.warning(f"⚠️ Modèle introuvable: {MODEL_PATH}")
+            MODEL_STATE = 'ready'
+        
+        if promote:
+            os.makedirs(MODEL_REGISTRY_DIR, exist_ok=True)
+            with open(MODEL_ACTIVE_FILE, 'w', encoding='utf-8') as f:
+                f.write(version)
+        
+        logger.info(f"✅ Modèle {entry.name} chargé avec succès")
+        return True
+    except ModelArtifactMissing as e:
+        # Erreur de déploiement : pas de mode DÉMO (prédictions aléatoires), les requêtes reçoivent 503
+        logger.error(f"❌ Artefact du modèle introuvable: {e}")
+        if active_model is None:
+            MODEL_LOADED = False
+            MODEL_STATE = 'failed'
+        return False
+    except (KeyError, FileNotFoundError) as e:
+        logger.warning(f"⚠️ Modèle introuvable: {e}")
+        if active_model is None:
             logger.warning("⚠️ Mode DÉMO activé - Prédictions aléatoires")
             MODEL_LOADED = False
+            MODEL_STATE = 'degraded'
+        return False
     except Exception as e:
         logger.error(f"❌ Erreur chargement modèle: {e}")
-        MODEL_LOADED = False
+        if active_model is None:
+            MODEL_LOADED = False
+            MODEL_STATE = 'degraded'
+        return False
+    finally:
+        if not model_ready.is_set():
+            STARTUP_TIMINGS['model_load_seconds'] = round(time.time() - started_at, 3)
+            STARTUP_TIMINGS['time_to_ready_seconds'] = round(time.time() - APP_START_TIME, 3)
+            model_ready.set()
+
+def reload_in_background(version=None, promote=False):
+    """Lance un rechargement dans un thread ; False si un rechargement est déjà en cours"""
+    if not model_swap_in_progress.acquire(blocking=False):
+        return False
+    
+    def run():
+        try:
+            # Comme le rechargement synchrone : résultats de l'ancienne version invalidés
+            if load_model(version, promote):
+                prediction_cache.clear()
+                sensor_states.clear()
+        finally:
+            model_swap_in_progress.release()
+    
+    threading.Thread(target=run, name='model-swap', daemon=True).start()
+    return True
 
-# Charger le modèle au démarrage
-load_model()
+def follow_active_version():
+    """Suit le fichier ACTIVE (version promue par un autre worker gunicorn)"""
+    global active_version_checked_at
+    
+    now = time.monotonic()
+    if now - active_version_checked_at < MODEL_ACTIVE_CHECK_INTERVAL:
+        return
+    active_version_checked_at = now
+    
+    version = read_active_version()
+    if version and active_model is not None and version != active_model.version:
+        if reload_in_background(version):
+            logger.info(f"🔄 Nouvelle version active détectée: {version}")
+
+def pinned_version(version):
+    """
+    Version résolue d'une requête épinglée ('latest', alias de variante -> nom de version)
+    None si aucune version n'est demandée ou si elle désigne la version active
+    """
+    if not version:
+        return None
+    if active_model is not None and version == active_model.version:
+        return None
+    version = resolve_version(version)
+    if active_model is not None and version == active_model.version:
+        return None
+    return version
+
+def get_model(version=None):
+    """
+    Modèle à utiliser pour une requête : version active, ou version épinglée
+    Les versions épinglées restent chargées (LRU, MODEL_PINNED_MAX), indexées par version résolue
+    Le chargement se fait hors du verrou : un seul thread charge une version, les autres
+    requêtes pour cette version l'attendent, celles des versions déjà chargées ne sont pas bloquées
+    """
+    version = pinned_version(version)
+    if version is None:
+        return active_model
+    
+    with pinned_models_lock:
+        entry = pinned_models.get(version)
+        if entry is not None:
+            pinned_models.move_to_end(version)
+            return entry
+        future = pinned_loading.get(version)
+        loading = future is None
+        if loading:
+            future = pinned_loading[version] = Future()
+    
+    if not loading:
+        return future.result()
+    
+    try:
+        entry = load_model_version(version)
+    except Exception as e:
+        with pinned_models_lock:
+            pinned_loading.pop(version, None)
+        future.set_exception(e)
+        raise
+    
+    with pinned_models_lock:
+        pinned_models[version] = entry
+        while len(pinned_models) > MODEL_PINNED_MAX:
+            pinned_models.popitem(last=False)
+        pinned_loading.pop(version, None)
+    future.set_result(entry)
+    return entry
+
+def start_model_loading():
+    """Lance le chargement du modèle dans un thread (une seule fois par processus)"""
+    global model_loader
+    with model_loader_lock:
+        if model_loader is None:
+            model_loader = threading.Thread(target=load_model, name='model-loader', daemon=True)
+            model_loader.start()
+
+def wait_for_model(timeout=MODEL_WAIT_TIMEOUT):
+    """
+    Attend la fin du chargement initial du modèle (au plus `timeout` secondes)
+    False aussi si le chargement a échoué faute d'artefact (état 'failed')
+    """
+    if not model_ready.is_set():
+        start_model_loading()
+    elif MODEL_REGISTRY_FOLLOW:
+        follow_active_version()
+    return model_ready.wait(timeout) and MODEL_STATE != 'failed'
+
+def model_unavailable_response():
+    """Réponse 503 pendant le chargement initial du modèle (ou après son échec)"""
+    response = jsonify({
+        'success': False,
+        'error': model_unavailable_error(),
+        'status': MODEL_STATE
+    })
+    response.headers['Retry-After'] = str(max(1, int(MODEL_WAIT_TIMEOUT)))
+    return response, 503
+
+def model_unavailable_error():
+    if MODEL_STATE == 'failed':
+        return f'Model artifact missing for backend {INFERENCE_BACKEND}, see /health'
+    return 'Model is loading, retry later'
+
+def requested_model_version():
+    """Version épinglée par la requête (champ modelVersion ou en-tête X-Model-Version)"""
+    return request.form.get('modelVersion') or request.headers.get('X-Model-Version') or None
+
+def model_version_exists(version):
+    """Vérifie qu'une version existe (sans relire le registre si elle est déjà chargée)"""
+    if (active_model is not None and version == active_model.version) or version in pinned_models:
+        return True
+    try:
+        resolve_version(version)
+        return True
+    except KeyError:
+        return False
+
+# Charger le modèle au démarrage (le serveur HTTP répond pendant le chargement)
+if MODEL_LOAD_MODE == 'eager':
+    load_model()
+elif MODEL_LOAD_MODE == 'background':
+    start_model_loading()
 
 # ═══════════════════════════════════════════════════════════
 # FONCTIONS UTILITAIRES
 # ═══════════════════════════════════════════════════════════
 
-def preprocess_image(image_bytes):
-    """Prétraite l'image pour le modèle"""
+def decode_image(image_bytes, size=None):
+    """Décode l'image et la redimensionne en tableau uint8 (H, W, 3) ; size=(W, H), défaut IMAGE_SIZE"""
+    size = size or IMAGE_SIZE
+    IMAGE_BYTES.observe(len(image_bytes))
+    start = time.perf_counter()
+    
+    # Même décodage que les shards et le pipeline d'entraînement (image_decode.py)
+    image = open_image(image_bytes, size)
+    
+    decoded = time.perf_counter()
+    DECODE_LATENCY.observe(decoded - start)
+    
+    pixels = resize_image(image, size)
+    RESIZE_LATENCY.observe(time.perf_counter() - decoded)
+    return pixels
+
+def normalize_into(pixels, out):
+    """Normalise des pixels uint8 en float32 [0, 1] directement dans le buffer `out`"""
+    return np.multiply(pixels, np.float32(1 / 255.0), out=out, casting='unsafe')
+
+def input_size_for(version=None):
+    """Taille d'entrée (W, H) du modèle qui servira la requête (IMAGE_SIZE en mode démo)"""
+    entry = get_model(version)
+    return entry.input_size if entry is not None else IMAGE_SIZE
+
+def new_image_buffer(size=None, count=1):
+    """Buffer float32 (N, H, W, 3) pour une taille d'entrée (W, H)"""
+    width, height = size or IMAGE_SIZE
+    return np.empty((count, height, width, 3), dtype=np.float32)
+
+def get_thread_buffer(size=None):
+    """Buffer float32 (1, H, W, 3) réutilisé par thread de requête"""
+    width, height = size or IMAGE_SIZE
+    buffer = getattr(_thread_buffers, 'image', None)
+    if buffer is None or buffer.shape[1:3] != (height, width):
+        buffer = new_image_buffer((width, height))
+        _thread_buffers.image = buffer
+    return buffer
+
+def preprocess_image(image_bytes, out=None, size=None):
+    """
+    Prétraite l'image pour le modèle
+    Retourne un tableau float32 (1, H, W, 3) ; la taille est celle de `out` s'il est fourni,
+    sinon `size` (W, H), sinon IMAGE_SIZE
+    """
     try:
-        # Ouvrir l'image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convertir en RGB si nécessaire
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Redimensionner
-        image = image.resize(IMAGE_SIZE)
+        if out is None:
+            out = new_image_buffer(size)
         
         # Convertir en array numpy et normaliser
-        img_array = np.array(image) / 255.0
+        normalize_into(decode_image(image_bytes, (out.shape[2], out.shape[1])), out[0])
         
-        # Ajouter dimension batch
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
+        return out
     
     except Exception as e:
         logger.error(f"❌ Erreur preprocessing: {e}")
         raise
 
-def predict_disease(img_array):
-    """Prédit la maladie à partir de l'image prétraitée"""
-    global model, MODEL_LOADED
+def preprocess_frame(metadata, pixels, out=None):
+    """
+    Prétraite une trame binaire déjà parsée (voir frame_format.py), sans PIL
+    Retourne un tableau float32 (1, H, W, 3), écrit dans `out` s'il est fourni
+    """
+    if out is None:
+        out = new_image_buffer()
+    
+    start = time.perf_counter()
+    normalize_into(frame_to_rgb(metadata, pixels, (out.shape[2], out.shape[1])), out[0])
+    RESIZE_LATENCY.observe(time.perf_counter() - start)
+    return out
+
+def preprocess_images(images_bytes, size=None):
+    """
+    Prétraite un lot d'images en parallèle dans un tableau préalloué (N, H, W, 3)
+    Retourne (lot, indices valides, erreurs par indice)
+    """
+    size = size or IMAGE_SIZE
+    batch = new_image_buffer(size, len(images_bytes))
+    errors = {}
+    
+    def decode_into(idx):
+        image_bytes = images_bytes[idx]
+        if len(image_bytes) > MAX_IMAGE_SIZE:
+            raise ValueError('Image too large (max 10MB)')
+        normalize_into(decode_image(image_bytes, size), batch[idx])
+    
+    futures = [decode_executor.submit(decode_into, idx) for idx in range(len(images_bytes))]
+    for idx, future in enumerate(futures):
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"❌ Erreur preprocessing image {idx+1}: {e}")
+            ERRORS_TOTAL.inc(endpoint='preprocess', type=type(e).__name__)
+            errors[idx] = e
+    
+    valid_indices = [idx for idx in range(len(images_bytes)) if idx not in errors]
+    if errors:
+        batch = batch[valid_indices]
+    
+    return batch, valid_indices, errors
+
+def compute_severities(predicted_classes, confidences):
+    """Calcule la sévérité de tout un lot (opérations NumPy vectorisées)"""
+    is_diseased = np.asarray(predicted_classes) != "Tomato_healthy"
+    confidences = np.asarray(confidences)
+    return np.select(
+        [~is_diseased, confidences >= 0.9, confidences >= 0.7],
+        ['none', 'high', 'medium'],
+        default='low'
+    )
+
+def build_prediction_result(predicted_class, confidence, severity=None, model_used='demo_mode'):
+    """Construit le résultat complet (format ESP32 + backend) pour une classe prédite"""
+    # Nom de la maladie en français
+    disease_name_fr = DISEASE_NAMES_FR.get(predicted_class, predicted_class)
+    
+    # Déterminer si c'est une maladie
+    is_diseased = (predicted_class != "Tomato_healthy")
+    
+    # Déterminer la sévérité
+    if severity is None:
+        severity = str(compute_severities([predicted_class], [confidence])[0])
+    
+    # Déterminer si arrosage nécessaire
+    should_water = predicted_class in ARROSAGE_CLASSES
+    
+    # Récupérer les recommandations
+    recommendations = RECOMMENDATIONS.get(predicted_class, [
+        'Consulter un expert agronome',
+        'Isoler la plante affectée',
+        'Surveiller l\'évolution'
+    ])
     
+    # Retourner le résultat COMPLET pour le backend
+    return {
+        # Format original (compatibilité)
+        'maladie': predicted_class,
+        'confiance': confidence,
+        'recommandations': recommendations,
+        'arroser': should_water,
+        
+        # Format backend attendu
+        'prediction': predicted_class,
+        'predictionFr': disease_name_fr,
+        'confidence': confidence,
+        'diseaseDetected': is_diseased,
+        'severity': severity,
+        'recommendations': recommendations,
+        'shouldWater': should_water,
+        
+        # Métadonnées
+        'timestamp': datetime.now().isoformat(),
+        'modelUsed': model_used
+    }
+
+def center_crop(img_batch, fraction):
+    """Recadrage central de `fraction`, ramené à la taille d'origine (plus proche voisin)"""
+    height, width = img_batch.shape[1:3]
+    crop_h, crop_w = int(height * fraction), int(width * fraction)
+    top, left = (height - crop_h) // 2, (width - crop_w) // 2
+    rows = top + np.arange(height) * crop_h // height
+    cols = left + np.arange(width) * crop_w // width
+    return img_batch[:, rows[:, None], cols]
+
+TTA_TRANSFORMS = {
+    'hflip': lambda img_batch: img_batch[:, :, ::-1],
+    'vflip': lambda img_batch: img_batch[:, ::-1],
+    'crop': lambda img_batch: center_crop(img_batch, TTA_CROP_FRACTION)
+}
+
+if any(name not in TTA_TRANSFORMS for name in TTA_AUGMENTATIONS):
+    logger.warning(f"⚠️ Augmentations TTA inconnues ignorées: {[n for n in TTA_AUGMENTATIONS if n not in TTA_TRANSFORMS]}")
+    TTA_AUGMENTATIONS = [name for name in TTA_AUGMENTATIONS if name in TTA_TRANSFORMS]
+
+def tta_views(img_batch):
+    """Vues augmentées d'un lot (K*N, H, W, 3), regroupées par augmentation"""
+    return np.concatenate([TTA_TRANSFORMS[name](img_batch) for name in TTA_AUGMENTATIONS])
+
+def apply_tta(model, img_batch, predictions):
+    """
+    Moyenne des softmax de l'image et de ses vues augmentées, en un seul appel modèle supplémentaire
+    adaptive : seules les images sous TTA_CONFIDENCE_THRESHOLD sont augmentées (sortie anticipée sinon)
+    Retourne (prédictions, masque des images augmentées)
+    """
+    if TTA_MODE == 'always':
+        ambiguous = np.ones(len(predictions), dtype=bool)
+    else:
+        ambiguous = predictions.max(axis=1) < TTA_CONFIDENCE_THRESHOLD
+    count = int(ambiguous.sum())
+    
+    changed = 0
+    if count:
+        with TTA_LATENCY.time():
+            view_predictions = model.predict(tta_views(img_batch[ambiguous]), batch_size=PREDICT_CHUNK_SIZE, verbose=0)
+        view_predictions = np.asarray(view_predictions).reshape(len(TTA_AUGMENTATIONS), count, -1)
+        averaged = (predictions[ambiguous] + view_predictions.sum(axis=0)) / (len(TTA_AUGMENTATIONS) + 1)
+        changed = int((averaged.argmax(axis=1) != predictions[ambiguous].argmax(axis=1)).sum())
+        predictions = np.array(predictions, copy=True)
+        predictions[ambiguous] = averaged
+    
+    TTA_IMAGES_TOTAL.inc(len(predictions) - count, outcome='early_exit')
+    TTA_IMAGES_TOTAL.inc(count, outcome='augmented')
+    TTA_IMAGES_TOTAL.inc(changed, outcome='changed')
+    with tta_counts_lock:
+        tta_counts['images'] += len(predictions)
+        tta_counts['augmented'] += count
+        tta_counts['changed'] += changed
+    return predictions, ambiguous
+
+def tta_stats():
+    with tta_counts_lock:
+        counts = dict(tta_counts)
+    return {
+        'mode': TTA_MODE,
+        'confidence_threshold': TTA_CONFIDENCE_THRESHOLD,
+        'augmentations': TTA_AUGMENTATIONS,
+        **counts,
+        'augmented_rate': round(counts['augmented'] / counts['images'], 4) if counts['images'] else 0
+    }
+
+def predict_disease_batch(img_batch, version=None):
+    """
+    Prédit la maladie pour un lot d'images prétraitées (N, H, W, 3)
+    Un seul appel au modèle pour tout le lot, un résultat par ligne
+    `version` épingle une version du registre (défaut : version active)
+    """
     try:
-        if MODEL_LOADED and model is not None:
-            # Prédiction réelle avec le modèle
-            predictions = model.predict(img_array, verbose=0)
-            class_idx = int(np.argmax(predictions[0]))
-            confidence = float(predictions[0][class_idx])
-            predicted_class = DISEASE_CLASSES[class_idx]
+        batch_size = len(img_batch)
+        
+        # Référence capturée une fois : un rechargement concurrent n'affecte pas ce lot
+        entry = get_model(version)
+        
+        # Lot prétraité pour une autre taille d'entrée (variante échangée entre-temps) : réduire/agrandir
+        if entry is not None and img_batch.shape[1:3] != entry.input_size[::-1]:
+            img_batch = np.stack([resize_pixels(image, entry.input_size) for image in img_batch]).astype(np.float32)
+        
+        if entry is not None:
+            # Prédiction réelle avec le modèle (un seul forward pass, découpé en chunks)
+            with INFERENCE_LATENCY.time(backend='pool' if INFERENCE_POOL_ENABLED else INFERENCE_BACKEND):
+                predictions = entry.model.predict(img_batch, batch_size=PREDICT_CHUNK_SIZE, verbose=0)
+            INFERENCE_BATCH_SIZE.observe(batch_size)
+            
+            # TTA : appel supplémentaire limité aux images ambiguës (mode adaptive)
+            tta_applied = None
+            if TTA_MODE != 'off' and TTA_AUGMENTATIONS:
+                predictions, tta_applied = apply_tta(entry.model, img_batch, predictions)
             
-            logger.info(f"🤖 Prédiction modèle: {predicted_class} (confiance {confidence:.2%})")
+            class_idxs = np.argmax(predictions, axis=1)
+            confidences = predictions[np.arange(batch_size), class_idxs]
+            predicted_classes = np.asarray(DISEASE_CLASSES)[class_idxs]
+            
+            logger.debug("🤖 Prédiction modèle: %d image(s)", batch_size)
             
         else:
             # Mode DÉMO - Prédiction aléatoire pour tests
             logger.warning("⚠️ Mode DÉMO - Prédiction simulée")
-            predicted_class = np.random.choice(DISEASE_CLASSES)
-            confidence = np.random.uniform(0.75, 0.98)
-        
-        # Nom de la maladie en français
-        disease_name_fr = DISEASE_NAMES_FR.get(predicted_class, predicted_class)
-        
-        # Déterminer si c'est une maladie
-        is_diseased = (predicted_class != "Tomato_healthy")
-        
-        # Déterminer la sévérité
-        if not is_diseased:
-            severity = 'none'
-        elif confidence >= 0.9:
-            severity = 'high'
-        elif confidence >= 0.7:
-            severity = 'medium'
-        else:
-            severity = 'low'
+            predicted_classes = np.random.choice(DISEASE_CLASSES, size=batch_size)
+            confidences = np.random.uniform(0.75, 0.98, size=batch_size)
+            DEMO_PREDICTIONS_TOTAL.inc(batch_size)
+            tta_applied = None
         
-        # Déterminer si arrosage nécessaire
-        should_water = predicted_class in ARROSAGE_CLASSES
+        severities = compute_severities(predicted_classes, confidences)
+        model_used = entry.name if entry is not None else 'demo_mode'
         
-        # Récupérer les recommandations
-        recommendations = RECOMMENDATIONS.get(predicted_class, [
-            'Consulter un expert agronome',
-            'Isoler la plante affectée',
-            'Surveiller l\'évolution'
-        ])
+        mode = 'model' if entry is not None else 'demo'
+        for predicted_class in predicted_classes:
+            PREDICTIONS_TOTAL.inc(**{'class': str(predicted_class), 'mode': mode})
         
-        # Retourner le résultat COMPLET pour le backend
-        return {
-            # Format original (compatibilité)
-            'maladie': predicted_class,
-            'confiance': confidence,
-            'recommandations': recommendations,
-            'arroser': should_water,
-            
-            # Format backend attendu
-            'prediction': predicted_class,
-            'predictionFr': disease_name_fr,
-            'confidence': confidence,
-            'diseaseDetected': is_diseased,
-            'severity': severity,
-            'recommendations': recommendations,
-            'shouldWater': should_water,
-            
-            # Métadonnées
-            'timestamp': datetime.now().isoformat(),
-            'modelUsed': 'tomato_disease_model' if MODEL_LOADED else 'demo_mode'
-        }
+        results = [
+            build_prediction_result(str(predicted_class), float(confidence), str(severity), model_used)
+            for predicted_class, confidence, severity in zip(predicted_classes, confidences, severities)
+        ]
+        
+        if tta_applied is not None:
+            for result, applied in zip(results, tta_applied):
+                result['tta'] = {'applied': bool(applied), 'views': len(TTA_AUGMENTATIONS) + 1 if applied else 1}
+        
+        return results
     
     except Exception as e:
         logger.error(f"❌ Erreur prédiction: {e}")
         raise
 
-def send_results_to_backend(result, capteurId=None, userId=None):
+def predict_disease(img_array, version=None):
+    """Prédit la maladie à partir de l'image prétraitée"""
+    result = predict_disease_batch(img_array, version)[0]
+    logger.debug("🤖 Prédiction: %s (confiance %.2f%%)", result['prediction'], result['confidence'] * 100)
+    return result
+
+def build_backend_payload(result, capteurId=None, userId=None):
+    """Construit le payload attendu par /api/analysis/receive"""
+    return {
+        'capteurId': capteurId or 'unknown',
+        'userId': userId or 'unknown',
+        'analysisResult': {
+            'prediction': result.get('prediction'),
+            'predictionFr': result.get('predictionFr'),
+            'confidence': result.get('confidence'),
+            'diseaseDetected': result.get('diseaseDetected'),
+            'severity': result.get('severity'),
+            'recommendations': result.get('recommendations'),
+            'shouldWater': result.get('shouldWater'),
+            'modelUsed': result.get('modelUsed'),
+            'analysedAt': result.get('timestamp')
+        },
+        'timestamp': result.get('timestamp')
+    }
+
+def post_to_backend(path, payload):
     """
-    Envoie les résultats au backend Node.js
-    Ajout: userId transmis au backend
+    POST JSON vers le backend via la session partagée (keep-alive)
+    Retourne le code HTTP, ou None en cas d'erreur réseau
     """
-    if not SEND_TO_BACKEND:
-        logger.info("ℹ️ Envoi backend désactivé")
-        return True
-
+    start = time.perf_counter()
     try:
-        url = f'{BACKEND_URL}/api/analysis/receive'
-
-        payload = {
-            'capteurId': capteurId or 'unknown',
-            'userId': userId or 'unknown',
-            'analysisResult': {
-                'prediction': result.get('prediction'),
-                'predictionFr': result.get('predictionFr'),
-                'confidence': result.get('confidence'),
-                'diseaseDetected': result.get('diseaseDetected'),
-                'severity': result.get('severity'),
-                'recommendations': result.get('recommendations'),
-                'shouldWater': result.get('shouldWater'),
-                'modelUsed': result.get('modelUsed'),
-                'analysedAt': result.get('timestamp')
-            },
-            'timestamp': result.get('timestamp')
-        }
+        url = f'{BACKEND_URL}{path}'
 
         headers = {
             'Content-Type': 'application/json',
             'X-API-Key': BACKEND_API_KEY
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = backend_session.post(url, json=payload, headers=headers, timeout=BACKEND_TIMEOUT)
+        BACKEND_LATENCY.observe(time.perf_counter() - start, path=path, outcome=f'{response.status_code // 100}xx')
 
         # Considérer tout 2xx comme succès
         if 200 <= response.status_code < 300:
             # Essayer de récupérer le corps JSON pour un logging utile
-            try:
-                resp_json = response.json()
-                logger.info(f"✅ Résultats envoyés au backend ({response.status_code}) : {resp_json}")
-            except Exception:
-                logger.info(f"✅ Résultats envoyés au backend ({response.status_code}) - réponse non JSON")
-            return True
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("✅ Résultats envoyés au backend (%d) : %s", response.status_code, response.text[:200])
         else:
             # Log utile montrant code + corps
             body = None
@@ -322,28 +1095,1171 @@ def send_results_to_backend(result, capteurId=None, userId=None):
             except Exception:
                 body = response.text
             logger.warning(f"⚠️ Backend erreur: {response.status_code} - {body}")
-            return False
+
+        return response.status_code
 
     except Exception as e:
         logger.error(f"❌ Erreur envoi backend: {e}")
-        return False
+        BACKEND_LATENCY.observe(time.perf_counter() - start, path=path, outcome='error')
+        ERRORS_TOTAL.inc(endpoint='backend', type=type(e).__name__)
+        return None
+
+def send_results_to_backend(result, capteurId=None, userId=None):
+    """
+    Envoie les résultats au backend Node.js (synchrone)
+    Ajout: userId transmis au backend
+    """
+    if not SEND_TO_BACKEND:
+        logger.debug("ℹ️ Envoi backend désactivé")
+        return True
+
+    status_code = post_to_backend('/api/analysis/receive', build_backend_payload(result, capteurId, userId))
+    return status_code is not None and 200 <= status_code < 300
+
+# ═══════════════════════════════════════════════════════════
+# ENVOI BACKEND ASYNCHRONE
+# ═══════════════════════════════════════════════════════════
+
+class BackendDispatcher:
+    """
+    File d'envoi des résultats vers le backend, traitée en arrière-plan
+    - file bornée en mémoire (DELIVERY_QUEUE_SIZE)
+    - envoi groupé sur /api/analysis/receive-bulk si BACKEND_BULK est activé
+    - retries avec backoff exponentiel
+    - fichier de débordement optionnel (DELIVERY_SPILL_PATH) relu au démarrage
+      du processus ; partagé entre workers gunicorn, protégé par un verrou fcntl
+      (fichier <DELIVERY_SPILL_PATH>.lock)
+    """
+    
+    def __init__(self, queue_size, workers, spill_path=None):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers_count = max(1, workers)
+        self.spill_path = spill_path
+        self.bulk_supported = BACKEND_BULK
+        self.lock = threading.Lock()
+        self.workers = []
+        self.workers_pid = None
+        
+        # Statistiques
+        self.stats_data = {
+            'queued': 0,
+            'delivered': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'bulk_requests': 0
+        }
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+    
+    def _ensure_workers(self):
+        """Démarre les threads d'envoi (une fois par processus, compatible fork gunicorn)"""
+        with self.lock:
+            if self.workers_pid == os.getpid() and any(w.is_alive() for w in self.workers):
+                return
+            self.workers_pid = os.getpid()
+            self._replay_spill()
+            self.workers = [
+                threading.Thread(target=self._run, name=f'backend-dispatcher-{i}', daemon=True)
+                for i in range(self.workers_count)
+            ]
+            for worker in self.workers:
+                worker.start()
+    
+    def submit(self, result, capteurId=None, userId=None):
+        """Met le résultat en file d'envoi et retourne son identifiant de livraison"""
+        self._ensure_workers()
+        
+        item = {
+            'id': uuid.uuid4().hex,
+            'payload': build_backend_payload(result, capteurId, userId),
+            'enqueued_at': time.time()
+        }
+        
+        try:
+            self.queue.put_nowait(item)
+            self._count('queued')
+        except queue.Full:
+            if self._spill([item]):
+                logger.warning(f"⚠️ File d'envoi pleine - résultat {item['id']} écrit sur disque")
+            else:
+                logger.error(f"❌ File d'envoi pleine - résultat {item['id']} perdu")
+                self._count('dropped')
+                return None
+        
+        return item['id']
+    
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            
+            # Regrouper les résultats déjà en attente
+            if self.bulk_supported:
+                while len(items) < DELIVERY_BULK_SIZE:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            
+            try:
+                self._deliver(items)
+            except Exception as e:
+                logger.error(f"❌ Erreur dispatcher backend: {e}")
+                self._spill(items)
+    
+    def _deliver(self, items):
+        """Envoie un groupe de résultats avec retries, puis débordement disque si échec"""
+        for attempt in range(DELIVERY_MAX_RETRIES + 1):
+            if attempt > 0:
+                self._count('retries')
+                time.sleep(DELIVERY_BACKOFF_BASE * (2 ** (attempt - 1)))
+            
+            if self.bulk_supported and len(items) > 1:
+                status_code = post_to_backend(
+                    '/api/analysis/receive-bulk',
+                    {'results': [item['payload'] for item in items]}
+                )
+                if status_code in (404, 405):
+                    # Le backend ne supporte pas l'envoi groupé : repasser en unitaire
+                    logger.warning("⚠️ Envoi groupé non supporté par le backend - envoi unitaire")
+                    self.bulk_supported = False
+                    for item in items:
+                        self._deliver([item])
+                    return
+                if status_code is not None and 200 <= status_code < 300:
+                    self._count('bulk_requests')
+                    self._delivered(items)
+                    return
+            else:
+                status_code = post_to_backend('/api/analysis/receive', items[0]['payload'])
+                if status_code is not None and 200 <= status_code < 300:
+                    self._delivered(items)
+                    return
+                if status_code is not None and 400 <= status_code < 500 and status_code != 429:
+                    # Erreur client : inutile de réessayer
+                    break
+        
+        self._count('failed', len(items))
+        if self._spill(items):
+            logger.warning(f"⚠️ {len(items)} résultat(s) non livré(s) - écrits sur disque")
+    
+    def _delivered(self, items):
+        now = time.time()
+        with self.lock:
+            self.stats_data['delivered'] += len(items)
+            for item in items:
+                latency_ms = (now - item['enqueued_at']) * 1000
+                self.total_latency_ms += latency_ms
+                self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+    
+    def _count(self, key, n=1):
+        with self.lock:
+            self.stats_data[key] += n
+    
+    @contextmanager
+    def _spill_locked(self):
+        """Verrou exclusif inter-processus sur le fichier de débordement"""
+        with open(f'{self.spill_path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _spill(self, items):
+        """Ajoute les résultats au fichier de débordement (JSON lines)"""
+        if not self.spill_path or not items:
+            return False
+        try:
+            with self._spill_locked():
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    for item in items:
+                        f.write(json.dumps(item) + '\n')
+            self._count('spilled', len(items))
+            return True
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture fichier de débordement: {e}")
+            return False
+    
+    def _replay_spill(self):
+        """Recharge en file les résultats écrits sur disque (appelé sous self.lock)"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        try:
+            # Lecture et suppression sous verrou : un autre worker ne peut ni relire
+            # les mêmes résultats ni en ajouter entre les deux
+            with self._spill_locked():
+                if not os.path.exists(self.spill_path):
+                    return
+                with open(self.spill_path, 'r', encoding='utf-8') as f:
+                    items = [json.loads(line) for line in f if line.strip()]
+                os.remove(self.spill_path)
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture fichier de débordement: {e}")
+            return
+        
+        replayed = 0
+        for item in items:
+            try:
+                self.queue.put_nowait(item)
+                replayed += 1
+            except queue.Full:
+                break
+        if replayed < len(items):
+            # File pleine : le reste retourne sur disque (self.lock est déjà tenu, pas de _count)
+            try:
+                with self._spill_locked():
+                    with open(self.spill_path, 'a', encoding='utf-8') as f:
+                        for item in items[replayed:]:
+                            f.write(json.dumps(item) + '\n')
+            except Exception as e:
+                logger.error(f"❌ Erreur écriture fichier de débordement: {e}")
+        self.stats_data['replayed'] += replayed
+        logger.info(f"📂 {replayed} résultat(s) rechargé(s) depuis {self.spill_path}")
+    
+    def flush_to_spill(self):
+        """Écrit sur disque les résultats encore en file (arrêt du processus)"""
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._spill(items)
+    
+    def stats(self):
+        with self.lock:
+            delivered = self.stats_data['delivered']
+            return {
+                'enabled': DELIVERY_ASYNC and SEND_TO_BACKEND,
+                'queue_depth': self.queue.qsize(),
+                'queue_capacity': self.queue.maxsize,
+                'bulk_supported': self.bulk_supported,
+                **self.stats_data,
+                'avg_latency_ms': round(self.total_latency_ms / delivered, 2) if delivered else 0,
+                'max_latency_ms': round(self.max_latency_ms, 2)
+            }
+
+backend_dispatcher = BackendDispatcher(DELIVERY_QUEUE_SIZE, DELIVERY_WORKERS, DELIVERY_SPILL_PATH)
+atexit.register(backend_dispatcher.flush_to_spill)
+if DELIVERY_ASYNC and SEND_TO_BACKEND and DELIVERY_SPILL_PATH:
+    # Relire dès le démarrage du worker les résultats laissés sur disque
+    backend_dispatcher._ensure_workers()
+
+def deliver_results(result, capteurId=None, userId=None):
+    """
+    Transmet le résultat au backend (file asynchrone ou envoi direct)
+    Retourne (accepté, identifiant de livraison)
+    """
+    if not SEND_TO_BACKEND:
+        logger.debug("ℹ️ Envoi backend désactivé")
+        return True, None
+    
+    if DELIVERY_ASYNC:
+        delivery_id = backend_dispatcher.submit(result, capteurId, userId)
+        return delivery_id is not None, delivery_id
+    
+    return send_results_to_backend(result, capteurId, userId), None
+
+# ═══════════════════════════════════════════════════════════
+# MICRO-BATCHING DES PRÉDICTIONS
+# ═══════════════════════════════════════════════════════════
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes /predict concurrentes en un seul appel modèle
+    Le lot est envoyé dès que BATCH_MAX_SIZE images sont en attente, que la plus ancienne
+    attend depuis BATCH_MAX_WAIT_MS, ou qu'aucune autre requête suivie (tracking) n'est
+    en cours dans le processus : un worker mono-thread n'attend jamais
+    Gain réservé aux déploiements concurrents : gunicorn gthread (gunicorn.conf.py), asgi.py
+    """
+    
+    def __init__(self, max_size, max_wait_ms):
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.pending = []
+        self.requests = 0  # requêtes en cours susceptibles de soumettre une image
+        self.condition = threading.Condition()
+        self.worker = None
+        self.worker_pid = None
+        
+        # Statistiques
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_wait_ms = 0.0
+    
+    def _ensure_worker(self):
+        """Démarre le thread worker (une fois par processus, compatible fork gunicorn)"""
+        if self.worker is not None and self.worker_pid == os.getpid() and self.worker.is_alive():
+            return
+        self.worker_pid = os.getpid()
+        self.worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.worker.start()
+    
+    @contextmanager
+    def tracking(self):
+        """Requête en cours (utilisable en décorateur) : le lot n'attend que s'il en reste d'autres"""
+        with self.condition:
+            self.requests += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.requests -= 1
+                self.condition.notify_all()
+    
+    def predict(self, img_array):
+        """Soumet une image (1, H, W, 3) et attend son résultat"""
+        item = {
+            'input': img_array,
+            'enqueued_at': time.perf_counter(),
+            'done': threading.Event(),
+            'result': None,
+            'error': None
+        }
+        with self.condition:
+            self._ensure_worker()
+            self.pending.append(item)
+            self.condition.notify()
+        
+        item['done'].wait()
+        if item['error'] is not None:
+            raise item['error']
+        return item['result']
+    
+    def _collect(self):
+        """Attend un lot complet ou l'expiration du délai de la première image"""
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            
+            deadline = self.pending[0]['enqueued_at'] + self.max_wait
+            while len(self.pending) < min(self.max_size, self.requests):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            
+            # Un lot = une seule taille d'entrée (les autres attendent le lot suivant)
+            shape = self.pending[0]['input'].shape
+            batch, rest = [], []
+            for item in self.pending:
+                (batch if len(batch) < self.max_size and item['input'].shape == shape else rest).append(item)
+            self.pending = rest
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+            
+            try:
+                results = predict_disease_batch(np.concatenate([item['input'] for item in batch]))
+            except Exception as e:
+                for item in batch:
+                    item['error'] = e
+                    item['done'].set()
+                continue
+            
+            with self.condition:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            
+            # Renvoyer chaque ligne à son appelant
+            for item, result in zip(batch, results):
+                queue_wait_ms = (started_at - item['enqueued_at']) * 1000
+                with self.condition:
+                    self.total_wait_ms += queue_wait_ms
+                result['batching'] = {
+                    'batchSize': len(batch),
+                    'queueWaitMs': round(queue_wait_ms, 2)
+                }
+                item['result'] = result
+                item['done'].set()
+    
+    def stats(self):
+        with self.condition:
+            return {
+                'enabled': MICRO_BATCHING,
+                'max_batch_size': self.max_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'predictions': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+                'max_batch_size_seen': self.max_batch_seen,
+                'avg_queue_wait_ms': round(self.total_wait_ms / self.items, 2) if self.items else 0,
+                'queue_depth': len(self.pending)
+            }
+
+micro_batcher = MicroBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+# ═══════════════════════════════════════════════════════════
+# CACHE DES PRÉDICTIONS (TRAMES IDENTIQUES)
+# ═══════════════════════════════════════════════════════════
+
+# Champs propres à une requête, jamais mis en cache
+REQUEST_FIELDS = ('backend_sent', 'deliveryId', 'success', 'batching', 'cached', 'cachedAt', 'sensor', 'raw')
+
+def image_hash(image_bytes):
+    """Empreinte exacte des octets de l'image"""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+def perceptual_hash(img_array):
+    """
+    dHash 64 bits de l'image prétraitée (niveaux de gris 9x8)
+    Deux trames quasi identiques ont une distance de Hamming faible
+    """
+    gray = img_array.reshape(-1, *img_array.shape[-3:])[0].mean(axis=2)
+    h, w = gray.shape
+    # Moyenne par blocs sur une grille 8 x 9
+    rows = np.array_split(np.arange(h), 8)
+    cols = np.array_split(np.arange(w), 9)
+    small = np.array([[gray[np.ix_(r, c)].mean() for c in cols] for r in rows])
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+class PredictionCache:
+    """
+    Cache LRU des résultats de prédiction, par version de modèle
+    - clé exacte : (version, hash des octets de l'image)
+    - clé perceptuelle optionnelle : dHash de l'image réduite (trames quasi identiques)
+    - borné en nombre d'entrées et en mémoire, expiration par TTL
+    """
+    
+    def __init__(self, max_entries, max_bytes, ttl, phash_distance):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self.entries = OrderedDict()  # (version, hash) -> (résultat, taille, expiration, phash)
+        self.phashes = {}             # (version, phash) -> clé exacte
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        
+        # Statistiques
+        self.hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+    
+    def get(self, key):
+        """Recherche par hash exact"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            result = self._lookup(key)
+            if result is not None:
+                self.hits += 1
+            return result
+    
+    def get_similar(self, version, phash):
+        """Recherche par hash perceptuel (distance de Hamming <= PREDICTION_CACHE_PHASH_DISTANCE)"""
+        if not self.enabled or self.phash_distance < 0:
+            return None
+        with self.lock:
+            key = self.phashes.get((version, phash))
+            if key is None and self.phash_distance > 0:
+                for (candidate_version, candidate), candidate_key in self.phashes.items():
+                    if candidate_version == version and bin(candidate ^ phash).count('1') <= self.phash_distance:
+                        key = candidate_key
+                        break
+            result = self._lookup(key) if key is not None else None
+            if result is not None:
+                self.phash_hits += 1
+            return result
+    
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+    
+    def put(self, key, result, phash=None):
+        if not self.enabled:
+            return
+        result = {k: v for k, v in result.items() if k not in REQUEST_FIELDS}
+        size = len(json.dumps(result, default=str))
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (result, size, time.monotonic() + self.ttl, phash)
+            self.total_bytes += size
+            if phash is not None:
+                self.phashes[(key[0], phash)] = key
+            
+            # Éviction LRU
+            while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.phashes.clear()
+            self.total_bytes = 0
+    
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        result, _, expires_at, _ = entry
+        if time.monotonic() > expires_at:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return dict(result)
+    
+    def _remove(self, key):
+        _, size, _, phash = self.entries.pop(key)
+        self.total_bytes -= size
+        if phash is not None and self.phashes.get((key[0], phash)) == key:
+            del self.phashes[(key[0], phash)]
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.phash_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'phash_hits': self.phash_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.phash_hits) / lookups, 4) if lookups else 0
+            }
+
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_SIZE,
+    PREDICTION_CACHE_MAX_BYTES,
+    PREDICTION_CACHE_TTL,
+    PREDICTION_CACHE_PHASH_DISTANCE
+)
+
+# ═══════════════════════════════════════════════════════════
+# ÉTAT PAR CAPTEUR (DÉTECTION DE CHANGEMENT + LISSAGE)
+# ═══════════════════════════════════════════════════════════
+
+SENSOR_THUMBNAIL_SIZE = 32
+SENSOR_HISTOGRAM_BINS = 16
+
+def sensor_thumbnail(img_array):
+    """Miniature 32x32 en niveaux de gris (moyenne de blocs) de l'image prétraitée"""
+    gray = img_array.reshape(-1, *img_array.shape[-3:])[0].mean(axis=2)
+    n = SENSOR_THUMBNAIL_SIZE
+    h, w = gray.shape[0] // n * n, gray.shape[1] // n * n
+    return gray[:h, :w].reshape(n, h // n, n, w // n).mean(axis=(1, 3)).astype(np.float32)
+
+def thumbnail_distance(reference, thumbnail):
+    """(écart moyen des pixels, distance entre histogrammes), tous deux dans [0, 1]"""
+    pixel_diff = float(np.abs(reference - thumbnail).mean())
+    bins = np.linspace(0.0, 1.0, SENSOR_HISTOGRAM_BINS + 1)
+    ref_hist = np.histogram(reference, bins=bins)[0]
+    hist = np.histogram(thumbnail, bins=bins)[0]
+    histogram_diff = float(np.abs(ref_hist - hist).sum()) / (2 * thumbnail.size)
+    return pixel_diff, histogram_diff
+
+class SensorState:
+    """Référence (miniature de la dernière trame analysée), dernier résultat et fenêtre de prédictions"""
+    
+    __slots__ = ('version', 'digest', 'thumbnail', 'result', 'analysed_at', 'window')
+    
+    def __init__(self, version, window):
+        self.version = version
+        self.digest = None
+        self.thumbnail = None
+        self.result = None
+        self.analysed_at = 0.0
+        self.window = deque(maxlen=window)
+
+class SensorStateStore:
+    """
+    État LRU par capteurId (par processus : un capteur réparti sur plusieurs workers a un état par worker)
+    - trame inchangée (mêmes octets, ou miniature proche de la référence) : dernier résultat réutilisé,
+      sans inférence ; la référence n'est pas remplacée, une dérive lente finit donc par être détectée
+    - sinon, la prédiction rejoint une fenêtre glissante ; la classe retenue est celle de plus forte
+      confiance cumulée sur la fenêtre, et la sévérité / l'arrosage sont recalculés sur ce résultat lissé
+    """
+    
+    def __init__(self, max_sensors, change_threshold, histogram_threshold, max_reuse_seconds, window):
+        self.max_sensors = max_sensors
+        self.change_threshold = change_threshold
+        self.histogram_threshold = histogram_threshold
+        self.max_reuse_seconds = max_reuse_seconds
+        self.window = max(1, window)
+        self.states = OrderedDict()  # capteurId -> SensorState
+        self.lock = threading.Lock()
+        
+        # Statistiques
+        self.unchanged_hits = 0
+        self.identical_hits = 0
+        self.changed = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self):
+        return self.max_sensors > 0
+    
+    def unchanged(self, capteurId, version, digest, thumbnail=None):
+        """
+        Dernier résultat du capteur si la trame n'a pas changé, sinon None
+        Sans miniature, seule l'égalité des octets est testée (avant tout décodage)
+        """
+        with self.lock:
+            state = self.states.get(capteurId)
+            if state is None or state.version != version or state.result is None:
+                return None
+            if time.monotonic() - state.analysed_at > self.max_reuse_seconds:
+                return None
+            
+            if digest == state.digest:
+                self.identical_hits += 1
+            elif thumbnail is None or state.thumbnail is None:
+                return None
+            else:
+                pixel_diff, histogram_diff = thumbnail_distance(state.thumbnail, thumbnail)
+                if pixel_diff > self.change_threshold or histogram_diff > self.histogram_threshold:
+                    return None
+                self.unchanged_hits += 1
+            
+            self.states.move_to_end(capteurId)
+            return dict(state.result)
+    
+    def update(self, capteurId, version, digest, thumbnail, result):
+        """Nouvelle référence du capteur après une trame qui a changé"""
+        with self.lock:
+            state = self.states.get(capteurId)
+            if state is None or state.version != version:
+                state = SensorState(version, self.window)
+                self.states[capteurId] = state
+            state.digest = digest
+            if thumbnail is not None:
+                state.thumbnail = thumbnail
+            state.result = {k: v for k, v in result.items() if k not in REQUEST_FIELDS}
+            state.analysed_at = time.monotonic()
+            state.window.append((result['prediction'], result['confidence']))
+            self.changed += 1
+            
+            self.states.move_to_end(capteurId)
+            while len(self.states) > self.max_sensors:
+                self.states.popitem(last=False)
+                self.evictions += 1
+    
+    def smooth(self, capteurId, result, unchanged):
+        """Applique la fenêtre glissante du capteur au résultat (prédiction brute conservée dans 'raw')"""
+        with self.lock:
+            state = self.states.get(capteurId)
+            window = list(state.window) if state is not None else []
+        
+        result['sensor'] = {'unchanged': unchanged, 'window': len(window)}
+        if len(window) < 2:
+            return result
+        
+        scores = {}
+        for predicted_class, confidence in window:
+            scores[predicted_class] = scores.get(predicted_class, 0.0) + confidence
+        smoothed_class = max(scores, key=scores.get)
+        smoothed_confidence = scores[smoothed_class] / len(window)
+        
+        raw = {'prediction': result['prediction'], 'confidence': result['confidence'], 'severity': result['severity']}
+        smoothed = build_prediction_result(smoothed_class, smoothed_confidence, model_used=result['modelUsed'])
+        smoothed['timestamp'] = result['timestamp']
+        result.update(smoothed)
+        result['raw'] = raw
+        return result
+    
+    def clear(self):
+        with self.lock:
+            self.states.clear()
+    
+    def stats(self):
+        with self.lock:
+            hits = self.unchanged_hits + self.identical_hits
+            frames = hits + self.changed
+            return {
+                'enabled': self.enabled,
+                'sensors': len(self.states),
+                'max_sensors': self.max_sensors,
+                'change_threshold': self.change_threshold,
+                'histogram_threshold': self.histogram_threshold,
+                'smoothing_window': self.window,
+                'identical_hits': self.identical_hits,
+                'unchanged_hits': self.unchanged_hits,
+                'changed': self.changed,
+                'evictions': self.evictions,
+                'hit_ratio': round(hits / frames, 4) if frames else 0
+            }
+
+sensor_states = SensorStateStore(
+    SENSOR_STATE_SIZE,
+    SENSOR_CHANGE_THRESHOLD,
+    SENSOR_HISTOGRAM_THRESHOLD,
+    SENSOR_MAX_REUSE_SECONDS,
+    SENSOR_SMOOTHING_WINDOW
+)
+
+def mark_cached(result):
+    """Marque un résultat servi depuis le cache"""
+    result['cached'] = True
+    result['cachedAt'] = result['timestamp']
+    result['timestamp'] = datetime.now().isoformat()
+    return result
+
+# ═══════════════════════════════════════════════════════════
+# CONTRÔLE D'ADMISSION (BACKPRESSURE)
+# ═══════════════════════════════════════════════════════════
+
+ADMISSION_LANES = ('live', 'bulk')
+
+class AdmissionRejected(Exception):
+    """Requête refusée avant inférence : 429 (file pleine) ou 503 (délai intenable)"""
+    
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Borne le nombre de requêtes dans le chemin d'inférence (par processus)
+    - au plus `max_concurrency` requêtes admises, dont `bulk_max_concurrency` lots
+    - au-delà, attente FIFO par voie ; la voie live passe toujours avant les lots
+    - file pleine : refus immédiat (429) ; délai dépassé ou intenable au vu de
+      l'attente estimée : refus (503) ; Retry-After estimé d'après le temps de service moyen
+    """
+    
+    def __init__(self, max_concurrency, bulk_max_concurrency, queue_sizes):
+        self.max_concurrency = max_concurrency
+        self.bulk_max_concurrency = max(1, min(bulk_max_concurrency, max_concurrency))
+        self.queue_sizes = queue_sizes
+        self.condition = threading.Condition()
+        self.in_flight = {lane: 0 for lane in ADMISSION_LANES}
+        self.waiting = {lane: deque() for lane in ADMISSION_LANES}
+        self.service_time = {lane: None for lane in ADMISSION_LANES}  # moyenne mobile (s)
+        
+        # Statistiques
+        self.admitted = {lane: 0 for lane in ADMISSION_LANES}
+        self.rejected = {lane: {'queue_full': 0, 'deadline': 0} for lane in ADMISSION_LANES}
+        self.total_wait = {lane: 0.0 for lane in ADMISSION_LANES}
+    
+    @property
+    def enabled(self):
+        return self.max_concurrency > 0
+    
+    def _lane_capacity(self, lane):
+        return self.bulk_max_concurrency if lane == 'bulk' else self.max_concurrency
+    
+    def _can_run(self, lane):
+        if sum(self.in_flight.values()) >= self.max_concurrency:
+            return False
+        if lane == 'bulk':
+            return not self.waiting['live'] and self.in_flight['bulk'] < self.bulk_max_concurrency
+        return True
+    
+    def _estimated_wait(self, lane):
+        """Attente estimée (s) d'une nouvelle requête sur cette voie"""
+        ahead = len(self.waiting[lane]) + (len(self.waiting['live']) if lane == 'bulk' else 0)
+        return (ahead + 1) * (self.service_time[lane] or 1.0) / self._lane_capacity(lane)
+    
+    def _reject(self, lane, status, reason):
+        kind = 'queue_full' if status == 429 else 'deadline'
+        self.rejected[lane][kind] += 1
+        ADMISSION_REJECTIONS_TOTAL.inc(lane=lane, reason=kind)
+        return AdmissionRejected(status, reason, max(1, int(np.ceil(self._estimated_wait(lane)))))
+    
+    def acquire(self, lane, deadline):
+        """
+        Attend une place (au plus jusqu'à `deadline`, horloge time.monotonic)
+        Retourne le jeton à passer à release() ; lève AdmissionRejected
+        """
+        started = time.monotonic()
+        if not self.enabled:
+            return (lane, started)
+        
+        with self.condition:
+            if not self.waiting[lane] and self._can_run(lane):
+                self.in_flight[lane] += 1
+                self.admitted[lane] += 1
+                ADMISSION_QUEUE_WAIT.observe(0.0, lane=lane)
+                return (lane, started)
+            
+            if len(self.waiting[lane]) >= self.queue_sizes[lane]:
+                raise self._reject(lane, 429, 'Server busy, inference queue is full')
+            if started + self._estimated_wait(lane) > deadline and self.service_time[lane] is not None:
+                raise self._reject(lane, 503, 'Request deadline cannot be met')
+            
+            ticket = object()
+            self.waiting[lane].append(ticket)
+            try:
+                while not (self.waiting[lane][0] is ticket and self._can_run(lane)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject(lane, 503, 'Request deadline exceeded while queued')
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting[lane].remove(ticket)
+                self.condition.notify_all()
+            
+            admitted_at = time.monotonic()
+            self.in_flight[lane] += 1
+            self.admitted[lane] += 1
+            self.total_wait[lane] += admitted_at - started
+            ADMISSION_QUEUE_WAIT.observe(admitted_at - started, lane=lane)
+            return (lane, admitted_at)
+    
+    def release(self, token):
+        lane, admitted_at = token
+        if not self.enabled:
+            return
+        elapsed = time.monotonic() - admitted_at
+        with self.condition:
+            self.in_flight[lane] -= 1
+            previous = self.service_time[lane]
+            self.service_time[lane] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            self.condition.notify_all()
+    
+    @contextmanager
+    def slot(self, lane, deadline):
+        token = self.acquire(lane, deadline)
+        try:
+            yield
+        finally:
+            self.release(token)
+    
+    def stats(self):
+        with self.condition:
+            return {
+                'enabled': self.enabled,
+                'max_concurrency': self.max_concurrency,
+                'bulk_max_concurrency': self.bulk_max_concurrency,
+                'queue_sizes': dict(self.queue_sizes),
+                'in_flight': dict(self.in_flight),
+                'queued': {lane: len(waiting) for lane, waiting in self.waiting.items()},
+                'admitted': dict(self.admitted),
+                'rejected': {lane: dict(counts) for lane, counts in self.rejected.items()},
+                'avg_queue_wait_ms': {
+                    lane: round(self.total_wait[lane] / self.admitted[lane] * 1000, 2) if self.admitted[lane] else 0
+                    for lane in ADMISSION_LANES
+                },
+                'avg_service_ms': {
+                    lane: round(value * 1000, 2) if value is not None else None
+                    for lane, value in self.service_time.items()
+                }
+            }
+
+admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_BULK_MAX_CONCURRENCY,
+    {'live': ADMISSION_QUEUE_SIZE, 'bulk': ADMISSION_BULK_QUEUE_SIZE}
+)
+
+def request_deadline(lane, deadline_ms=None):
+    """
+    Échéance absolue (time.monotonic) d'une requête
+    `deadline_ms` (en-tête X-Deadline-Ms) peut raccourcir le délai par défaut de la voie, pas l'allonger
+    """
+    default_ms = BULK_REQUEST_DEADLINE_MS if lane == 'bulk' else REQUEST_DEADLINE_MS
+    try:
+        budget_ms = min(default_ms, float(deadline_ms)) if deadline_ms else default_ms
+    except ValueError:
+        budget_ms = default_ms
+    return time.monotonic() + max(0.0, budget_ms) / 1000.0
+
+def admission_rejected_response(e):
+    """Réponse 429/503 avec Retry-After"""
+    response = jsonify({'success': False, 'error': str(e), 'retryAfter': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status
+
+# ═══════════════════════════════════════════════════════════
+# ANALYSE (PARTAGÉE PAR FLASK ET ASGI)
+# ═══════════════════════════════════════════════════════════
+
+@micro_batcher.tracking()
+def analyse_image(image_bytes, capteurId=None, userId=None, model_version=None, preprocess=None):
+    """
+    Cache, prétraitement, prédiction et envoi backend d'une image déjà reçue
+    Partagé par la route Flask /predict et le point d'entrée ASGI (asgi.py)
+    `preprocess(image_bytes, out)` remplace preprocess_image (trames binaires)
+    """
+    # Cache indexé par version résolue ; la version active passe par le micro-batching
+    model_version = pinned_version(model_version)
+    cache_version = model_version or (active_model.version if active_model is not None else DEMO_VERSION)
+    digest = image_hash(image_bytes)
+    cache_key = (cache_version, digest)
+    track_sensor = bool(capteurId) and sensor_states.enabled
+    thumbnail = phash = None
+    
+    # Même trame que la précédente de ce capteur, puis trame déjà analysée (même version du modèle) ?
+    result = sensor_states.unchanged(capteurId, cache_version, digest) if track_sensor else None
+    sensor_unchanged = result is not None
+    if result is None:
+        result = prediction_cache.get(cache_key)
+    
+    if result is None:
+        # Prétraiter l'image
+        img_array = (preprocess or preprocess_image)(image_bytes, out=get_thread_buffer(input_size_for(model_version)))
+        
+        # Scène inchangée pour ce capteur (miniature proche de la référence) ?
+        if track_sensor:
+            thumbnail = sensor_thumbnail(img_array)
+            result = sensor_states.unchanged(capteurId, cache_version, digest, thumbnail)
+            sensor_unchanged = result is not None
+        
+        if result is None and PREDICTION_CACHE_PHASH_DISTANCE >= 0:
+            phash = perceptual_hash(img_array)
+            result = prediction_cache.get_similar(cache_version, phash)
+    
+    if result is not None:
+        result = mark_cached(result)
+    else:
+        prediction_cache.miss()
+        
+        # Prédiction
+        if MICRO_BATCHING and not model_version:
+            result = micro_batcher.predict(img_array)
+        else:
+            result = predict_disease(img_array, model_version)
+        
+        prediction_cache.put(cache_key, result, phash)
+        result['cached'] = False
+    
+    # Fenêtre glissante du capteur : sévérité / arrosage décidés sur la prédiction lissée
+    if track_sensor:
+        SENSOR_FRAMES_TOTAL.inc(outcome='unchanged' if sensor_unchanged else 'changed')
+        if not sensor_unchanged:
+            sensor_states.update(capteurId, cache_version, digest, thumbnail, result)
+        result = sensor_states.smooth(capteurId, result, sensor_unchanged)
+    
+    # ✅ ENVOI AVEC userId (file asynchrone, non bloquant)
+    # Scène inchangée : le backend a déjà reçu ce résultat
+    backend_success = False
+    delivery_id = None
+    try:
+        if not (sensor_unchanged and SENSOR_SKIP_BACKEND_UNCHANGED):
+            backend_success, delivery_id = deliver_results(result, capteurId, userId)
+    except Exception as e:
+        logger.warning(f"⚠️ Erreur envoi backend (non bloquant): {e}")
+    
+    result['backend_sent'] = backend_success
+    result['deliveryId'] = delivery_id
+    result['success'] = True
+    
+    if STARTUP_TIMINGS['time_to_first_prediction_seconds'] is None:
+        STARTUP_TIMINGS['time_to_first_prediction_seconds'] = round(time.time() - APP_START_TIME, 3)
+    
+    return result
+
+def log_prediction(log_fields, result, started):
+    """Un seul enregistrement pour la requête (échantillonné si LOG_SAMPLE_RATE < 1)"""
+    log_fields.update(
+        prediction=result['prediction'],
+        confidence=round(result['confidence'], 4),
+        severity=result['severity'],
+        shouldWater=result['shouldWater'],
+        modelUsed=result['modelUsed'],
+        cached=result['cached'],
+        backend_sent=result['backend_sent'],
+        deliveryId=result['deliveryId'],
+        duration_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+    structured_logging.log_request(logger, "✅ Analyse terminée", log_fields)
+
+def analyse_frame(frame_bytes, model_version=None):
+    """
+    Analyse d'une trame binaire (POST /predict-frame) : pixels lus sans copie ni PIL
+    Retourne (métadonnées de la trame, résultat) ; lève FrameError si la trame est invalide
+    """
+    metadata, pixels = parse_frame(frame_bytes)
+    IMAGE_BYTES.observe(len(frame_bytes))
+    result = analyse_image(
+        frame_bytes, metadata['capteurId'], metadata['userId'], model_version,
+        preprocess=lambda _, out: preprocess_frame(metadata, pixels, out)
+    )
+    return metadata, result
+
+def analyse_batch(images_bytes, capteurId=None, model_version=None):
+    """Analyse d'un lot d'images déjà reçues : corps de réponse de /predict-batch"""
+    logger.info(f"📸 Analyse batch: {len(images_bytes)} image(s)")
+    
+    # Décodage parallèle dans un seul tableau (N, H, W, 3)
+    batch, valid_indices, errors = preprocess_images(images_bytes, input_size_for(model_version))
+    
+    # Un seul appel modèle pour toutes les images valides
+    predictions = predict_disease_batch(batch, model_version) if valid_indices else []
+    
+    # Envoyer au backend (file asynchrone, regroupée si supporté)
+    deliveries = [deliver_results(result, capteurId) for result in predictions]
+    
+    results = [None] * len(images_bytes)
+    for idx, result, (sent, delivery_id) in zip(valid_indices, predictions, deliveries):
+        result['backend_sent'] = sent
+        result['deliveryId'] = delivery_id
+        result['success'] = True
+        results[idx] = result
+    
+    for idx, e in errors.items():
+        results[idx] = {
+            'success': False,
+            'image_index': idx,
+            'error': str(e)
+        }
+    
+    return {
+        'success': True,
+        'total': len(images_bytes),
+        'success_count': len(valid_indices),
+        'results': results
+    }
+
+# ═══════════════════════════════════════════════════════════
+# ANALYSE PAR LOT EN STREAMING
+# ═══════════════════════════════════════════════════════════
+
+@micro_batcher.tracking()
+def analyse_streamed_image(image_bytes, model_version=None):
+    """Prétraitement + prédiction d'une image reçue en streaming (thread du pool de décodage)"""
+    model_version = pinned_version(model_version)
+    img_array = preprocess_image(image_bytes, size=input_size_for(model_version))
+    if MICRO_BATCHING and not model_version:
+        return micro_batcher.predict(img_array)
+    return predict_disease(img_array, model_version)
+
+def stream_batch_results(stream, boundary, model_version=None):
+    """
+    Parse le corps multipart au fil de l'eau et produit une ligne NDJSON par image
+    - les limites par image (MAX_IMAGE_SIZE) et totales (MAX_BATCH_BYTES, MAX_BATCH_IMAGES)
+      sont vérifiées pendant la lecture
+    - chaque image est analysée dès que sa partie est complète
+    - les champs texte (capteurId, userId) doivent précéder les images
+    """
+    decoder = MultipartDecoder(boundary.encode())
+    fields = {}
+    pending = {}  # future -> (indice, nom de fichier)
+    part = None
+    total_bytes = 0
+    image_count = 0
+    success_count = 0
+    
+    def line(payload):
+        return json.dumps(payload, default=str) + '\n'
+    
+    def drain(block):
+        """Produit les résultats des images terminées (toutes si block=True)"""
+        nonlocal success_count
+        for future in list(pending):
+            if not block and not future.done():
+                continue
+            idx, filename = pending.pop(future)
+            try:
+                result = future.result()
+                sent, delivery_id = deliver_results(result, fields.get('capteurId'), fields.get('userId'))
+                result.update(image_index=idx, filename=filename, backend_sent=sent, deliveryId=delivery_id, success=True)
+                success_count += 1
+            except Exception as e:
+                logger.error(f"❌ Erreur image {idx+1}: {e}")
+                ERRORS_TOTAL.inc(endpoint='/predict-batch/stream', type=type(e).__name__)
+                result = {'success': False, 'image_index': idx, 'filename': filename, 'error': str(e)}
+            yield line(result)
+    
+    try:
+        while True:
+            event = decoder.next_event()
+            
+            if isinstance(event, NeedData):
+                chunk = stream.read(STREAM_CHUNK_SIZE)
+                total_bytes += len(chunk)
+                if total_bytes > MAX_BATCH_BYTES:
+                    yield line({'success': False, 'error': f'Batch too large (max {MAX_BATCH_BYTES} bytes)'})
+                    break
+                decoder.receive_data(chunk or None)
+                yield from drain(block=False)
+            
+            elif isinstance(event, Epilogue):
+                break
+            
+            elif isinstance(event, File):
+                part = {'file': True, 'index': image_count, 'filename': event.filename, 'chunks': [], 'size': 0, 'error': None}
+                image_count += 1
+                if image_count > MAX_BATCH_IMAGES:
+                    yield line({'success': False, 'error': f'Too many images (max {MAX_BATCH_IMAGES})'})
+                    break
+            
+            elif isinstance(event, Field):
+                part = {'file': False, 'name': event.name, 'chunks': [], 'size': 0, 'error': None}
+            
+            elif isinstance(event, Data) and part is not None:
+                part['size'] += len(event.data)
+                if part['file'] and part['size'] > MAX_IMAGE_SIZE:
+                    # Image trop grande : le reste de la partie est ignoré sans être bufferisé
+                    part['error'] = 'Image too large (max 10MB)'
+                    part['chunks'] = []
+                elif part['error'] is None:
+                    part['chunks'].append(event.data)
+                
+                if not event.more_data:
+                    if not part['file']:
+                        fields[part['name']] = b''.join(part['chunks']).decode('utf-8', 'replace')
+                    elif part['error']:
+                        yield line({'success': False, 'image_index': part['index'], 'filename': part['filename'], 'error': part['error']})
+                    else:
+                        future = decode_executor.submit(analyse_streamed_image, b''.join(part['chunks']), model_version)
+                        pending[future] = (part['index'], part['filename'])
+                    part = None
+    
+    except ValueError as e:
+        yield line({'success': False, 'error': f'Invalid multipart body: {e}'})
+    
+    yield from drain(block=True)
+    yield line({'done': True, 'total': image_count, 'success_count': success_count})
 
 # ═══════════════════════════════════════════════════════════
 # ROUTES API
 # ═══════════════════════════════════════════════════════════
 
+@app.before_request
+def start_request_timer():
+    metrics.ensure_flusher()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route (et non chemin) : pas d'explosion de cardinalité sur les 404
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Vérification de l'état du service"""
+    """Vérification de l'état du service (starting, ready, degraded, failed)"""
+    if STARTUP_TIMINGS['time_to_first_healthy_seconds'] is None:
+        STARTUP_TIMINGS['time_to_first_healthy_seconds'] = round(time.time() - APP_START_TIME, 3)
+    
     return jsonify({
-        'status': 'online',
+        'status': MODEL_STATE,
         'service': 'Plant Disease Detection AI',
         'version': '2.0.0',
         'model_loaded': MODEL_LOADED,
-        'model_path': MODEL_PATH,
+        'model_path': active_model_path(),
+        'inference_backend': INFERENCE_BACKEND,
         'backend_url': BACKEND_URL,
         'backend_enabled': SEND_TO_BACKEND,
+        'model_version': active_model.version if active_model is not None else None,
         'supported_classes': len(DISEASE_CLASSES),
+        'startup': STARTUP_TIMINGS,
         'timestamp': datetime.now().isoformat()
     })
 @app.route('/predict', methods=['POST'])
@@ -358,18 +2274,28 @@ def predict():
     - capteurId (form): ID du capteur (optionnel)
     - userId (form): ID de l'utilisateur (optionnel) ← AJOUT
     """
+    log_fields = {'endpoint': '/predict'}
     try:
         # Vérifier présence image
         if 'image' not in request.files:
             logger.error("❌ Aucune image fournie")
             return jsonify({'success': False, 'error': 'No image provided'}), 400
         
+        # Modèle encore en cours de chargement ?
+        if not wait_for_model():
+            return model_unavailable_response()
+        
         file = request.files['image']
         
         # ✅ RÉCUPÉRATION DES DEUX IDs
         capteurId = request.form.get('capteurId', None)
         userId = request.form.get('userId', None)
         
+        # Version du modèle épinglée (optionnelle)
+        model_version = requested_model_version()
+        if model_version and not model_version_exists(model_version):
+            return jsonify({'success': False, 'error': f'Unknown model version: {model_version}'}), 404
+        
         # Lire l'image
         image_bytes = file.read()
         
@@ -378,48 +2304,76 @@ def predict():
             logger.error(f"❌ Image trop large: {len(image_bytes)} bytes")
             return jsonify({'success': False, 'error': 'Image too large (max 10MB)'}), 400
         
-        logger.info(f"📸 Image reçue")
-        logger.info(f"   Capteur ID: {capteurId or 'Non spécifié'}")
-        logger.info(f"   User ID: {userId or 'Non spécifié'}")  # ← AJOUT
-        logger.info(f"   Taille: {len(image_bytes)} bytes ({len(image_bytes)/1024:.1f} KB)")
+        log_fields.update(capteurId=capteurId, userId=userId, image_bytes=len(image_bytes))
         
-        # Prétraiter l'image
-        logger.info("🔄 Prétraitement de l'image...")
-        img_array = preprocess_image(image_bytes)
+        with admission.slot('live', request_deadline('live', request.headers.get('X-Deadline-Ms'))):
+            result = analyse_image(image_bytes, capteurId, userId, model_version)
+        log_prediction(log_fields, result, g.request_started)
         
-        # Prédiction
-        logger.info("🔍 Analyse en cours...")
-        result = predict_disease(img_array)
+        # L'IMAGE EST AUTOMATIQUEMENT SUPPRIMÉE ICI
+        return jsonify(result), 200
         
-        logger.info(f"✅ Analyse terminée:")
-        logger.info(f"   Maladie: {result['prediction']}")
-        logger.info(f"   Confiance: {result['confidence']*100:.1f}%")
-        logger.info(f"   Sévérité: {result['severity']}")
-        logger.info(f"   Arrosage: {'✓' if result['shouldWater'] else '✗'}")
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        # Erreurs : toujours journalisées, avec tous les champs et la trace
+        log_fields.update(error=str(e), error_type=type(e).__name__)
+        structured_logging.log_request(logger, "❌ Erreur analyse", log_fields, success=False, exc_info=True)
+        ERRORS_TOTAL.inc(endpoint='/predict', type=type(e).__name__)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'type': type(e).__name__
+        }), 500
+@app.route('/predict-frame', methods=['POST'])
+def predict_frame():
+    """
+    Analyse d'une trame binaire compacte (en-tête + pixels RGB888/YUV422, voir frame_format.py)
+    Même réponse que /predict, sans décodage JPEG ni PIL
+    
+    Parameters:
+    - corps (application/octet-stream): trame (capteurId et userId inclus dans l'en-tête)
+    - X-Model-Version (header): version épinglée (optionnel)
+    """
+    log_fields = {'endpoint': '/predict-frame'}
+    try:
+        if request.content_length is not None and request.content_length > MAX_IMAGE_SIZE:
+            return jsonify({'success': False, 'error': 'Frame too large (max 10MB)'}), 400
         
-        # ✅ ENVOI AVEC userId
-        backend_success = False
-        try:
-            backend_success = send_results_to_backend(result, capteurId, userId)
-        except Exception as e:
-            logger.warning(f"⚠️ Erreur envoi backend (non bloquant): {e}")
+        # Modèle encore en cours de chargement ?
+        if not wait_for_model():
+            return model_unavailable_response()
         
-        result['backend_sent'] = backend_success
-        result['success'] = True
+        model_version = request.headers.get('X-Model-Version') or None
+        if model_version and not model_version_exists(model_version):
+            return jsonify({'success': False, 'error': f'Unknown model version: {model_version}'}), 404
         
-        # L'IMAGE EST AUTOMATIQUEMENT SUPPRIMÉE ICI
-        logger.info("🗑️ Image supprimée de la mémoire")
+        frame_bytes = request.get_data(cache=False)
+        with admission.slot('live', request_deadline('live', request.headers.get('X-Deadline-Ms'))):
+            metadata, result = analyse_frame(frame_bytes, model_version)
         
+        log_fields.update(
+            capteurId=metadata['capteurId'], userId=metadata['userId'], image_bytes=len(frame_bytes),
+            pixel_format=metadata['pixel_format'], frame_size=f"{metadata['width']}x{metadata['height']}"
+        )
+        log_prediction(log_fields, result, g.request_started)
         return jsonify(result), 200
-        
+    
+    except FrameError as e:
+        ERRORS_TOTAL.inc(endpoint='/predict-frame', type=type(e).__name__)
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
-        logger.error(f"❌ Erreur analyse: {str(e)}")
-        logger.error(traceback.format_exc())
+        log_fields.update(error=str(e), error_type=type(e).__name__)
+        structured_logging.log_request(logger, "❌ Erreur analyse trame", log_fields, success=False, exc_info=True)
+        ERRORS_TOTAL.inc(endpoint='/predict-frame', type=type(e).__name__)
         return jsonify({
             'success': False,
             'error': str(e),
             'type': type(e).__name__
         }), 500
+
 @app.route('/predict-batch', methods=['POST'])
 def predict_batch():
     """Analyse plusieurs images en une requête"""
@@ -427,68 +2381,148 @@ def predict_batch():
         if 'images' not in request.files:
             return jsonify({'success': False, 'error': 'No images provided'}), 400
         
+        # Modèle encore en cours de chargement ?
+        if not wait_for_model():
+            return model_unavailable_response()
+        
         files = request.files.getlist('images')
         capteurId = request.form.get('capteurId', None)
         
-        results = []
-        success_count = 0
-        
-        for idx, file in enumerate(files):
-            try:
-                logger.info(f"📸 Analyse image {idx+1}/{len(files)}")
-                
-                image_bytes = file.read()
-                img_array = preprocess_image(image_bytes)
-                result = predict_disease(img_array)
-                
-                # Envoyer au backend
-                backend_sent = send_results_to_backend(result, capteurId)
-                result['backend_sent'] = backend_sent
-                result['success'] = True
-                
-                results.append(result)
-                success_count += 1
-                
-            except Exception as e:
-                logger.error(f"❌ Erreur image {idx+1}: {e}")
-                results.append({
-                    'success': False,
-                    'image_index': idx,
-                    'error': str(e)
-                })
+        # Version du modèle épinglée (optionnelle)
+        model_version = requested_model_version()
+        if model_version and not model_version_exists(model_version):
+            return jsonify({'success': False, 'error': f'Unknown model version: {model_version}'}), 404
         
-        return jsonify({
-            'success': True,
-            'total': len(files),
-            'success_count': success_count,
-            'results': results
-        }), 200
+        images_bytes = [file.read() for file in files]
+        with admission.slot('bulk', request_deadline('bulk', request.headers.get('X-Deadline-Ms'))):
+            payload = analyse_batch(images_bytes, capteurId, model_version)
+        return jsonify(payload), 200
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"❌ Erreur batch: {e}")
+        ERRORS_TOTAL.inc(endpoint='/predict-batch', type=type(e).__name__)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/predict-batch/stream', methods=['POST'])
+def predict_batch_stream():
+    """
+    Analyse par lot en streaming, sans bufferiser toute la requête
+    Réponse NDJSON : une ligne par image dès qu'elle est analysée, puis une ligne de synthèse
+    
+    Parameters:
+    - images (files): Images à analyser
+    - capteurId, userId (form): à placer AVANT les images dans le corps multipart
+    - X-Model-Version (header) ou ?modelVersion=: version épinglée (optionnel)
+    """
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'success': False, 'error': 'multipart/form-data body required'}), 400
+    
+    # Modèle encore en cours de chargement ?
+    if not wait_for_model():
+        return model_unavailable_response()
+    
+    # Le corps est lu en flux : ne pas utiliser request.form ici
+    model_version = request.headers.get('X-Model-Version') or request.args.get('modelVersion')
+    if model_version and not model_version_exists(model_version):
+        return jsonify({'success': False, 'error': f'Unknown model version: {model_version}'}), 404
+    
+    # Place réservée avant la réponse (429/503 possibles), libérée à la fin du flux
+    try:
+        token = admission.acquire('bulk', request_deadline('bulk', request.headers.get('X-Deadline-Ms')))
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    
+    logger.info("📸 Analyse batch en streaming")
+    response = Response(
+        stream_with_context(stream_batch_results(request.stream, boundary, model_version)),
+        mimetype='application/x-ndjson'
+    )
+    response.call_on_close(lambda: admission.release(token))
+    return response
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Statistiques du service IA"""
     return jsonify({
+        'status': MODEL_STATE,
         'model_loaded': MODEL_LOADED,
-        'model_path': MODEL_PATH,
+        'model_path': active_model_path(),
+        'inference_backend': INFERENCE_BACKEND,
+        'inference_processes': INFERENCE_PROCESSES if INFERENCE_POOL_ENABLED else 0,
+        'model_version': active_model.version if active_model is not None else None,
+        'pinned_versions': list(pinned_models),
         'backend_url': BACKEND_URL,
         'backend_enabled': SEND_TO_BACKEND,
         'supported_classes': DISEASE_CLASSES,
-        'total_classes': len(DISEASE_CLASSES)
+        'total_classes': len(DISEASE_CLASSES),
+        'micro_batching': micro_batcher.stats(),
+        'backend_delivery': backend_dispatcher.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'logging': structured_logging.stats(),
+        'tta': tta_stats(),
+        'sensor_state': sensor_states.stats(),
+        'admission': admission.stats(),
+        'startup': STARTUP_TIMINGS
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Histogrammes et compteurs au format Prometheus (agrégés sur tous les workers gunicorn)"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/reload-model', methods=['POST'])
 def reload_model():
-    """Recharge le modèle (utile après mise à jour)"""
+    """
+    Recharge le modèle (utile après mise à jour) sans interrompre le service
+    Le nouveau modèle est chargé et préchauffé, puis échangé atomiquement
+    
+    Parameters (JSON ou form, optionnels):
+    - version: version du registre à activer ('latest' = la plus récente)
+    - wait: false pour rendre la main immédiatement (202)
+    """
     try:
-        load_model()
+        params = request.get_json(silent=True) or request.form
+        version = params.get('version') or None
+        wait = str(params.get('wait', 'true')).lower() != 'false'
+        
+        # Version tout juste enregistrée ou exportée : relire le registre
+        invalidate_model_versions()
+        
+        if version and not model_version_exists(version):
+            return jsonify({'success': False, 'error': f'Unknown model version: {version}'}), 404
+        
+        if not wait:
+            started = reload_in_background(version, promote=bool(version))
+            return jsonify({
+                'success': started,
+                'status': 'loading' if started else 'busy',
+                'version': version,
+                'model_version': active_model.version if active_model is not None else None
+            }), 202 if started else 409
+        
+        with model_swap_in_progress:
+            loaded = load_model(version, promote=bool(version))
+        
+        if not loaded:
+            # L'ancienne version (s'il y en a une) reste servie, caches conservés
+            return jsonify({
+                'success': False,
+                'error': f'Model load failed: {version or "active version"}',
+                'model_loaded': MODEL_LOADED,
+                'model_version': active_model.version if active_model is not None else None
+            }), 500
+        
+        prediction_cache.clear()
+        sensor_states.clear()
+        
         return jsonify({
             'success': True,
             'model_loaded': MODEL_LOADED,
-            'message': 'Modèle rechargé avec succès' if MODEL_LOADED else 'Modèle introuvable'
+            'model_version': active_model.version,
+            'message': 'Modèle rechargé avec succès'
         })
     except Exception as e:
         return jsonify({
@@ -496,12 +2530,28 @@ def reload_model():
             'error': str(e)
         }), 500
 
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Versions disponibles dans le registre de modèles"""
+    versions = list_model_versions()
+    return jsonify({
+        'registry': MODEL_REGISTRY_DIR,
+        'inference_backend': INFERENCE_BACKEND,
+        'active': active_model.describe() if active_model is not None else None,
+        'promoted': read_active_version(),
+        'pinned': [entry.describe() for entry in list(pinned_models.values())],
+        'versions': [
+            {'version': version, **{k: v for k, v in metadata.items() if k != 'version'}}
+            for version, metadata in versions.items()
+        ]
+    })
+
 @app.route('/test-backend', methods=['GET'])
 def test_backend():
     """Test de connexion au backend"""
     try:
         url = f'{BACKEND_URL}/health'
-        response = requests.get(url, timeout=5)
+        response = backend_session.get(url, timeout=5)
         
         return jsonify({
             'success': True,
@@ -530,7 +2580,13 @@ if __name__ == '__main__':
     print(f"📍 Port: {port}")
     print(f"🔗 Backend: {BACKEND_URL}")
     print(f"🔑 API Key: {BACKEND_API_KEY[:10]}..." if len(BACKEND_API_KEY) > 10 else "Non configurée")
-    print(f"📦 Modèle: {'✅ Chargé' if MODEL_LOADED else '❌ Non chargé (mode DÉMO)'}")
+    model_status = {
+        'ready': '✅ Chargé',
+        'degraded': '❌ Non chargé (mode DÉMO)',
+        'failed': f'❌ Artefact {INFERENCE_BACKEND} introuvable (503)',
+        'starting': f'⏳ Chargement en cours ({MODEL_LOAD_MODE})'
+    }
+    print(f"📦 Modèle: {model_status[MODEL_STATE]} - backend {INFERENCE_BACKEND}")
     print(f"📤 Envoi backend: {'✅ Activé' if SEND_TO_BACKEND else '❌ Désactivé'}")
     print(f"🌱 Classes supportées: {len(DISEASE_CLASSES)}")
     print(f"💡 Architecture: ESP32 → IA → Backend (sans stockage)")
@@ -539,8 +2595,12 @@ if __name__ == '__main__':
     print("   GET  /health           - État du service")
     print("   POST /predict          - Analyser une image")
     print("   POST /predict-batch    - Analyser plusieurs images")
+    print("   POST /predict-batch/stream - Lot en streaming (NDJSON)")
+    print("   POST /predict-frame    - Analyser une trame binaire (RGB/YUV)")
     print("   GET  /stats            - Statistiques")
+    print("   GET  /metrics          - Métriques Prometheus")
     print("   POST /reload-model     - Recharger le modèle")
+    print("   GET  /models           - Versions du registre de modèles")
     print("   GET  /test-backend     - Tester connexion backend")
     print("\n💡 Notes:")
     print("   • Les images sont supprimées après analyse")
@@ -0,0 +1,408 @@
+"""
+Point d'entrée ASGI (asyncio) pour les flottes d'ESP32 à fort fan-in
+
+Mêmes contrats que l'application Flask pour /predict, /predict-batch, /predict-frame,
+/health et /stats (+ /metrics), mais :
+- le corps multipart est lu de façon asynchrone, message par message : un upload lent
+  sur lien cellulaire n'occupe aucun thread pendant sa réception
+- le travail CPU (prétraitement, prédiction via app.analyse_image / app.analyse_batch)
+  est exécuté dans un pool de threads, ce qui préserve le micro-batching
+- l'envoi au backend passe par la file asynchrone de app.py (BackendDispatcher)
+- CORS comme flask_cors `CORS(app)` : origine renvoyée en écho, preflight OPTIONS accepté
+
+L'application Flask (`app:app`) reste le point d'entrée par défaut.
+
+Lancement:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker   # avec gunicorn.conf.py (pool, métriques)
+"""
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Data, File, Field, Epilogue
+
+import app as service
+import metrics
+import structured_logging
+
+logger = service.logger
+
+# Threads pour le travail bloquant (prétraitement, prédiction, attente du modèle)
+# Assez pour les requêtes admises et celles en file d'admission (voir app.AdmissionController)
+ASGI_EXECUTOR_WORKERS = int(os.getenv('ASGI_EXECUTOR_WORKERS', str(max(
+    32, service.BATCH_MAX_SIZE * 2,
+    service.ADMISSION_MAX_CONCURRENCY + service.ADMISSION_QUEUE_SIZE + service.ADMISSION_BULK_QUEUE_SIZE))))
+executor = ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_WORKERS, thread_name_prefix='asgi')
+
+class UploadError(Exception):
+    """Corps de requête refusé (statut HTTP associé)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ClientDisconnected(Exception):
+    pass
+
+# ═══════════════════════════════════════════════════════════
+# UTILITAIRES ASGI
+# ═══════════════════════════════════════════════════════════
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+def header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def send_response(send, status, body, content_type=b'application/json', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()), *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+async def send_json(send, status, payload, headers=()):
+    return await send_response(send, status, json.dumps(payload, default=str).encode(), headers=headers)
+
+async def model_unavailable(send):
+    """Réponse 503 pendant le chargement initial du modèle ou après son échec (comme app.model_unavailable_response)"""
+    return await send_json(send, 503, {
+        'success': False,
+        'error': service.model_unavailable_error(),
+        'status': service.MODEL_STATE
+    }, headers=[(b'retry-after', str(max(1, int(service.MODEL_WAIT_TIMEOUT))).encode())])
+
+async def admission_rejected(send, e):
+    """Réponse 429/503 avec Retry-After (comme app.admission_rejected_response)"""
+    return await send_json(send, e.status, {'success': False, 'error': str(e), 'retryAfter': e.retry_after},
+                           headers=[(b'retry-after', str(e.retry_after).encode())])
+
+def admitted(lane, deadline, func, *args):
+    """Exécute `func` (thread du pool) après admission dans la voie `lane`"""
+    with service.admission.slot(lane, deadline):
+        return func(*args)
+
+def deadline_for(scope, lane):
+    return service.request_deadline(lane, header(scope, b'x-deadline-ms'))
+
+async def read_multipart(scope, receive):
+    """
+    Lit le corps multipart au fil des messages ASGI
+    Retourne (champs texte, [(nom, octets)]) ; au-delà de MAX_IMAGE_SIZE une image
+    n'est plus bufferisée (elle est refusée en aval sur sa taille)
+    """
+    mimetype, options = parse_options_header(header(scope, b'content-type') or '')
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise UploadError(400, 'multipart/form-data body required')
+
+    decoder = MultipartDecoder(boundary.encode())
+    fields, files = {}, []
+    part = None
+    total_bytes = 0
+    more_body = True
+
+    try:
+        while True:
+            event = decoder.next_event()
+
+            if isinstance(event, NeedData):
+                if not more_body:
+                    raise UploadError(400, 'Invalid multipart body: unexpected end')
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise ClientDisconnected()
+                chunk = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                total_bytes += len(chunk)
+                if total_bytes > service.MAX_BATCH_BYTES:
+                    raise UploadError(413, f'Batch too large (max {service.MAX_BATCH_BYTES} bytes)')
+                decoder.receive_data(chunk)
+                if not more_body:
+                    decoder.receive_data(None)
+
+            elif isinstance(event, Epilogue):
+                return fields, files
+
+            elif isinstance(event, (File, Field)):
+                if isinstance(event, File) and len(files) >= service.MAX_BATCH_IMAGES:
+                    raise UploadError(413, f'Too many images (max {service.MAX_BATCH_IMAGES})')
+                part = {'file': isinstance(event, File), 'name': event.name, 'chunks': [], 'size': 0}
+
+            elif isinstance(event, Data) and part is not None:
+                if part['size'] <= service.MAX_IMAGE_SIZE:
+                    part['chunks'].append(event.data)
+                part['size'] += len(event.data)
+
+                if not event.more_data:
+                    data = b''.join(part['chunks'])
+                    if part['file']:
+                        files.append((part['name'], data))
+                    else:
+                        fields[part['name']] = data.decode('utf-8', 'replace')
+                    part = None
+
+    except ValueError as e:
+        raise UploadError(400, f'Invalid multipart body: {e}')
+
+async def read_body(receive, limit):
+    """Corps brut (trames binaires), refusé au-delà de `limit` octets"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise UploadError(400, f'Frame too large (max {limit // (1024 * 1024)}MB)')
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+# Méthodes annoncées au preflight (valeur par défaut de flask_cors)
+CORS_METHODS = b'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+
+def cors_headers(scope):
+    """En-têtes CORS de flask_cors `CORS(app)` : toute origine, renvoyée en écho"""
+    origin = header(scope, b'origin')
+    if not origin:
+        return []
+    return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+
+def without_body(send):
+    """Réponse à HEAD : en-têtes (dont content-length) de la réponse GET, corps vide"""
+    async def head_send(message):
+        if message['type'] == 'http.response.body':
+            message = {**message, 'body': b''}
+        await send(message)
+    return head_send
+
+def with_cors(scope, send):
+    """Ajoute les en-têtes CORS au début de chaque réponse"""
+    headers = cors_headers(scope)
+    if not headers:
+        return send
+
+    async def cors_send(message):
+        if message['type'] == 'http.response.start':
+            message = {**message, 'headers': [*message.get('headers', []), *headers]}
+        await send(message)
+    return cors_send
+
+async def preflight(scope, send, method):
+    """Réponse OPTIONS (preflight CORS des navigateurs), comme Flask + flask_cors"""
+    allowed = f"{method}, HEAD, OPTIONS" if method == 'GET' else f"{method}, OPTIONS"
+    headers = [(b'allow', allowed.encode())]
+    if header(scope, b'origin') and header(scope, b'access-control-request-method'):
+        headers.append((b'access-control-allow-methods', CORS_METHODS))
+        requested_headers = header(scope, b'access-control-request-headers')
+        if requested_headers:
+            headers.append((b'access-control-allow-headers', requested_headers.encode('latin-1')))
+    return await send_response(send, 200, b'', content_type=b'text/html; charset=utf-8', headers=headers)
+
+def requested_model_version(scope, fields):
+    """Champ modelVersion ou en-tête X-Model-Version (comme app.requested_model_version)"""
+    return fields.get('modelVersion') or header(scope, b'x-model-version') or None
+
+# ═══════════════════════════════════════════════════════════
+# ROUTES
+# ═══════════════════════════════════════════════════════════
+
+async def predict(scope, receive, send):
+    """/predict : même contrat que la route Flask"""
+    log_fields = {'endpoint': '/predict'}
+    started = time.perf_counter()
+    try:
+        fields, files = await read_multipart(scope, receive)
+        image_bytes = next((data for name, data in files if name == 'image'), None)
+        if image_bytes is None:
+            logger.error("❌ Aucune image fournie")
+            return await send_json(send, 400, {'success': False, 'error': 'No image provided'})
+
+        # Modèle encore en cours de chargement ?
+        if not await run_blocking(service.wait_for_model):
+            return await model_unavailable(send)
+
+        capteurId = fields.get('capteurId')
+        userId = fields.get('userId')
+
+        model_version = requested_model_version(scope, fields)
+        if model_version and not service.model_version_exists(model_version):
+            return await send_json(send, 404, {'success': False, 'error': f'Unknown model version: {model_version}'})
+
+        if len(image_bytes) > service.MAX_IMAGE_SIZE:
+            logger.error(f"❌ Image trop large: {len(image_bytes)} bytes")
+            return await send_json(send, 400, {'success': False, 'error': 'Image too large (max 10MB)'})
+
+        log_fields.update(capteurId=capteurId, userId=userId, image_bytes=len(image_bytes))
+
+        result = await run_blocking(admitted, 'live', deadline_for(scope, 'live'),
+                                    service.analyse_image, image_bytes, capteurId, userId, model_version)
+        service.log_prediction(log_fields, result, started)
+        return await send_json(send, 200, result)
+
+    except UploadError as e:
+        return await send_json(send, e.status, {'success': False, 'error': str(e)})
+    except service.AdmissionRejected as e:
+        return await admission_rejected(send, e)
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        log_fields.update(error=str(e), error_type=type(e).__name__)
+        structured_logging.log_request(logger, "❌ Erreur analyse", log_fields, success=False, exc_info=True)
+        service.ERRORS_TOTAL.inc(endpoint='/predict', type=type(e).__name__)
+        return await send_json(send, 500, {'success': False, 'error': str(e), 'type': type(e).__name__})
+
+async def predict_batch(scope, receive, send):
+    """/predict-batch : même contrat que la route Flask"""
+    try:
+        fields, files = await read_multipart(scope, receive)
+        images_bytes = [data for name, data in files if name == 'images']
+        if not images_bytes:
+            return await send_json(send, 400, {'success': False, 'error': 'No images provided'})
+
+        # Modèle encore en cours de chargement ?
+        if not await run_blocking(service.wait_for_model):
+            return await model_unavailable(send)
+
+        model_version = requested_model_version(scope, fields)
+        if model_version and not service.model_version_exists(model_version):
+            return await send_json(send, 404, {'success': False, 'error': f'Unknown model version: {model_version}'})
+
+        payload = await run_blocking(admitted, 'bulk', deadline_for(scope, 'bulk'),
+                                     service.analyse_batch, images_bytes, fields.get('capteurId'), model_version)
+        return await send_json(send, 200, payload)
+
+    except UploadError as e:
+        return await send_json(send, e.status, {'success': False, 'error': str(e)})
+    except service.AdmissionRejected as e:
+        return await admission_rejected(send, e)
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur batch: {e}")
+        service.ERRORS_TOTAL.inc(endpoint='/predict-batch', type=type(e).__name__)
+        return await send_json(send, 500, {'success': False, 'error': str(e)})
+
+async def predict_frame(scope, receive, send):
+    """/predict-frame : même contrat que la route Flask (trame binaire, voir frame_format.py)"""
+    log_fields = {'endpoint': '/predict-frame'}
+    started = time.perf_counter()
+    try:
+        frame_bytes = await read_body(receive, service.MAX_IMAGE_SIZE)
+
+        if not await run_blocking(service.wait_for_model):
+            return await model_unavailable(send)
+
+        model_version = header(scope, b'x-model-version') or None
+        if model_version and not service.model_version_exists(model_version):
+            return await send_json(send, 404, {'success': False, 'error': f'Unknown model version: {model_version}'})
+
+        metadata, result = await run_blocking(admitted, 'live', deadline_for(scope, 'live'),
+                                              service.analyse_frame, frame_bytes, model_version)
+        log_fields.update(
+            capteurId=metadata['capteurId'], userId=metadata['userId'], image_bytes=len(frame_bytes),
+            pixel_format=metadata['pixel_format'], frame_size=f"{metadata['width']}x{metadata['height']}"
+        )
+        service.log_prediction(log_fields, result, started)
+        return await send_json(send, 200, result)
+
+    except UploadError as e:
+        return await send_json(send, e.status, {'success': False, 'error': str(e)})
+    except service.AdmissionRejected as e:
+        return await admission_rejected(send, e)
+    except service.FrameError as e:
+        service.ERRORS_TOTAL.inc(endpoint='/predict-frame', type=type(e).__name__)
+        return await send_json(send, 400, {'success': False, 'error': str(e)})
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        log_fields.update(error=str(e), error_type=type(e).__name__)
+        structured_logging.log_request(logger, "❌ Erreur analyse trame", log_fields, success=False, exc_info=True)
+        service.ERRORS_TOTAL.inc(endpoint='/predict-frame', type=type(e).__name__)
+        return await send_json(send, 500, {'success': False, 'error': str(e), 'type': type(e).__name__})
+
+def flask_view(view, path):
+    """
+    Exécute une vue Flask sans corps de requête (/health, /stats) : contrat identique
+    Vue exécutée dans le pool de threads (lecture du registre, état du modèle) : pas sur la boucle
+    """
+    def render():
+        with service.app.test_request_context(path):
+            response = view()
+        return response.status_code, response.get_data()
+
+    async def handler(scope, receive, send):
+        status, body = await run_blocking(render)
+        return await send_response(send, status, body)
+    return handler
+
+async def prometheus_metrics(scope, receive, send):
+    text = await run_blocking(metrics.render_prometheus)
+    return await send_response(send, 200, text.encode(), content_type=b'text/plain; version=0.0.4')
+
+ROUTES = {
+    '/predict': ('POST', predict),
+    '/predict-batch': ('POST', predict_batch),
+    '/predict-frame': ('POST', predict_frame),
+    '/health': ('GET', flask_view(service.health_check, '/health')),
+    '/stats': ('GET', flask_view(service.get_stats, '/stats')),
+    '/metrics': ('GET', prometheus_metrics)
+}
+
+# ═══════════════════════════════════════════════════════════
+# APPLICATION ASGI
+# ═══════════════════════════════════════════════════════════
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    metrics.ensure_flusher()
+    started = time.perf_counter()
+    route = ROUTES.get(scope['path'])
+    send = with_cors(scope, send)
+    if scope['method'] == 'HEAD':
+        send = without_body(send)
+
+    try:
+        if route is None:
+            endpoint = 'unmatched'
+            status = await send_json(send, 404, {'success': False, 'error': 'Not found'})
+        elif scope['method'] == 'OPTIONS':
+            endpoint = scope['path']
+            status = await preflight(scope, send, route[0])
+        elif scope['method'] != route[0] and not (scope['method'] == 'HEAD' and route[0] == 'GET'):
+            endpoint = scope['path']
+            status = await send_json(send, 405, {'success': False, 'error': 'Method not allowed'})
+        else:
+            endpoint = scope['path']
+            status = await route[1](scope, receive, send)
+    except ClientDisconnected:
+        # Client parti pendant l'upload : rien à répondre
+        endpoint, status = scope['path'], 499
+
+    service.REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint,
+                                    method=scope['method'], status=status)
@@ -0,0 +1,121 @@
+"""
+Trames binaires (/predict-frame) vs JPEG multipart (/predict)
+
+Pour des images de tomato/, compare :
+- octets envoyés par image
+- temps de prétraitement (JPEG : preprocess_image/PIL ; trame : np.frombuffer sans PIL)
+- écart moyen de l'entrée du modèle par rapport au chemin JPEG
+- latence /predict vs /predict-frame de bout en bout (client de test Flask)
+
+Usage:
+    python benchmarks/bench_frame.py --images 200 --requests 200
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('PREDICTION_CACHE_SIZE', '0')
+os.environ.setdefault('MODEL_LOAD_MODE', 'eager')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import app  # noqa: E402
+from frame_format import encode_frame, parse_frame  # noqa: E402
+
+# (format de pixels, taille envoyée par le capteur)
+VARIANTS = [
+    ('rgb888', (224, 224)),
+    ('yuv422', (224, 224)),
+    ('rgb888', (448, 448)),
+    ('yuv422', (320, 240))
+]
+
+
+def per_image_ms(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200, help="requêtes de bout en bout par chemin (0 = ignorer)")
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT, 'tomato', '*', '*.JPG')))[::37][:args.images]
+    jpegs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            jpegs.append(f.read())
+    reference = [app.preprocess_image(jpeg)[0].copy() for jpeg in jpegs]
+
+    out = np.empty((1, *app.IMAGE_SIZE, 3), dtype=np.float32)
+    rows = [{
+        'input': 'jpeg multipart',
+        'bytes_per_image': int(np.mean([len(jpeg) for jpeg in jpegs])),
+        'preprocess_ms': round(per_image_ms(lambda jpeg: app.preprocess_image(jpeg, out=out), jpegs), 3),
+        'mean_abs_diff': 0.0
+    }]
+
+    for pixel_format, size in VARIANTS:
+        frames = []
+        for path in paths:
+            rgb = np.asarray(Image.open(path).convert('RGB').resize(size, resample=Image.Resampling.BICUBIC))
+            frames.append(encode_frame(rgb, 'esp32-01', 'user-42', pixel_format))
+
+        def preprocess(frame):
+            metadata, pixels = parse_frame(frame)
+            return app.preprocess_frame(metadata, pixels, out)
+
+        diffs = [np.abs(preprocess(frame)[0] - ref).mean() for frame, ref in zip(frames, reference)]
+        rows.append({
+            'input': f'frame {pixel_format} {size[0]}x{size[1]}',
+            'bytes_per_image': int(np.mean([len(frame) for frame in frames])),
+            'preprocess_ms': round(per_image_ms(preprocess, frames), 3),
+            'mean_abs_diff': round(float(np.mean(diffs)), 4)
+        })
+
+    report = {'preprocess': rows, 'end_to_end_ms': {}}
+
+    if args.requests:
+        client = app.app.test_client()
+        frame = encode_frame(reference[0] * 255, 'esp32-01', 'user-42')
+        paths_by_route = {
+            '/predict': lambda i: client.post('/predict', data={'image': (io.BytesIO(jpegs[i % len(jpegs)]), 'frame.jpg')}),
+            '/predict-frame': lambda i: client.post('/predict-frame', data=frame, content_type='application/octet-stream')
+        }
+        for route, send in paths_by_route.items():
+            for i in range(5):
+                send(i)
+            start = time.perf_counter()
+            statuses = [send(i).status_code for i in range(args.requests)]
+            report['end_to_end_ms'][route] = round((time.perf_counter() - start) / args.requests * 1000, 3)
+            if any(status != 200 for status in statuses):
+                print(f"⚠️ {route}: {sum(status != 200 for status in statuses)} erreur(s)")
+
+    print(f"\n{'Entrée':<26} {'octets/image':>13} {'prétraitement':>14} {'écart moyen':>12}")
+    for row in rows:
+        print(f"{row['input']:<26} {row['bytes_per_image']:>13} {row['preprocess_ms']:>11.3f} ms {row['mean_abs_diff']:>12.4f}")
+    for route, ms in report['end_to_end_ms'].items():
+        print(f"{route:<26} {ms:>8.3f} ms/requête")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Débit du pipeline d'entrée de train.py : ImageDataGenerator vs tf.data
+
+Mesure les images/seconde produites (sans entraînement) :
+- generator : ancien flow_from_directory (décodage + augmentation en Python)
+- tf.data   : 1re passe (décodage parallèle, remplissage du cache disque)
+              puis 2e passe (lecture du cache + augmentation vectorisée)
+
+Usage:
+    python benchmarks/bench_input_pipeline.py --dataset tomato --steps 50
+"""
+import os
+import sys
+import time
+import json
+import tempfile
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import train  # noqa: E402
+
+
+def images_per_second(batches, steps=None):
+    count = 0
+    start = time.perf_counter()
+    for step, (images, _) in enumerate(batches):
+        count += len(images)
+        if steps is not None and step + 1 >= steps:
+            break
+    return count / (time.perf_counter() - start), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'tomato'))
+    parser.add_argument('--steps', type=int, default=50, help="nombre de lots mesurés")
+    parser.add_argument('--batch-size', type=int, default=train.BATCH_SIZE)
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    results = {}
+
+    train_gen, _ = train.load_generators(args.dataset, args.batch_size)
+    results['generator'], _ = images_per_second(train_gen, args.steps)
+
+    # Même nombre d'images pour tf.data, sur un sous-ensemble déterministe
+    train_samples, _, _ = train.split_dataset(train.list_dataset(args.dataset))
+    samples = train_samples[::max(1, len(train_samples) // (args.steps * args.batch_size))][:args.steps * args.batch_size]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dataset = train.make_dataset(samples, training=True, cache_path=os.path.join(cache_dir, 'bench'),
+                                     batch_size=args.batch_size)
+        results['tfdata_cold'], _ = images_per_second(dataset)
+        results['tfdata_cached'], _ = images_per_second(dataset)
+
+    print(f"\n{'Pipeline':<16} {'images/s':>10} {'vs generator':>14}")
+    for name, rate in results.items():
+        print(f"{name:<16} {rate:>10.1f} {rate / results['generator']:>13.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({k: round(v, 1) for k, v in results.items()}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+"""
+Benchmark et test de charge du service Flask
+
+Rejoue des images de tomato/ contre l'application, avec un faux backend Node.js
+local (réponses 200, latence configurable) à la place de BACKEND_URL :
+- inprocess : client de test Flask dans ce processus + découpage par étape
+              (décodage, redimensionnement, inférence, envoi backend)
+- http      : gunicorn local, clients HTTP concurrents (RSS de tout l'arbre de processus)
+
+Rapporte débit, latences p50/p95/p99 et RSS maximal, et écrit un JSON
+comparable d'un commit à l'autre.
+
+Usage:
+    python benchmarks/bench_load.py --mode both --requests 300 --concurrency 8 --output bench.json
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import resource
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import requests
+
+from bench_pool import tree_usage, wait_until_ready
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ═══════════════════════════════════════════════════════════
+# FAUX BACKEND NODE.JS
+# ═══════════════════════════════════════════════════════════
+
+class StubBackend:
+    """Serveur HTTP local qui accepte /api/analysis/receive(-bulk)"""
+
+    def __init__(self, latency_ms=0):
+        stub = self
+        self.received = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                with stub.lock:
+                    stub.received += 1
+                body = b'{"success": true}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.do_POST()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# ═══════════════════════════════════════════════════════════
+# MESURES
+# ═══════════════════════════════════════════════════════════
+
+def summarize(latencies, elapsed, errors=0, images_per_request=1):
+    """Débit et percentiles (ms) d'une série de latences en secondes"""
+    latencies_ms = np.asarray(latencies) * 1000
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'throughput_images_s': round(len(latencies) * images_per_request / elapsed, 2) if elapsed else None
+    }
+    if len(latencies_ms):
+        summary.update({
+            'mean_ms': round(float(latencies_ms.mean()), 2),
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies_ms, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies_ms, 99)), 2),
+            'max_ms': round(float(latencies_ms.max()), 2)
+        })
+    return summary
+
+def run_clients(send, total, concurrency):
+    """Exécute `send(index)` `total` fois avec `concurrency` clients ; retourne (latences, erreurs, durée)"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    next_index = [0]
+
+    def client():
+        while True:
+            with lock:
+                index = next_index[0]
+                if index >= total:
+                    return
+                next_index[0] += 1
+            start = time.perf_counter()
+            ok = send(index)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+def multipart_files(images, index, batch_size):
+    return [('images', (f'frame{i}.jpg', images[(index * batch_size + i) % len(images)])) for i in range(batch_size)]
+
+
+# ═══════════════════════════════════════════════════════════
+# EN PROCESSUS (CLIENT DE TEST FLASK)
+# ═══════════════════════════════════════════════════════════
+
+def stage_breakdown(app, images, samples):
+    """Temps moyen/p95 (ms) de chaque étape de /predict, mesurée séparément"""
+    from PIL import Image
+
+    stages = {'decode': [], 'resize': [], 'normalize': [], 'inference': [], 'backend_send': []}
+    buffer = np.empty((1, *app.IMAGE_SIZE, 3), dtype=np.float32)
+
+    for index in range(samples):
+        image_bytes = images[index % len(images)]
+
+        # Mêmes étapes que decode_image, chronométrées une à une
+        start = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.format == 'JPEG':
+            image.draft('RGB', app.IMAGE_SIZE)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.load()
+        stages['decode'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if image.size != app.IMAGE_SIZE:
+            image = image.resize(app.IMAGE_SIZE, resample=app.RESAMPLE_FILTER)
+        pixels = np.asarray(image)
+        stages['resize'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.normalize_into(pixels, buffer[0])
+        stages['normalize'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = app.predict_disease(buffer)
+        stages['inference'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.post_to_backend('/api/analysis/receive', app.build_backend_payload(result, 'bench', 'bench'))
+        stages['backend_send'].append(time.perf_counter() - start)
+
+    return {
+        name: {
+            'mean_ms': round(float(np.mean(values) * 1000), 3),
+            'p95_ms': round(float(np.percentile(values, 95) * 1000), 3)
+        }
+        for name, values in stages.items()
+    }
+
+def run_inprocess(args, images, backend):
+    os.environ.update(BACKEND_URL=backend.url, SEND_TO_BACKEND='true', MODEL_LOAD_MODE='eager',
+                      PREDICTION_CACHE_SIZE='0')
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    client = app_module.app.test_client()
+    # Préchauffage (modèle, buffers, connexions)
+    for image in images[:4]:
+        client.post('/predict', data={'image': (io.BytesIO(image), 'frame.jpg')})
+
+    def send_predict(index):
+        response = client.post('/predict', data={'image': (io.BytesIO(images[index % len(images)]), 'frame.jpg')},
+                               content_type='multipart/form-data')
+        return response.status_code == 200
+
+    def send_batch(index):
+        data = {'images': [(io.BytesIO(image), name) for _, (name, image) in multipart_files(images, index, args.batch_size)]}
+        response = client.post('/predict-batch', data=data, content_type='multipart/form-data')
+        return response.status_code == 200
+
+    results = {}
+    latencies, errors, elapsed = run_clients(send_predict, args.requests, args.concurrency)
+    results['predict'] = summarize(latencies, elapsed, errors)
+    total_batches = max(1, args.requests // args.batch_size)
+    latencies, errors, elapsed = run_clients(send_batch, total_batches, args.concurrency)
+    results['predict_batch'] = summarize(latencies, elapsed, errors, args.batch_size)
+    results['stages'] = stage_breakdown(app_module, images, min(args.requests, 200))
+    results['backend_requests_received'] = backend.received
+    results['server_stats'] = client.get('/stats').get_json()
+    # ru_maxrss : Ko sous Linux
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+# ═══════════════════════════════════════════════════════════
+# HTTP (GUNICORN LOCAL)
+# ═══════════════════════════════════════════════════════════
+
+def run_http(args, images, backend):
+    env = dict(os.environ, BACKEND_URL=backend.url, SEND_TO_BACKEND='true', PREDICTION_CACHE_SIZE='0',
+               WEB_CONCURRENCY=str(args.workers))
+    server = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{args.port}', '--threads', str(args.concurrency), 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{args.port}'
+
+    # Échantillonnage du RSS de l'arbre de processus pendant le test
+    peak_rss = [0.0]
+    sampling = threading.Event()
+
+    def sample_rss():
+        while not sampling.wait(0.2):
+            peak_rss[0] = max(peak_rss[0], tree_usage(server.pid)[0])
+
+    sessions = threading.local()
+
+    def session():
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        return sessions.session
+
+    def send_predict(index):
+        response = session().post(f'{url}/predict', files={'image': ('frame.jpg', images[index % len(images)])}, timeout=120)
+        return response.status_code == 200
+
+    def send_batch(index):
+        response = session().post(f'{url}/predict-batch', files=multipart_files(images, index, args.batch_size), timeout=300)
+        return response.status_code == 200
+
+    results = {}
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    try:
+        wait_until_ready(url)
+        for image in images[:args.workers * 2]:
+            requests.post(f'{url}/predict', files={'image': ('frame.jpg', image)}, timeout=120)
+        sampler.start()
+
+        latencies, errors, elapsed = run_clients(send_predict, args.requests, args.concurrency)
+        results['predict'] = summarize(latencies, elapsed, errors)
+        total_batches = max(1, args.requests // args.batch_size)
+        latencies, errors, elapsed = run_clients(send_batch, total_batches, args.concurrency)
+        results['predict_batch'] = summarize(latencies, elapsed, errors, args.batch_size)
+        results['server_stats'] = requests.get(f'{url}/stats', timeout=5).json()
+    finally:
+        sampling.set()
+        server.terminate()
+        server.wait()
+
+    results['workers'] = args.workers
+    results['backend_requests_received'] = backend.received
+    results['peak_rss_mb'] = round(peak_rss[0], 1)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(mode, results):
+    for endpoint in ('predict', 'predict_batch'):
+        row = results[endpoint]
+        print(f"{mode:<10} {endpoint:<14} {row['throughput_rps'] or 0:>8.2f} req/s {row['throughput_images_s'] or 0:>8.2f} img/s  "
+              f"p50 {row.get('p50_ms', 0):>8.2f}  p95 {row.get('p95_ms', 0):>8.2f}  p99 {row.get('p99_ms', 0):>8.2f} ms  "
+              f"erreurs {row['errors']}")
+    print(f"{mode:<10} RSS max: {results['peak_rss_mb']} Mo")
+    for name, stage in results.get('stages', {}).items():
+        print(f"{'':<10} {name:<14} moyenne {stage['mean_ms']:>8.3f} ms  p95 {stage['p95_ms']:>8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'http', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=200, help="requêtes /predict (lots /predict-batch = requests / batch-size)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2, help="workers gunicorn (mode http)")
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--backend-latency-ms', type=float, default=20, help="latence simulée du backend Node.js")
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    images = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tomato', '*', '*.JPG')))[::13][:args.images]:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    backend = StubBackend(args.backend_latency_ms)
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'results': {}
+    }
+    try:
+        # HTTP d'abord : le mode en processus importe app (et le modèle) dans ce processus
+        if args.mode in ('http', 'both'):
+            report['results']['http'] = run_http(args, images, backend)
+        if args.mode in ('inprocess', 'both'):
+            report['results']['inprocess'] = run_inprocess(args, images, backend)
+    finally:
+        backend.stop()
+
+    print()
+    for mode, results in report['results'].items():
+        print_summary(mode, results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Coût du logging par requête /predict : ancien logging verbeux vs enregistrement structuré
+
+- legacy       : les ~10 logger.info (f-strings) de l'ancien /predict, écriture synchrone
+- text-sync    : un enregistrement texte par requête, écriture synchrone
+- text-async   : idem via la file (thread d'écriture dédié)
+- json-async   : un objet JSON par requête via la file
+- json-sampled : json-async avec LOG_SAMPLE_RATE=0.1
+
+Mesure le temps passé dans le thread de requête (journal écrit dans un fichier
+temporaire), puis la latence /predict de bout en bout (client de test Flask).
+
+Usage:
+    python benchmarks/bench_logging.py --records 20000 --requests 300
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('PREDICTION_CACHE_SIZE', '0')
+os.environ.setdefault('MODEL_LOAD_MODE', 'eager')
+
+import structured_logging  # noqa: E402
+
+logger = logging.getLogger('bench')
+
+RESULT = {
+    'prediction': 'Tomato_early_blight', 'confidence': 0.9342, 'severity': 'high',
+    'shouldWater': True, 'modelUsed': 'tomato_disease_model@v20250101-120000', 'cached': False
+}
+CONFIGS = {
+    'text-sync': {'log_format': 'text', 'log_async': False},
+    'text-async': {'log_format': 'text', 'log_async': True},
+    'json-async': {'log_format': 'json', 'log_async': True},
+    'json-sampled': {'log_format': 'json', 'log_async': True, 'sample_rate': 0.1}
+}
+
+
+def legacy_request_logs(capteurId, userId, image_bytes, result):
+    """Lignes émises par l'ancien /predict pour une image"""
+    logger.info(f"📸 Image reçue")
+    logger.info(f"   Capteur ID: {capteurId or 'Non spécifié'}")
+    logger.info(f"   User ID: {userId or 'Non spécifié'}")
+    logger.info(f"   Taille: {len(image_bytes)} bytes ({len(image_bytes)/1024:.1f} KB)")
+    logger.info("🔄 Prétraitement de l'image...")
+    logger.info("🔍 Analyse en cours...")
+    logger.info(f"🤖 Prédiction: {result['prediction']} (confiance {result['confidence']:.2%})")
+    logger.info(f"✅ Analyse terminée:")
+    logger.info(f"   Maladie: {result['prediction']}")
+    logger.info(f"   Confiance: {result['confidence']*100:.1f}%")
+    logger.info(f"   Sévérité: {result['severity']}")
+    logger.info(f"   Arrosage: {'✓' if result['shouldWater'] else '✗'}")
+    logger.info("🗑️ Image supprimée de la mémoire")
+
+
+def structured_request_log(capteurId, userId, image_bytes, result):
+    fields = {'endpoint': '/predict', 'capteurId': capteurId, 'userId': userId, 'image_bytes': len(image_bytes)}
+    fields.update(result, backend_sent=True, deliveryId='a1b2c3', duration_ms=12.5)
+    structured_logging.log_request(logger, "✅ Analyse terminée", fields)
+
+
+def time_records(emit, records):
+    """Temps moyen (µs) passé dans le thread appelant par requête"""
+    image_bytes = b'\0' * 23456
+    start = time.perf_counter()
+    for _ in range(records):
+        emit('esp32-cam-01', 'user-42', image_bytes, RESULT)
+    return (time.perf_counter() - start) / records * 1e6
+
+
+def configure(log_file, name):
+    config = dict(CONFIGS.get(name, {'log_format': 'text', 'log_async': False}))
+    structured_logging.LOG_SAMPLE_RATE = config.pop('sample_rate', 1.0)
+    structured_logging.configure_logging(stream=log_file, **config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000, help="requêtes simulées (coût du logging seul)")
+    parser.add_argument('--requests', type=int, default=300, help="requêtes /predict de bout en bout (0 = ignorer)")
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    report = {'logging_us_per_request': {}, 'predict_ms_per_request': {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ['legacy', *CONFIGS]:
+            with open(os.path.join(tmp, f'{name}.log'), 'w') as log_file:
+                configure(log_file, name)
+                emit = legacy_request_logs if name == 'legacy' else structured_request_log
+                report['logging_us_per_request'][name] = round(time_records(emit, args.records), 2)
+                structured_logging.stop_listener()
+
+        if args.requests:
+            images = []
+            for path in sorted(glob.glob(os.path.join(ROOT, 'tomato', '*', '*.JPG')))[::50][:50]:
+                with open(path, 'rb') as f:
+                    images.append(f.read())
+
+            import app as app_module
+            app_module.MICRO_BATCHING = False
+            client = app_module.app.test_client()
+
+            for name in CONFIGS:
+                with open(os.path.join(tmp, f'predict-{name}.log'), 'w') as log_file:
+                    configure(log_file, name)
+                    for image in images[:5]:
+                        client.post('/predict', data={'image': (io.BytesIO(image), 'frame.jpg')})
+                    start = time.perf_counter()
+                    for index in range(args.requests):
+                        client.post('/predict', data={'image': (io.BytesIO(images[index % len(images)]), 'frame.jpg')})
+                    elapsed = time.perf_counter() - start
+                    report['predict_ms_per_request'][name] = round(elapsed / args.requests * 1000, 3)
+                    structured_logging.stop_listener()
+
+    structured_logging.configure_logging(log_format='text', log_async=False)
+    baseline = report['logging_us_per_request']['legacy']
+    print(f"\n{'Mode':<14} {'logging µs/req':>15} {'vs legacy':>10} {'/predict ms/req':>16}")
+    for name, cost in report['logging_us_per_request'].items():
+        predict_ms = report['predict_ms_per_request'].get(name)
+        print(f"{name:<14} {cost:>15.2f} {baseline / cost:>9.1f}x {predict_ms if predict_ms is not None else '-':>16}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Test de charge : pool d'inférence partagé vs modèle chargé dans chaque worker
+
+Pour chaque configuration, démarre gunicorn (et le pool via gunicorn.conf.py),
+envoie des images de tomato/ sur /predict avec N clients concurrents, puis mesure :
+- débit (req/s) et débit par cœur
+- requêtes par seconde CPU consommée (tous processus du service)
+- RSS total du service (master + workers HTTP + processus d'inférence)
+
+Usage:
+    python benchmarks/bench_pool.py --http-workers 4 --inference-processes 1 --duration 30
+"""
+import os
+import glob
+import json
+import time
+import argparse
+import subprocess
+import threading
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def process_tree(pid):
+    """PID du processus et de tous ses descendants (via /proc)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError):
+                pass
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def tree_usage(pid):
+    """(RSS total en Mo, temps CPU total en s) de l'arbre de processus"""
+    rss_kb, cpu_ticks = 0, 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/status') as f:
+                rss_kb += next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+            with open(f'/proc/{child}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+                cpu_ticks += int(fields[11]) + int(fields[12])
+        except (OSError, StopIteration):
+            pass
+    return rss_kb / 1024, cpu_ticks / CLOCK_TICKS
+
+
+def wait_until_ready(url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{url}/health', timeout=1).json()['status'] != 'starting':
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+
+def run_layout(name, http_workers, inference_processes, args, images):
+    env = dict(os.environ, SEND_TO_BACKEND='false', PREDICTION_CACHE_SIZE='0',
+               INFERENCE_PROCESSES=str(inference_processes), WEB_CONCURRENCY=str(http_workers))
+    server = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{args.port}', '--threads', str(args.concurrency), 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_ready(url)
+        # Préchauffage : chaque worker HTTP charge son modèle (ou se connecte au pool)
+        for image in images[:args.concurrency * 2]:
+            requests.post(f'{url}/predict', files={'image': ('frame.jpg', image)}, timeout=120)
+
+        _, cpu_before = tree_usage(server.pid)
+        completed, errors = [0], [0]
+        counter_lock = threading.Lock()
+        stop_at = time.time() + args.duration
+
+        def client(offset):
+            session = requests.Session()
+            index = offset
+            while time.time() < stop_at:
+                response = session.post(f'{url}/predict', files={'image': ('frame.jpg', images[index % len(images)])}, timeout=120)
+                with counter_lock:
+                    if response.status_code == 200:
+                        completed[0] += 1
+                    else:
+                        errors[0] += 1
+                index += args.concurrency
+
+        started = time.time()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        rss_mb, cpu_after = tree_usage(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    throughput = completed[0] / elapsed
+    cpu_seconds = cpu_after - cpu_before
+    return {
+        'layout': name,
+        'http_workers': http_workers,
+        'inference_processes': inference_processes,
+        'requests': completed[0],
+        'errors': errors[0],
+        'throughput_rps': round(throughput, 2),
+        'throughput_per_core_rps': round(throughput / (os.cpu_count() or 1), 2),
+        'requests_per_cpu_second': round(completed[0] / cpu_seconds, 2) if cpu_seconds else None,
+        'rss_total_mb': round(rss_mb, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--http-workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--inference-processes', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    images = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tomato', '*', '*.JPG')))[::13][:args.images]:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    results = [
+        run_layout('model-per-worker', args.http_workers, 0, args, images),
+        run_layout('shared-pool', args.http_workers, args.inference_processes, args, images)
+    ]
+
+    print(f"\n{'Layout':<18} {'Workers':>8} {'Inférence':>10} {'req/s':>8} {'req/s/cœur':>11} {'req/s CPU':>10} {'RSS':>9}")
+    for row in results:
+        print(f"{row['layout']:<18} {row['http_workers']:>8} {row['inference_processes']:>10} "
+              f"{row['throughput_rps']:>8.2f} {row['throughput_per_core_rps']:>11.2f} "
+              f"{row['requests_per_cpu_second'] or 0:>10.2f} {row['rss_total_mb']:>7.1f}Mo")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark du prétraitement d'image
+
+Compare l'ancien chemin (décodage complet + resize + float64)
+au chemin actuel de app.preprocess_image (draft JPEG + float32 dans un buffer réutilisé)
+
+Usage:
+    python benchmarks/bench_preprocess.py --images 200
+    python benchmarks/bench_preprocess.py --frame-size 1600x1200   # trames type ESP32-CAM
+"""
+import os
+import sys
+import io
+import glob
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+
+import app  # noqa: E402
+
+
+def legacy_preprocess(image_bytes):
+    """Chemin de prétraitement d'origine (référence)"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(app.IMAGE_SIZE)
+    img_array = np.array(image) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def load_samples(dataset, count, frame_size):
+    """Charge `count` JPEG du dataset, éventuellement ré-encodés à la taille `frame_size`"""
+    paths = sorted(glob.glob(os.path.join(dataset, '*', '*.JPG')))[::7][:count]
+    samples = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if frame_size:
+            image = Image.open(io.BytesIO(data)).convert('RGB').resize(frame_size)
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=85)
+            data = buffer.getvalue()
+        samples.append(data)
+    return samples
+
+
+def bench(name, fn, samples, repeat):
+    timings = []
+    for _ in range(repeat):
+        for data in samples:
+            start = time.perf_counter()
+            fn(data)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    print(f"{name:<10} mean {timings.mean():7.3f} ms   p50 {np.percentile(timings, 50):7.3f} ms   "
+          f"p95 {np.percentile(timings, 95):7.3f} ms   {1000 / timings.mean():8.1f} img/s")
+    return timings.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'tomato'))
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--frame-size', default='', help="ré-encoder les images en LARGEURxHAUTEUR (ex: 1600x1200)")
+    args = parser.parse_args()
+
+    frame_size = tuple(int(v) for v in args.frame_size.lower().split('x')) if args.frame_size else None
+    samples = load_samples(args.dataset, args.images, frame_size)
+    if not samples:
+        sys.exit(f"Aucune image trouvée dans {args.dataset}")
+
+    size_label = 'x'.join(map(str, frame_size)) if frame_size else "taille d'origine"
+    print(f"📸 {len(samples)} images ({size_label}), {args.repeat} passes, "
+          f"filtre {app.RESAMPLE_FILTER.name}")
+
+    buffer = np.empty((1, *app.IMAGE_SIZE, 3), dtype=np.float32)
+    legacy = bench('legacy', legacy_preprocess, samples, args.repeat)
+    current = bench('current', lambda data: app.preprocess_image(data, out=buffer), samples, args.repeat)
+
+    # Écart numérique entre les deux chemins
+    diff = np.abs(legacy_preprocess(samples[0]) - app.preprocess_image(samples[0])).mean()
+    print(f"⚡ Speedup: x{legacy / current:.2f}   écart moyen des pixels: {diff:.4f}")
+
+
+if __name__ == '__main__':
+    main()
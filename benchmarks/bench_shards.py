@@ -0,0 +1,134 @@
+"""
+Temps de lecture d'une époque : arborescence de JPEG vs shards (dataset_shards.py)
+
+Pour chaque source, lit tout le dataset une fois (une époque) et mesure durée, images/s et Mo/s :
+- arborescence, lecture seule des fichiers (borne basse du chemin JPEG)
+- arborescence, lecture + décodage + redimensionnement (pool de décodage de l'API)
+- shards memmap (ordre mélangé par shard, comme l'entraînement)
+- shards en lecture séquentielle par blocs
+Avec --cold, le cache de pages est vidé pour les fichiers lus (posix_fadvise) avant chaque mesure.
+
+Usage:
+    python benchmarks/bench_shards.py --cold
+    python benchmarks/bench_shards.py --shards cache/shards --batch-size 64 --repeats 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import app  # noqa: E402
+from dataset_shards import ShardReader, pack_dataset  # noqa: E402
+
+
+def drop_page_cache(paths):
+    """Retire les fichiers du cache de pages (pages propres uniquement, sans droits root)"""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def read_tree(paths):
+    total = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            total += len(f.read())
+    return total
+
+
+def decode_tree(paths, size):
+    def decode(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        app.decode_image(data, size)
+        return len(data)
+    return sum(app.decode_executor.map(decode, paths))
+
+
+def read_shards(reader, batch_size, mode):
+    total = 0
+    for images, _, _ in reader.batches(batch_size, shuffle=mode == 'mmap', seed=0, mode=mode):
+        total += images.nbytes
+    return total
+
+
+def measure(name, func, files, args):
+    timings = []
+    for _ in range(args.repeats):
+        if args.cold:
+            drop_page_cache(files)
+        start = time.perf_counter()
+        nbytes = func()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    return {
+        'source': name,
+        'files': len(files),
+        'epoch_s': round(seconds, 3),
+        'images_per_s': round(args.images / seconds, 1),
+        'mb_per_s': round(nbytes / seconds / 1024 / 1024, 1),
+        'mb_read': round(nbytes / 1024 / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'tomato'))
+    parser.add_argument('--shards', default='', help="shards existants (défaut: empaquetés dans un dossier temporaire)")
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeats', type=int, default=1, help="époques mesurées par source (meilleur temps)")
+    parser.add_argument('--cold', action='store_true', help="vider le cache de pages avant chaque époque")
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    # Import ici : les processus d'empaquetage (spawn) réimportent ce fichier sans TensorFlow
+    from train import CLASSES, list_dataset
+
+    with tempfile.TemporaryDirectory(prefix='bench-shards-') as workdir:
+        shard_dir = args.shards
+        if not shard_dir:
+            shard_dir = os.path.join(workdir, 'shards')
+            start = time.perf_counter()
+            pack_dataset({'all': list_dataset(args.dataset)}, args.dataset, shard_dir,
+                         (args.image_size, args.image_size), CLASSES, None)
+            print(f"📦 Empaquetage: {time.perf_counter() - start:.1f}s (une seule fois)")
+
+        reader = ShardReader(shard_dir)
+        paths = reader.paths
+        shard_files = [os.path.join(shard_dir, shard['file']) for shard in reader.shards]
+        args.images = len(reader)
+        size = reader.size
+
+        rows = [
+            measure('arborescence (lecture)', lambda: read_tree(paths), paths, args),
+            measure('arborescence (décodage)', lambda: decode_tree(paths, size), paths, args),
+            measure('shards memmap', lambda: read_shards(reader, args.batch_size, 'mmap'), shard_files, args),
+            measure('shards séquentiel', lambda: read_shards(reader, args.batch_size, 'stream'), shard_files, args)
+        ]
+
+    print(f"\n{args.images} images {size[0]}x{size[1]}, cache {'froid' if args.cold else 'chaud'}")
+    print(f"{'Source':<26} {'fichiers':>9} {'époque':>9} {'images/s':>10} {'Mo/s':>8} {'Mo lus':>8}")
+    for row in rows:
+        print(f"{row['source']:<26} {row['files']:>9} {row['epoch_s']:>8.2f}s {row['images_per_s']:>10.1f} "
+              f"{row['mb_per_s']:>8.1f} {row['mb_read']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'images': args.images, 'image_size': list(size), 'cold': args.cold, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
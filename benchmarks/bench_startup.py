@@ -0,0 +1,84 @@
+"""
+Mesure du démarrage à froid du service
+
+Lance le serveur dans un sous-processus puis mesure :
+- time-to-first-healthy : première réponse de /health
+- time-to-ready         : /health passe à 'ready' ou 'degraded'
+- time-to-first-prediction : première réponse 200 de /predict
+
+Usage:
+    python benchmarks/bench_startup.py                          # gunicorn app:app
+    python benchmarks/bench_startup.py --server python          # python app.py
+    MODEL_LOAD_MODE=eager python benchmarks/bench_startup.py    # comparaison chargement bloquant
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import subprocess
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(kind, port):
+    env = dict(os.environ, PORT=str(port), SEND_TO_BACKEND='false')
+    if kind == 'gunicorn':
+        command = ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1', 'app:app']
+    else:
+        command = [sys.executable, 'app.py']
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['gunicorn', 'python'], default='gunicorn')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    image_path = sorted(glob.glob(os.path.join(ROOT, 'tomato', '*', '*.JPG')))[0]
+    with open(image_path, 'rb') as f:
+        image_bytes = f.read()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    timings = {'first_healthy': None, 'ready': None, 'first_prediction': None}
+
+    start = time.perf_counter()
+    process = start_server(args.server, args.port)
+    try:
+        while time.perf_counter() - start < args.timeout and timings['first_prediction'] is None:
+            try:
+                if timings['first_healthy'] is None or timings['ready'] is None:
+                    health = requests.get(f'{base_url}/health', timeout=1).json()
+                    timings['first_healthy'] = timings['first_healthy'] or time.perf_counter() - start
+                    if health['status'] != 'starting':
+                        timings['ready'] = time.perf_counter() - start
+                response = requests.post(f'{base_url}/predict', files={'image': ('frame.jpg', image_bytes)}, timeout=30)
+                if response.status_code == 200:
+                    timings['first_prediction'] = time.perf_counter() - start
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.05)
+
+        server_side = requests.get(f'{base_url}/stats', timeout=5).json().get('startup')
+    finally:
+        process.terminate()
+        process.wait()
+
+    report = {
+        'server': args.server,
+        'model_load_mode': os.getenv('MODEL_LOAD_MODE', 'background'),
+        'time_to_first_healthy_s': round(timings['first_healthy'], 3) if timings['first_healthy'] else None,
+        'time_to_ready_s': round(timings['ready'], 3) if timings['ready'] else None,
+        'time_to_first_prediction_s': round(timings['first_prediction'], 3) if timings['first_prediction'] else None,
+        'server_side': server_side
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Entraînement : configuration de référence vs multi-cœurs / précision mixte / fine-tuning
+
+Lance train.py dans des processus séparés (une configuration par processus : la politique
+de précision et les CPU logiques sont globaux à TensorFlow) sur un sous-ensemble de tomato/,
+puis compare durée moyenne d'une époque, débit, durée totale et précision de validation finale.
+Les modèles sont écrits dans un dossier temporaire, jamais dans le registre.
+
+Usage:
+    python benchmarks/bench_training.py --per-class 100 --epochs 3
+    python benchmarks/bench_training.py --config "--replicas 2 --batch-size 64 --precision bfloat16 --fine-tune-epochs 2"
+"""
+import os
+import sys
+import json
+import shlex
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from train import CLASSES, DATASET_FOLDERS  # noqa: E402
+
+CONFIGS = [
+    ('référence', ''),
+    ('2 réplicas, lot 64', '--replicas 2 --batch-size 64'),
+    ('bfloat16', '--precision bfloat16'),
+    ('+ fine-tuning', '--fine-tune-epochs 2')
+]
+
+
+def subset_dataset(dataset_path, per_class, target):
+    """Sous-ensemble de tomato/ (liens symboliques, `per_class` images par classe)"""
+    folders = {name: folder for folder, name in DATASET_FOLDERS.items()}
+    for name in CLASSES:
+        source = os.path.join(dataset_path, folders.get(name, name))
+        if not os.path.isdir(source):
+            continue
+        os.makedirs(os.path.join(target, os.path.basename(source)))
+        for filename in sorted(os.listdir(source))[:per_class]:
+            os.symlink(os.path.abspath(os.path.join(source, filename)),
+                       os.path.join(target, os.path.basename(source), filename))
+    return target
+
+
+def run_config(index, name, extra, dataset, args, workdir):
+    slug = f'config{index}'
+    report_path = os.path.join(workdir, f'{slug}.json')
+    command = [
+        sys.executable, os.path.join(ROOT, 'train.py'),
+        '--dataset', dataset, '--epochs', str(args.epochs), '--pipeline', args.pipeline,
+        '--cache-dir', os.path.join(workdir, f'cache-{slug}'), '--feature-dir', os.path.join(workdir, f'features-{slug}'),
+        '--model-path', os.path.join(workdir, f'{slug}.h5'), '--report', report_path, '--no-register',
+        *shlex.split(extra)
+    ]
+    print(f"\n🚀 {name}: {' '.join(shlex.split(extra)) or '(défaut)'}")
+    completed = subprocess.run(command, cwd=ROOT)
+    if completed.returncode != 0 or not os.path.exists(report_path):
+        print(f"⚠️ {name}: échec (code {completed.returncode})")
+        return {'config': name, 'args': extra, 'error': completed.returncode}
+
+    with open(report_path) as f:
+        report = json.load(f)
+    epochs = [epoch for phase in report['phases'] for epoch in phase.get('per_epoch', [])]
+    return {
+        'config': name,
+        'args': extra,
+        'replicas': report['replicas'],
+        'workers': report['workers'],
+        'precision': report['precision'],
+        'epochs': len(epochs),
+        'mean_epoch_s': round(sum(e['seconds'] for e in epochs) / len(epochs), 2) if epochs else None,
+        'images_per_s': round(sum(e['images_per_s'] for e in epochs) / len(epochs), 1) if epochs else None,
+        'total_s': report['total_seconds'],
+        'final_val_accuracy': report['final_val_accuracy']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'tomato'))
+    parser.add_argument('--per-class', type=int, default=100, help="images par classe (0 = tout le dataset)")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--pipeline', choices=['tfdata', 'features'], default='tfdata')
+    parser.add_argument('--config', action='append', default=None,
+                        help="arguments de train.py à comparer à la référence (répétable)")
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    configs = CONFIGS if args.config is None else [('référence', '')] + [(extra, extra) for extra in args.config]
+
+    with tempfile.TemporaryDirectory(prefix='bench-training-') as workdir:
+        dataset = args.dataset
+        if args.per_class:
+            dataset = subset_dataset(args.dataset, args.per_class, os.path.join(workdir, 'dataset'))
+        rows = [run_config(i, name, extra, dataset, args, workdir) for i, (name, extra) in enumerate(configs)]
+
+    baseline = rows[0].get('mean_epoch_s')
+    print(f"\n{'Configuration':<24} {'réplicas':>8} {'précision':>15} {'époques':>8} {'s/époque':>9} "
+          f"{'accél.':>7} {'images/s':>9} {'total':>8} {'val. acc.':>10}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['config'][:24]:<24} échec")
+            continue
+        speedup = f"{baseline / row['mean_epoch_s']:.2f}x" if baseline and row['mean_epoch_s'] else '-'
+        print(f"{row['config'][:24]:<24} {row['replicas'] * row['workers']:>8} {row['precision']:>15} "
+              f"{row['epochs']:>8} {row['mean_epoch_s']:>8.1f}s {speedup:>7} {row['images_per_s']:>9.1f} "
+              f"{row['total_s']:>7.1f}s {row['final_val_accuracy']:>10.2%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'epochs': args.epochs, 'per_class': args.per_class, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
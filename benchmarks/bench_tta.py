@@ -0,0 +1,92 @@
+"""
+Test-time augmentation : précision et coût en latence selon le mode
+
+Pour des images étiquetées de tomato/, compare TTA off, adaptive (plusieurs seuils)
+et always : précision top-1, part des images augmentées, latence par image
+(p50/p95/max, une image par appel comme /predict sans micro-batching).
+
+Usage:
+    python benchmarks/bench_tta.py --images 300 --thresholds 0.6 0.8 0.9
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('MODEL_LOAD_MODE', 'eager')
+
+import app  # noqa: E402
+from train import list_dataset  # noqa: E402
+
+
+def run_mode(images, labels, mode, threshold):
+    app.TTA_MODE = mode
+    app.TTA_CONFIDENCE_THRESHOLD = threshold
+    for key in app.tta_counts:
+        app.tta_counts[key] = 0
+
+    latencies, correct = [], 0
+    for image, label in zip(images, labels):
+        start = time.perf_counter()
+        result = app.predict_disease(image)
+        latencies.append(time.perf_counter() - start)
+        correct += result['prediction'] == app.DISEASE_CLASSES[label]
+
+    latencies_ms = np.asarray(latencies) * 1000
+    stats = app.tta_stats()
+    return {
+        'mode': mode,
+        'threshold': threshold if mode == 'adaptive' else None,
+        'accuracy': round(correct / len(images), 4),
+        'augmented_rate': stats['augmented_rate'],
+        'changed': stats['changed'],
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 2),
+        'max_ms': round(float(latencies_ms.max()), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'tomato'))
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.6, 0.8, 0.9])
+    parser.add_argument('--output', default='', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    samples = list_dataset(args.dataset)
+    samples = samples[::max(1, len(samples) // args.images)][:args.images]
+    images, labels = [], []
+    for path, label in samples:
+        with open(path, 'rb') as f:
+            images.append(app.preprocess_image(f.read()))
+        labels.append(label)
+
+    # Préchauffage (graphes des tailles de lot 1 et K)
+    app.TTA_MODE = 'always'
+    app.predict_disease(images[0])
+
+    rows = [run_mode(images, labels, 'off', 0.0)]
+    rows += [run_mode(images, labels, 'adaptive', threshold) for threshold in args.thresholds]
+    rows.append(run_mode(images, labels, 'always', 1.0))
+
+    print(f"\n{'Mode':<10} {'seuil':>6} {'précision':>10} {'augmentées':>11} {'p50':>8} {'p95':>8} {'max':>8}")
+    for row in rows:
+        threshold = f"{row['threshold']:.2f}" if row['threshold'] is not None else '-'
+        print(f"{row['mode']:<10} {threshold:>6} {row['accuracy']:>10.2%} {row['augmented_rate']:>11.1%} "
+              f"{row['p50_ms']:>6.2f}ms {row['p95_ms']:>6.2f}ms {row['max_ms']:>6.2f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'augmentations': app.TTA_AUGMENTATIONS, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Dataset préparé en shards : images redimensionnées (uint8) + labels + index, pour éviter de relire
+à chaque run des milliers de petits JPEG (train.py, evaluate.py, score_images.py)
+
+Format (un dossier) :
+
+    index.json               classes, taille d'entrée [H, W], split (seed, proportion), dataset source,
+                             et par split la liste des shards (fichier, nombre d'images, labels, chemins)
+    train-00000.npy ...      uint8 (N, H, W, 3) au format .npy : lecture memmap (accès aléatoire)
+    validation-00000.npy     ou séquentielle par blocs (mémoire bornée, disques réseau)
+    test-00000.npy
+
+Les images sont décodées et redimensionnées comme par l'API (image_decode.py) ; le split
+train/validation/test est celui de train.split_dataset. Un shard fait environ SHARD_SIZE_MB.
+
+Usage:
+    python dataset_shards.py tomato/ --output cache/shards
+    python dataset_shards.py tomato/ --output cache/shards_160 --image-size 160 --workers 4
+    python train.py --shards cache/shards
+"""
+import os
+import json
+import random
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+import numpy as np
+
+from image_decode import decode_image
+
+SHARDS_DIR = './cache/shards'
+SHARD_SIZE_MB = 256
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+STREAM_BLOCK_IMAGES = 256  # images lues par appel en lecture séquentielle
+
+# ═══════════════════════════════════════════════════════════
+# LECTURE
+# ═══════════════════════════════════════════════════════════
+
+def is_shard_dir(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+class ShardReader:
+    """
+    Lecture d'un dataset en shards (un split ou tous)
+    `images(rows)` : accès aléatoire (memmap), `batches(...)` : itération memmap ou séquentielle
+    """
+
+    def __init__(self, shard_dir, split=None):
+        with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        if self.index['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Format de shards non supporté: {self.index['format_version']}")
+        if split and split not in self.index['splits']:
+            raise ValueError(f"Split '{split}' absent des shards ({', '.join(self.index['splits'])})")
+        self.shard_dir = shard_dir
+        self.classes = self.index['classes']
+        self.image_size = tuple(self.index['image_size'])  # (H, W)
+        self.size = (self.image_size[1], self.image_size[0])  # (W, H) comme app.py
+        self.splits = [split] if split else list(self.index['splits'])
+        self.shards = [shard for name in self.splits for shard in self.index['splits'][name]]
+
+        self.labels = np.asarray([label for shard in self.shards for label in shard['labels']], dtype=np.int32)
+        # Chemins des images d'origine (sortie de score_images.py, repli d'evaluate.py)
+        root = self.index['dataset']
+        self.paths = [os.path.join(root, path) for shard in self.shards for path in shard['paths']]
+        self.row_of = {path: row for row, path in enumerate(self.paths)}
+        self.starts = np.cumsum([0] + [shard['count'] for shard in self.shards])
+        self._memmaps = {}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def samples(self):
+        """[(chemin d'origine, label)] dans l'ordre des shards, comme train.list_dataset"""
+        return list(zip(self.paths, self.labels.tolist()))
+
+    def memmap(self, shard_idx):
+        if shard_idx not in self._memmaps:
+            path = os.path.join(self.shard_dir, self.shards[shard_idx]['file'])
+            self._memmaps[shard_idx] = np.load(path, mmap_mode='r')
+        return self._memmaps[shard_idx]
+
+    def images(self, rows, out=None):
+        """Images uint8 (len(rows), H, W, 3) des lignes globales `rows` (memmap)"""
+        rows = np.asarray(rows)
+        out = np.empty((len(rows), *self.image_size, 3), dtype=np.uint8) if out is None else out
+        shard_ids = np.searchsorted(self.starts, rows, side='right') - 1
+        for shard_idx in np.unique(shard_ids):
+            mask = shard_ids == shard_idx
+            out[mask] = self.memmap(shard_idx)[rows[mask] - self.starts[shard_idx]]
+        return out
+
+    def batches(self, batch_size, shuffle=False, seed=None, mode='mmap'):
+        """
+        Itère (images uint8 (B, H, W, 3), labels (B,), lignes globales (B,))
+        mode 'mmap' : mélange par shard (ordre des shards + permutation interne)
+        mode 'stream' : lecture séquentielle par blocs de STREAM_BLOCK_IMAGES, mémoire bornée ;
+        mélange de l'ordre des shards et à l'intérieur de chaque bloc
+        Le dernier lot d'un shard peut être incomplet
+        """
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.shards)) if shuffle else range(len(self.shards))
+        for shard_idx in order:
+            start, count = self.starts[shard_idx], self.shards[shard_idx]['count']
+            if mode == 'stream':
+                for images, rows in self._stream_shard(shard_idx, max(batch_size, STREAM_BLOCK_IMAGES)):
+                    if shuffle:
+                        permutation = rng.permutation(len(rows))
+                        images, rows = images[permutation], rows[permutation]
+                    for i in range(0, len(rows), batch_size):
+                        yield images[i:i + batch_size], self.labels[rows[i:i + batch_size]], rows[i:i + batch_size]
+            else:
+                local = rng.permutation(count) if shuffle else np.arange(count)
+                shard = self.memmap(shard_idx)
+                for i in range(0, count, batch_size):
+                    # Lignes triées : lecture la plus séquentielle possible dans le fichier
+                    idx = np.sort(local[i:i + batch_size])
+                    yield np.asarray(shard[idx]), self.labels[start + idx], start + idx
+
+    def _stream_shard(self, shard_idx, block_images):
+        """Lecture séquentielle (readinto dans un tampon réutilisé), sans memmap"""
+        path = os.path.join(self.shard_dir, self.shards[shard_idx]['file'])
+        start, count = self.starts[shard_idx], self.shards[shard_idx]['count']
+        buffer = np.empty((min(block_images, count), *self.image_size, 3), dtype=np.uint8)
+        with open(path, 'rb') as f:
+            # Saute l'en-tête .npy : les pixels suivent, contigus
+            if np.lib.format.read_magic(f) == (1, 0):
+                np.lib.format.read_array_header_1_0(f)
+            else:
+                np.lib.format.read_array_header_2_0(f)
+            for offset in range(0, count, block_images):
+                n = min(block_images, count - offset)
+                view = buffer[:n]
+                f.readinto(memoryview(view.reshape(-1)))
+                yield view, np.arange(start + offset, start + offset + n)
+
+# ═══════════════════════════════════════════════════════════
+# ÉCRITURE
+# ═══════════════════════════════════════════════════════════
+
+def decode_chunk(paths, size):
+    """Processus de décodage : images uint8 (N, H, W, 3) à la taille (W, H), même décodage que l'API"""
+    images = np.empty((len(paths), size[1], size[0], 3), dtype=np.uint8)
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            images[i] = decode_image(f.read(), size)
+    return images
+
+def pack_split(name, samples, dataset_path, shard_dir, size, shard_images, pool, chunk_size):
+    """Écrit les shards d'un split ; retourne leurs entrées d'index (chemins relatifs au dataset)"""
+    shards = []
+    for number, start in enumerate(range(0, len(samples), shard_images)):
+        shard_samples = samples[start:start + shard_images]
+        paths = [path for path, _ in shard_samples]
+        filename = f'{name}-{number:05d}.npy'
+        array = np.lib.format.open_memmap(os.path.join(shard_dir, filename), mode='w+', dtype=np.uint8,
+                                          shape=(len(shard_samples), size[1], size[0], 3))
+        futures = [pool.submit(decode_chunk, paths[i:i + chunk_size], size) for i in range(0, len(paths), chunk_size)]
+        for i, future in enumerate(futures):
+            array[i * chunk_size:(i + 1) * chunk_size] = future.result()
+        array.flush()
+        del array
+        shards.append({
+            'file': filename,
+            'count': len(shard_samples),
+            'labels': [label for _, label in shard_samples],
+            'paths': [os.path.relpath(path, dataset_path) for path in paths]
+        })
+        print(f"💾 {name}: {start + len(shard_samples)}/{len(samples)} images ({filename})", end='\r')
+    print()
+    return shards
+
+def pack_dataset(splits, dataset_path, shard_dir, size, classes, split_info,
+                 shard_size_mb=SHARD_SIZE_MB, workers=None):
+    """
+    Écrit `splits` ({nom: [(chemin, label)]}) en shards de `size`=(W, H)
+    L'index est écrit en dernier : un dossier sans index.json est un pack interrompu
+    """
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    if is_shard_dir(shard_dir):
+        with open(index_path) as f:
+            index = json.load(f)
+        packed = {name: [[path, label] for shard in shards for path, label in zip(shard['paths'], shard['labels'])]
+                  for name, shards in index['splits'].items()}
+        wanted = {name: [[os.path.relpath(path, dataset_path), label] for path, label in samples]
+                  for name, samples in splits.items()}
+        if index['image_size'] == [size[1], size[0]] and packed == wanted:
+            print(f"♻️ Shards déjà à jour: {shard_dir}")
+            return index
+        os.remove(index_path)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    for filename in os.listdir(shard_dir):
+        if filename.endswith('.npy'):
+            os.remove(os.path.join(shard_dir, filename))
+
+    shard_images = max(1, int(shard_size_mb * 1024 * 1024 // (size[0] * size[1] * 3)))
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    chunk_size = max(1, min(64, shard_images // workers))
+
+    index = {
+        'format_version': FORMAT_VERSION,
+        'dataset': os.path.abspath(dataset_path),
+        'classes': classes,
+        'image_size': [size[1], size[0]],
+        'dtype': 'uint8',
+        'split': split_info,
+        'created_at': datetime.now().isoformat(),
+        'splits': {}
+    }
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+        for name, samples in splits.items():
+            index['splits'][name] = pack_split(name, samples, dataset_path, shard_dir, size,
+                                               shard_images, pool, chunk_size)
+
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + '.tmp', index_path)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Prépare le dataset en shards (uint8 redimensionnés + index)")
+    parser.add_argument('dataset', help="dossier du dataset (un sous-dossier par classe)")
+    parser.add_argument('--output', default=SHARDS_DIR)
+    parser.add_argument('--image-size', type=int, default=224, help="côté des images stockées (taille d'entrée du modèle)")
+    parser.add_argument('--shard-size-mb', type=int, default=SHARD_SIZE_MB)
+    parser.add_argument('--workers', type=int, default=None, help="processus de décodage")
+    parser.add_argument('--no-split', action='store_true', help="un seul split 'all' (scoring)")
+    args = parser.parse_args()
+
+    # Import ici : les processus de décodage (spawn) réimportent ce fichier sans TensorFlow
+    from train import CLASSES, SEED, TEST_SPLIT, VALIDATION_SPLIT, list_dataset, split_dataset
+
+    samples = list_dataset(args.dataset)
+    if args.no_split:
+        splits, split_info = {'all': samples}, None
+    else:
+        train_samples, val_samples, test_samples = split_dataset(samples)
+        splits = {'train': train_samples, 'validation': val_samples, 'test': test_samples}
+        split_info = {'seed': SEED, 'validation_split': VALIDATION_SPLIT, 'test_split': TEST_SPLIT}
+    # Échantillons classés par dossier : mélange déterministe pour que chaque shard
+    # (et chaque lot lu dans un shard) contienne toutes les classes
+    for split_samples in splits.values():
+        random.Random(SEED).shuffle(split_samples)
+    print(f"📂 {len(samples)} images -> {args.output} ({args.image_size}x{args.image_size})")
+
+    index = pack_dataset(splits, args.dataset, args.output, (args.image_size, args.image_size), CLASSES,
+                         split_info, args.shard_size_mb, args.workers)
+    total_mb = sum(os.path.getsize(os.path.join(args.output, shard['file']))
+                   for shards in index['splits'].values() for shard in shards) / 1024 / 1024
+    print(f"✅ {sum(len(shards) for shards in index['splits'].values())} shard(s), {total_mb:.0f} Mo: {args.output}")
+
+if __name__ == '__main__':
+    main()
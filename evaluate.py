@@ -0,0 +1,288 @@
+"""
+Évaluation du modèle sur le split de test de train.py (images jamais vues à l'entraînement,
+ni par EarlyStopping/ModelCheckpoint qui surveillent la validation)
+
+Pour chaque variante (modèle Keras, exports TFLite, modèles à autre résolution d'entrée) :
+- précision/rappel/F1 par classe et matrice de confusion
+- calibration des confiances (ECE, diagramme de fiabilité) et précision par niveau de sévérité
+- latence par image (lot de 1, comme /predict) et mémoire résidente du processus
+
+Usage:
+    python evaluate.py
+    python evaluate.py --variants models/tomato_disease_model.h5 models/tomato_disease_model_int8.tflite
+    python evaluate.py --per-class 100 --latency-images 100 --report eval.json
+    python evaluate.py --shards cache/shards   # images lues dans les shards de dataset_shards.py
+"""
+import os
+import json
+import time
+import resource
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from train import CLASSES, DATASET_PATH, MODEL_SAVE_PATH, list_dataset, split_dataset
+from dataset_shards import ShardReader
+
+# Prétraitement et sévérité de l'API réutilisés tels quels
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+import app
+
+# Configuration
+BATCH_SIZE = 64
+LATENCY_IMAGES = 200
+CALIBRATION_BINS = 10
+
+# ═══════════════════════════════════════════════════════════
+# VARIANTES
+# ═══════════════════════════════════════════════════════════
+
+def default_variants(model_path):
+    """Modèle Keras + exports TFLite voisins (export_tflite.py) s'ils existent"""
+    base_path = os.path.splitext(model_path)[0]
+    candidates = [model_path, f'{base_path}_fp16.tflite', f'{base_path}_int8.tflite']
+    return [path for path in candidates if os.path.exists(path)]
+
+def load_variant(path, threads=None):
+    """Charge un modèle (.h5 Keras ou .tflite) ; retourne (backend, modèle, taille d'entrée (W, H))"""
+    if path.endswith('.tflite'):
+        model = app.TFLiteModel(path, threads)
+        height, width = model.input['shape'][1:3]
+        backend = 'tflite-int8' if np.issubdtype(model.input['dtype'], np.integer) or 'int8' in path else 'tflite'
+    else:
+        model = tf.keras.models.load_model(path)
+        height, width = model.input_shape[1:3]
+        backend = 'keras'
+    return backend, model, (int(width), int(height))
+
+def rss_mb():
+    """Mémoire résidente actuelle du processus (Mo)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo, ru_maxrss en Ko sous Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# ═══════════════════════════════════════════════════════════
+# MESURES
+# ═══════════════════════════════════════════════════════════
+
+def decode_batch(paths, size, shards=None):
+    """
+    Décode un lot d'images en parallèle (pool de décodage de l'API) à la taille d'entrée du modèle
+    ou, si les shards sont à cette taille, les lit directement (memmap)
+    """
+    batch = np.empty((len(paths), size[1], size[0], 3), dtype=np.float32)
+    if shards is not None and shards.size == tuple(size):
+        return app.normalize_into(shards.images([shards.row_of[path] for path in paths]), batch)
+
+    def decode_into(idx):
+        with open(paths[idx], 'rb') as f:
+            app.normalize_into(app.decode_image(f.read(), size), batch[idx])
+
+    list(app.decode_executor.map(decode_into, range(len(paths))))
+    return batch
+
+def predict_all(model, samples, size, batch_size, shards=None):
+    """Probabilités (N, classes) sur tout le split, par lots"""
+    probabilities = []
+    for start in range(0, len(samples), batch_size):
+        paths = [path for path, _ in samples[start:start + batch_size]]
+        probabilities.append(model.predict(decode_batch(paths, size, shards), verbose=0))
+    return np.concatenate(probabilities)
+
+def measure_latency(model, samples, size, count, shards=None):
+    """Latence d'inférence par image (lot de 1, hors décodage), premier appel exclu (warm-up)"""
+    images = decode_batch([path for path, _ in samples[:count + 1]], size, shards)
+    latencies = []
+    for idx in range(len(images)):
+        start = time.perf_counter()
+        model.predict(images[idx:idx + 1], verbose=0)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies[1:] or latencies)
+    return {
+        'latency_ms_mean': round(float(latencies.mean()), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2)
+    }
+
+def classification_metrics(labels, predicted):
+    """Matrice de confusion (lignes = vraie classe) et précision/rappel/F1 par classe"""
+    matrix = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+    np.add.at(matrix, (labels, predicted), 1)
+    true_positives = np.diag(matrix).astype(np.float64)
+    support = matrix.sum(axis=1)
+    predicted_count = matrix.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_count > 0, true_positives / predicted_count, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    per_class = {
+        name: {
+            'precision': round(float(precision[i]), 4),
+            'recall': round(float(recall[i]), 4),
+            'f1': round(float(f1[i]), 4),
+            'support': int(support[i])
+        }
+        for i, name in enumerate(CLASSES)
+    }
+    present = support > 0
+    return {
+        'accuracy': round(float(true_positives.sum() / max(1, matrix.sum())), 4),
+        'macro_f1': round(float(f1[present].mean()) if present.any() else 0.0, 4),
+        'per_class': per_class,
+        'confusion_matrix': matrix.tolist()
+    }
+
+def calibration_metrics(labels, predicted, confidences, bins=CALIBRATION_BINS):
+    """
+    Calibration de la confiance top-1 (celle renvoyée par l'API)
+    ECE + diagramme de fiabilité, et précision réelle par niveau de sévérité
+    (la sévérité est dérivée de la confiance : une confiance surestimée gonfle 'high')
+    """
+    correct = predicted == labels
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    bin_idx = np.clip(np.digitize(confidences, edges[1:-1]), 0, bins - 1)
+
+    reliability, ece = [], 0.0
+    for b in range(bins):
+        mask = bin_idx == b
+        if not mask.any():
+            continue
+        accuracy, confidence = float(correct[mask].mean()), float(confidences[mask].mean())
+        ece += mask.mean() * abs(accuracy - confidence)
+        reliability.append({
+            'range': [round(float(edges[b]), 2), round(float(edges[b + 1]), 2)],
+            'count': int(mask.sum()),
+            'mean_confidence': round(confidence, 4),
+            'accuracy': round(accuracy, 4)
+        })
+
+    severities = app.compute_severities(np.asarray(CLASSES)[predicted], confidences)
+    by_severity = {}
+    for severity in ('none', 'low', 'medium', 'high'):
+        mask = severities == severity
+        if mask.any():
+            by_severity[severity] = {
+                'count': int(mask.sum()),
+                'mean_confidence': round(float(confidences[mask].mean()), 4),
+                'accuracy': round(float(correct[mask].mean()), 4)
+            }
+
+    return {'ece': round(float(ece), 4), 'reliability': reliability, 'by_severity': by_severity}
+
+def evaluate_variant(path, samples, args, shards=None):
+    """Charge une variante et mesure précision, calibration, latence et mémoire"""
+    rss_before = rss_mb()
+    backend, model, size = load_variant(path, args.threads)
+    rss_loaded = rss_mb()
+    print(f"\n📦 {path} ({backend}, entrée {size[0]}x{size[1]})")
+    if shards is not None and shards.size != tuple(size):
+        print(f"⚠️ Shards en {shards.size[0]}x{shards.size[1]} : images d'origine décodées pour cette variante")
+
+    start = time.perf_counter()
+    probabilities = predict_all(model, samples, size, args.batch_size, shards)
+    elapsed = time.perf_counter() - start
+    labels = np.array([label for _, label in samples])
+    predicted = probabilities.argmax(axis=1)
+    confidences = probabilities[np.arange(len(samples)), predicted]
+
+    result = {
+        'variant': path,
+        'backend': backend,
+        'input_size': list(size),
+        'size_mb': round(os.path.getsize(path) / 1024 / 1024, 2),
+        'images': len(samples),
+        'throughput_images_per_s': round(len(samples) / elapsed, 1),
+        **classification_metrics(labels, predicted),
+        'calibration': calibration_metrics(labels, predicted, confidences),
+        **measure_latency(model, samples, size, args.latency_images, shards),
+        'model_rss_mb': round(rss_loaded - rss_before, 1),
+        'rss_mb': round(rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+    del model
+    return result
+
+# ═══════════════════════════════════════════════════════════
+# RAPPORT
+# ═══════════════════════════════════════════════════════════
+
+def print_summary(results):
+    print(f"\n{'Variante':<34} {'Entrée':>8} {'Précision':>10} {'F1 macro':>9} {'ECE':>7} "
+          f"{'p50':>9} {'p95':>9} {'Mém.':>8}")
+    for row in results:
+        name = os.path.basename(row['variant'])[-34:]
+        size = f"{row['input_size'][0]}x{row['input_size'][1]}"
+        print(f"{name:<34} {size:>8} {row['accuracy']:>10.2%} {row['macro_f1']:>9.4f} "
+              f"{row['calibration']['ece']:>7.4f} {row['latency_ms_p50']:>7.2f}ms {row['latency_ms_p95']:>7.2f}ms "
+              f"{row['model_rss_mb']:>6.0f}MB")
+
+def print_details(row):
+    print(f"\n📊 {os.path.basename(row['variant'])} : détail par classe")
+    print(f"{'Classe':<45} {'Précision':>10} {'Rappel':>8} {'F1':>8} {'Images':>7}")
+    for name, metrics in row['per_class'].items():
+        print(f"{name:<45} {metrics['precision']:>10.2%} {metrics['recall']:>8.2%} "
+              f"{metrics['f1']:>8.4f} {metrics['support']:>7}")
+
+    print(f"\n{'Sévérité':<10} {'Images':>7} {'Confiance moy.':>15} {'Précision réelle':>17}")
+    for severity, metrics in row['calibration']['by_severity'].items():
+        print(f"{severity:<10} {metrics['count']:>7} {metrics['mean_confidence']:>15.2%} {metrics['accuracy']:>17.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation précision/calibration/latence du modèle et de ses variantes")
+    parser.add_argument('--model', default=MODEL_SAVE_PATH)
+    parser.add_argument('--variants', nargs='+', default=None,
+                        help="modèles à comparer (.h5 / .tflite, défaut: modèle + exports TFLite)")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--split', choices=['test', 'validation', 'all'], default='test',
+                        help="'test' : images tenues à l'écart par train.py ; 'validation' : biaisé (sélection du modèle)")
+    parser.add_argument('--per-class', type=int, default=0, help="images max par classe (0 = toutes)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--latency-images', type=int, default=LATENCY_IMAGES)
+    parser.add_argument('--threads', type=int, default=None, help="threads de l'interpréteur TFLite")
+    parser.add_argument('--report', default=None, help="rapport JSON (défaut: <modèle>_evaluation.json)")
+    parser.add_argument('--shards', default=None, help="dataset préparé par dataset_shards.py (remplace --dataset)")
+    args = parser.parse_args()
+
+    shards = None
+    if args.shards:
+        shards = ShardReader(args.shards, None if args.split == 'all' else args.split)
+        samples = shards.samples()
+    else:
+        samples = list_dataset(args.dataset)
+        if args.split != 'all':
+            _, validation, test = split_dataset(samples)
+            samples = test if args.split == 'test' else validation
+    if args.per_class:
+        samples = [sample for label in range(len(CLASSES))
+                   for sample in [s for s in samples if s[1] == label][:args.per_class]]
+
+    variants = args.variants or default_variants(args.model)
+    print(f"🔬 {len(samples)} images ({args.split}), {len(variants)} variante(s)")
+
+    results = [evaluate_variant(path, samples, args, shards) for path in variants]
+    print_summary(results)
+    for row in results:
+        print_details(row)
+
+    report_path = args.report or f'{os.path.splitext(args.model)[0]}_evaluation.json'
+    with open(report_path, 'w') as f:
+        json.dump({
+            'dataset': args.shards or args.dataset,
+            'split': args.split,
+            'classes': CLASSES,
+            'images': len(samples),
+            'results': results
+        }, f, indent=2)
+    print(f"\n✅ Rapport sauvegardé: {report_path}")
+
+if __name__ == '__main__':
+    main()
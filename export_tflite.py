@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import random
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from train import CLASSES, DATASET_PATH, MODEL_SAVE_PATH, list_dataset, split_dataset
+
+# Le prétraitement de l'API est réutilisé pour la calibration et l'évaluation
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+import app
+
+# Configuration
+CALIBRATION_SIZE = 200
+EVAL_SIZE = 500
+SEED = 42
+
+def split_samples(dataset_path, calibration_size, eval_size, seed=SEED):
+    """
+    Tirage déterministe des images de calibration (split d'entraînement de train.py)
+    et d'évaluation (split de test, celui de evaluate.py : jamais vu, ni pour calibrer)
+    """
+    train, _, test = split_dataset(list_dataset(dataset_path))
+    rng = random.Random(seed)
+    rng.shuffle(train)
+    rng.shuffle(test)
+    return train[:calibration_size], test[:eval_size]
+
+def load_image(path, size=None):
+    with open(path, 'rb') as f:
+        return app.preprocess_image(f.read(), size=size)
+
+def export_float16(keras_model, output_path):
+    """Export TFLite avec poids en float16"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"✅ TFLite float16: {output_path}")
+
+def export_int8(keras_model, output_path, calibration_samples):
+    """Export TFLite quantifié int8 (poids + activations) calibré sur le dataset"""
+    size = app.model_input_size(keras_model, {})
+
+    def representative_dataset():
+        for path, _ in calibration_samples:
+            yield [load_image(path, size)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Entrées/sorties en float32 : même contrat que le modèle Keras
+    converter.inference_input_type = tf.float32
+    converter.inference_output_type = tf.float32
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"✅ TFLite int8: {output_path} ({len(calibration_samples)} images de calibration)")
+
+def register_artifacts(version, artifacts):
+    """Ajoute les exports TFLite aux artefacts de la version (metadata.json, écriture atomique)"""
+    metadata_path = os.path.join(app.MODEL_REGISTRY_DIR, version, 'metadata.json')
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    metadata.setdefault('artifacts', {}).update(artifacts)
+    tmp_path = metadata_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, metadata_path)
+    print(f"📚 Version {version}: artefacts {', '.join(sorted(metadata['artifacts']))}")
+
+def evaluate_backend(name, predict_fn, eval_samples, model_path, size=None):
+    """Précision top-1 et latence par image (lot de 1) d'un backend"""
+    correct = 0
+    latencies = []
+    for path, label in eval_samples:
+        img_array = load_image(path, size)
+        start = time.perf_counter()
+        predictions = predict_fn(img_array)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += int(np.argmax(predictions[0]) == label)
+
+    latencies = np.array(latencies[1:] or latencies)  # ignorer le premier appel (warm-up)
+    return {
+        'backend': name,
+        'model_path': model_path,
+        'size_mb': round(os.path.getsize(model_path) / 1024 / 1024, 2),
+        'accuracy': round(correct / len(eval_samples), 4),
+        'latency_ms_mean': round(float(latencies.mean()), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Export TFLite (float16 / int8) et rapport précision/latence")
+    parser.add_argument('--model', default=None, help=f"modèle Keras (défaut: {MODEL_SAVE_PATH} ou celui de --version)")
+    parser.add_argument('--version', default=None,
+                        help="version du registre : exports écrits dans son dossier et ajoutés à son metadata.json")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--calibration-size', type=int, default=CALIBRATION_SIZE)
+    parser.add_argument('--eval-size', type=int, default=EVAL_SIZE)
+    parser.add_argument('--threads', type=int, default=None, help="threads de l'interpréteur TFLite")
+    parser.add_argument('--report', default=None, help="rapport JSON (défaut: <modèle>_backends.json)")
+    args = parser.parse_args()
+
+    if args.version:
+        # Noms d'artefacts attendus par app.model_artifact_path pour INFERENCE_BACKEND=tflite|tflite-int8
+        version = app.resolve_version(args.version)
+        version_dir = os.path.join(app.MODEL_REGISTRY_DIR, version)
+        keras_artifact = app.list_model_versions()[version].get('artifacts', {}).get('keras', app.REGISTRY_ARTIFACTS['keras'])
+        args.model = args.model or os.path.join(version_dir, keras_artifact)
+        fp16_path = os.path.join(version_dir, app.REGISTRY_ARTIFACTS['tflite'])
+        int8_path = os.path.join(version_dir, app.REGISTRY_ARTIFACTS['tflite-int8'])
+        report_path = args.report or os.path.join(version_dir, 'backends.json')
+    else:
+        args.model = args.model or MODEL_SAVE_PATH
+        base_path = os.path.splitext(args.model)[0]
+        fp16_path = f'{base_path}_fp16.tflite'
+        int8_path = f'{base_path}_int8.tflite'
+        report_path = args.report or f'{base_path}_backends.json'
+
+    print(f"📦 Chargement du modèle Keras: {args.model}")
+    keras_model = tf.keras.models.load_model(args.model)
+    calibration_samples, eval_samples = split_samples(args.dataset, args.calibration_size, args.eval_size)
+
+    export_float16(keras_model, fp16_path)
+    export_int8(keras_model, int8_path, calibration_samples)
+    if args.version:
+        register_artifacts(version, {
+            'tflite': os.path.basename(fp16_path),
+            'tflite-int8': os.path.basename(int8_path)
+        })
+
+    print(f"\n📊 Évaluation sur {len(eval_samples)} images...")
+    size = app.model_input_size(keras_model, {})
+    report = [
+        evaluate_backend('keras', lambda x: keras_model.predict(x, verbose=0), eval_samples, args.model, size),
+        evaluate_backend('tflite', app.TFLiteModel(fp16_path, args.threads).predict, eval_samples, fp16_path, size),
+        evaluate_backend('tflite-int8', app.TFLiteModel(int8_path, args.threads).predict, eval_samples, int8_path, size)
+    ]
+
+    print(f"\n{'Backend':<12} {'Taille':>9} {'Précision':>10} {'Moy.':>9} {'p50':>9} {'p95':>9}")
+    for row in report:
+        print(f"{row['backend']:<12} {row['size_mb']:>7.2f}MB {row['accuracy']:>10.2%} "
+              f"{row['latency_ms_mean']:>7.2f}ms {row['latency_ms_p50']:>7.2f}ms {row['latency_ms_p95']:>7.2f}ms")
+
+    with open(report_path, 'w') as f:
+        json.dump({
+            'model': args.model,
+            'version': version if args.version else None,
+            'classes': CLASSES,
+            'eval_images': len(eval_samples),
+            'calibration_images': len(calibration_samples),
+            'results': report
+        }, f, indent=2)
+    print(f"\n✅ Rapport sauvegardé: {report_path}")
+    print("💡 Choisir le backend avec INFERENCE_BACKEND=keras|tflite|tflite-int8")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Format binaire compact des trames capteur (POST /predict-frame) et encodeur de référence
+
+Trame = en-tête (little-endian) + identifiants UTF-8 + pixels bruts :
+
+    magic        4s   b'TMF1'
+    version      B    1
+    pixel_format B    0 = RGB888 (3 octets/pixel), 1 = YUV422 YUYV (2 octets/pixel, largeur paire)
+    flags        B    réservé (0)
+    reserved     B    réservé (0)
+    width        H
+    height       H
+    capteur_len  B    longueur de capteurId (octets)
+    user_len     B    longueur de userId (octets)
+    capteurId, userId, puis width * height * bpp octets de pixels
+
+Côté serveur, les pixels sont lus sans copie (np.frombuffer) et convertis sans PIL.
+Envoyer directement la taille d'entrée du modèle (224x224) évite tout redimensionnement ;
+un multiple entier (448x448...) est réduit par moyenne de blocs, sinon au plus proche voisin.
+
+Encodeur de référence:
+    python frame_format.py image.jpg -o frame.bin --pixel-format yuv422
+    python frame_format.py image.jpg --post http://localhost:5001/predict-frame --capteur esp32-01
+"""
+import struct
+import argparse
+
+import numpy as np
+
+FRAME_MAGIC = b'TMF1'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sBBBBHHBB')
+MAX_FRAME_DIM = 2048
+
+PIXEL_FORMATS = {
+    0: 'rgb888',
+    1: 'yuv422'
+}
+PIXEL_FORMAT_CODES = {name: code for code, name in PIXEL_FORMATS.items()}
+BYTES_PER_PIXEL = {'rgb888': 3, 'yuv422': 2}
+
+class FrameError(ValueError):
+    """Trame invalide (en-tête, dimensions ou longueur)"""
+
+# ═══════════════════════════════════════════════════════════
+# DÉCODAGE (SERVEUR)
+# ═══════════════════════════════════════════════════════════
+
+def parse_frame(buffer):
+    """
+    Lit l'en-tête et retourne (métadonnées, pixels)
+    `pixels` est une vue uint8 sur `buffer` : (H, W, 3) en RGB888, (H, W/2, 4) en YUV422
+    """
+    if len(buffer) < FRAME_HEADER.size:
+        raise FrameError('Frame too short')
+    magic, version, format_code, _, _, width, height, capteur_len, user_len = FRAME_HEADER.unpack_from(buffer)
+    if magic != FRAME_MAGIC:
+        raise FrameError('Invalid frame magic')
+    if version != FRAME_VERSION:
+        raise FrameError(f'Unsupported frame version: {version}')
+    pixel_format = PIXEL_FORMATS.get(format_code)
+    if pixel_format is None:
+        raise FrameError(f'Unsupported pixel format: {format_code}')
+    if not (0 < width <= MAX_FRAME_DIM and 0 < height <= MAX_FRAME_DIM):
+        raise FrameError(f'Invalid frame size: {width}x{height}')
+    if pixel_format == 'yuv422' and width % 2:
+        raise FrameError('YUV422 frames need an even width')
+
+    offset = FRAME_HEADER.size
+    capteurId = bytes(buffer[offset:offset + capteur_len]).decode('utf-8', 'replace')
+    userId = bytes(buffer[offset + capteur_len:offset + capteur_len + user_len]).decode('utf-8', 'replace')
+    offset += capteur_len + user_len
+
+    expected = width * height * BYTES_PER_PIXEL[pixel_format]
+    if len(buffer) - offset != expected:
+        raise FrameError(f'Invalid pixel payload: {len(buffer) - offset} bytes, expected {expected}')
+
+    pixels = np.frombuffer(buffer, dtype=np.uint8, count=expected, offset=offset)
+    if pixel_format == 'rgb888':
+        pixels = pixels.reshape(height, width, 3)
+    else:
+        pixels = pixels.reshape(height, width // 2, 4)
+
+    metadata = {
+        'pixel_format': pixel_format,
+        'width': width,
+        'height': height,
+        'capteurId': capteurId or None,
+        'userId': userId or None
+    }
+    return metadata, pixels
+
+def yuv422_to_rgb(yuyv):
+    """YUYV (H, W/2, 4) -> RGB uint8 (H, W, 3), BT.601 pleine échelle (capteurs OV2640)"""
+    height = yuyv.shape[0]
+    yuyv = yuyv.astype(np.float32)
+    y = yuyv[..., 0::2].reshape(height, -1)
+    u = np.repeat(yuyv[..., 1], 2, axis=1) - 128.0
+    v = np.repeat(yuyv[..., 3], 2, axis=1) - 128.0
+    rgb = np.empty((*y.shape, 3), dtype=np.float32)
+    rgb[..., 0] = y + 1.402 * v
+    rgb[..., 1] = y - 0.344136 * u - 0.714136 * v
+    rgb[..., 2] = y + 1.772 * u
+    return np.clip(rgb, 0, 255, out=rgb).astype(np.uint8)
+
+def resize_pixels(pixels, size):
+    """Redimensionne (H, W, 3) vers size=(W, H) sans PIL : blocs entiers moyennés, sinon plus proche voisin"""
+    target_w, target_h = size
+    height, width = pixels.shape[:2]
+    if (width, height) == (target_w, target_h):
+        return pixels
+    if width % target_w == 0 and height % target_h == 0:
+        # Moyenne de blocs fy x fx par sommes de tranches (plus rapide que reshape + mean)
+        fy, fx = height // target_h, width // target_w
+        total = np.zeros((target_h, target_w, 3), dtype=np.float32)
+        for dy in range(fy):
+            for dx in range(fx):
+                total += pixels[dy::fy, dx::fx]
+        total *= np.float32(1 / (fy * fx))
+        return total
+    rows = (np.arange(target_h) * height // target_h)
+    cols = (np.arange(target_w) * width // target_w)
+    return pixels[rows[:, None], cols]
+
+def frame_to_rgb(metadata, pixels, size):
+    """Pixels d'une trame -> tableau RGB (H, W, 3) à la taille d'entrée du modèle"""
+    if metadata['pixel_format'] == 'yuv422':
+        pixels = yuv422_to_rgb(pixels)
+    return resize_pixels(pixels, size)
+
+# ═══════════════════════════════════════════════════════════
+# ENCODEUR DE RÉFÉRENCE (CAPTEUR)
+# ═══════════════════════════════════════════════════════════
+
+def rgb_to_yuv422(rgb):
+    """RGB uint8 (H, W, 3) -> YUYV (H, W/2, 4), chroma moyennée sur chaque paire de pixels"""
+    rgb = rgb.astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    y = 0.299 * r + 0.587 * g + 0.114 * b
+    u = (b - y) / 1.772 + 128.0
+    v = (r - y) / 1.402 + 128.0
+    yuyv = np.empty((rgb.shape[0], rgb.shape[1] // 2, 4), dtype=np.float32)
+    yuyv[..., 0] = y[:, 0::2]
+    yuyv[..., 1] = (u[:, 0::2] + u[:, 1::2]) / 2
+    yuyv[..., 2] = y[:, 1::2]
+    yuyv[..., 3] = (v[:, 0::2] + v[:, 1::2]) / 2
+    return np.clip(np.round(yuyv), 0, 255).astype(np.uint8)
+
+def encode_frame(rgb, capteurId=None, userId=None, pixel_format='rgb888'):
+    """Encode un tableau RGB uint8 (H, W, 3) en trame binaire"""
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    height, width = rgb.shape[:2]
+    capteur = (capteurId or '').encode('utf-8')
+    user = (userId or '').encode('utf-8')
+    if len(capteur) > 255 or len(user) > 255:
+        raise FrameError('capteurId/userId too long (max 255 bytes)')
+    payload = rgb_to_yuv422(rgb) if pixel_format == 'yuv422' else rgb
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, PIXEL_FORMAT_CODES[pixel_format], 0, 0,
+                               width, height, len(capteur), len(user))
+    return header + capteur + user + payload.tobytes()
+
+def encode_image_file(path, size=(224, 224), capteurId=None, userId=None, pixel_format='rgb888'):
+    """Image (JPEG, PNG...) -> trame, réduite à `size` comme le ferait le capteur"""
+    from PIL import Image
+    image = Image.open(path).convert('RGB').resize(size, resample=Image.Resampling.BICUBIC)
+    return encode_frame(np.asarray(image), capteurId, userId, pixel_format)
+
+def main():
+    parser = argparse.ArgumentParser(description="Encodeur de référence des trames /predict-frame")
+    parser.add_argument('image')
+    parser.add_argument('-o', '--output', default='', help="fichier de sortie (.bin)")
+    parser.add_argument('--post', default='', help="URL /predict-frame où envoyer la trame")
+    parser.add_argument('--pixel-format', choices=list(BYTES_PER_PIXEL), default='rgb888')
+    parser.add_argument('--size', type=int, nargs=2, default=(224, 224), metavar=('W', 'H'))
+    parser.add_argument('--capteur', default=None)
+    parser.add_argument('--user', default=None)
+    args = parser.parse_args()
+
+    frame = encode_image_file(args.image, tuple(args.size), args.capteur, args.user, args.pixel_format)
+    print(f"📦 Trame {args.pixel_format} {args.size[0]}x{args.size[1]}: {len(frame)} octets")
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(frame)
+    if args.post:
+        import requests
+        response = requests.post(args.post, data=frame, headers={'Content-Type': 'application/octet-stream'}, timeout=30)
+        print(response.status_code, response.text)
+
+if __name__ == '__main__':
+    main()
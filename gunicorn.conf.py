@@ -0,0 +1,68 @@
+"""
+Configuration gunicorn (chargée automatiquement par `gunicorn app:app`)
+
+Workers gthread : chaque processus traite GUNICORN_THREADS requêtes simultanées. Avec le
+worker sync par défaut (une requête par processus), le micro-batching ne formerait jamais
+de lot et le contrôle d'admission ne mettrait jamais de requête en file. Les threads
+au-delà de ADMISSION_MAX_CONCURRENCY (défaut BATCH_MAX_SIZE) attendent dans la file
+d'admission (429/503 si elle déborde).
+
+Si INFERENCE_PROCESSES > 0, le master démarre le pool de processus d'inférence
+(inference_pool.py) avant de créer les workers HTTP : les workers ne chargent pas
+le modèle et lui envoient les images prétraitées via mémoire partagée.
+Les sockets sont créés dans un dossier privé (0700) et authentifiés par une clé
+aléatoire générée à chaque démarrage, transmise au pool et aux workers par l'environnement.
+
+Le master crée aussi METRICS_DIR : chaque worker y écrit ses métriques,
+fusionnées par /metrics (voir metrics.py).
+"""
+import os
+import sys
+import glob
+import shutil
+import secrets
+import tempfile
+import subprocess
+
+from metrics import SNAPSHOT_PREFIX
+
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '0'))
+
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', str(2 * int(os.getenv('BATCH_MAX_SIZE', '16')))))
+
+pool_process = None
+pool_socket_dir = None
+
+def on_starting(server):
+    global pool_process, pool_socket_dir
+    # Métriques agrégées entre workers : seuls les instantanés de ce service sont supprimés
+    # à chaque démarrage du master (METRICS_DIR peut être un dossier partagé)
+    if not os.environ.get('METRICS_DIR'):
+        os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='tomato-metrics-')
+    metrics_dir = os.environ['METRICS_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for suffix in ('.json', '.json.tmp'):
+        for path in glob.glob(os.path.join(metrics_dir, f'{SNAPSHOT_PREFIX}*{suffix}')):
+            os.remove(path)
+
+    if INFERENCE_PROCESSES <= 0:
+        return
+    # Hérité par le pool et par les workers HTTP (fork après on_starting)
+    if not os.environ.get('INFERENCE_POOL_ADDRESS'):
+        # mkdtemp : dossier 0700, chemin imprévisible
+        pool_socket_dir = tempfile.mkdtemp(prefix='tomato-inference-')
+        os.environ['INFERENCE_POOL_ADDRESS'] = os.path.join(pool_socket_dir, 'pool')
+    os.environ.setdefault('INFERENCE_POOL_AUTHKEY', secrets.token_bytes(32).hex())
+    pool_process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_pool.py'),
+         '--processes', str(INFERENCE_PROCESSES)]
+    )
+    server.log.info(f"🧠 Pool d'inférence démarré: {INFERENCE_PROCESSES} processus (pid {pool_process.pid})")
+
+def on_exit(server):
+    if pool_process is not None:
+        pool_process.terminate()
+        pool_process.wait(timeout=10)
+    if pool_socket_dir is not None:
+        shutil.rmtree(pool_socket_dir, ignore_errors=True)
@@ -0,0 +1,41 @@
+"""
+Décodage et redimensionnement des images, partagés par l'API et l'entraînement
+
+Sans dépendance au service (Flask, modèle, backend) ni à TensorFlow : importé par app.py,
+par les processus de décodage de dataset_shards.py et par le pipeline tf.data de train.py,
+pour que les images servies, empaquetées en shards et décodées à l'entraînement aient
+exactement les mêmes pixels.
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+# Filtre de redimensionnement (nearest, bilinear, bicubic, lanczos...)
+RESAMPLE_FILTER = Image.Resampling[os.getenv('RESAMPLE_FILTER', 'bicubic').upper()]
+
+def open_image(image_bytes, size):
+    """Décode l'image en RGB (PIL) ; un JPEG est réduit dans le domaine DCT au plus près de size=(W, H)"""
+    image = Image.open(io.BytesIO(image_bytes))
+
+    # JPEG : décodage réduit dans le domaine DCT (1/2, 1/4, 1/8) au plus près de la taille cible
+    if image.format == 'JPEG':
+        image.draft('RGB', size)
+
+    # Convertir en RGB si nécessaire (sinon forcer le décodage, paresseux avec PIL)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    else:
+        image.load()
+    return image
+
+def resize_image(image, size):
+    """Image PIL -> tableau uint8 (H, W, 3) à size=(W, H)"""
+    if image.size != size:
+        image = image.resize(size, resample=RESAMPLE_FILTER)
+    return np.asarray(image)
+
+def decode_image(image_bytes, size):
+    """Octets d'une image (JPEG, PNG...) -> tableau uint8 (H, W, 3) à size=(W, H)"""
+    return resize_image(open_image(image_bytes, size), size)
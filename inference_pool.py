@@ -0,0 +1,353 @@
+"""
+Pool de processus d'inférence partagé par les workers HTTP
+
+Les workers gunicorn décodent les images puis envoient les tenseurs prétraités
+à un pool de processus d'inférence via des segments de mémoire partagée :
+le modèle n'est chargé qu'une fois par processus d'inférence, quel que soit
+le nombre de workers HTTP.
+
+Lancement (automatique avec gunicorn.conf.py si INFERENCE_PROCESSES > 0, qui génère
+la clé et place les sockets dans un dossier privé):
+    INFERENCE_POOL_AUTHKEY=$(openssl rand -hex 32) INFERENCE_POOL_ADDRESS=/run/tomato/pool \
+        python inference_pool.py --processes 2 --intra-op 2 --inter-op 1
+
+Les connexions transportent des objets picklés : la clé (hexadécimale, partagée avec les
+workers HTTP par l'environnement) est obligatoire et le dossier des sockets ne doit être
+accessible qu'à l'utilisateur du service.
+
+Côté app.py, le client InferencePoolClient expose la même interface predict()
+que les modèles Keras/TFLite.
+"""
+import os
+import time
+import queue
+import atexit
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ═══════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════
+INFERENCE_POOL_ADDRESS = os.getenv('INFERENCE_POOL_ADDRESS', '')
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '0'))
+INFERENCE_INTRA_OP_THREADS = int(os.getenv('INFERENCE_INTRA_OP_THREADS', '0'))
+INFERENCE_INTER_OP_THREADS = int(os.getenv('INFERENCE_INTER_OP_THREADS', '0'))
+INFERENCE_POOL_AUTHKEY = os.getenv('INFERENCE_POOL_AUTHKEY', '')  # hexadécimal, sans valeur par défaut
+INFERENCE_POOL_CONNECTIONS = int(os.getenv('INFERENCE_POOL_CONNECTIONS', '2'))
+INFERENCE_POOL_CONNECT_TIMEOUT = float(os.getenv('INFERENCE_POOL_CONNECT_TIMEOUT', '120'))
+RESPAWN_CHECK_INTERVAL = 1.0  # secondes entre deux vérifications des processus d'inférence
+
+def process_address(base_address, index):
+    """Socket Unix du processus d'inférence `index`"""
+    return f'{base_address}.{index}'
+
+def authkey():
+    """Clé d'authentification des connexions (INFERENCE_POOL_AUTHKEY, hexadécimale)"""
+    if not INFERENCE_POOL_AUTHKEY:
+        raise RuntimeError("INFERENCE_POOL_AUTHKEY manquant (généré par gunicorn.conf.py)")
+    return bytes.fromhex(INFERENCE_POOL_AUTHKEY)
+
+# ═══════════════════════════════════════════════════════════
+# PROCESSUS D'INFÉRENCE
+# ═══════════════════════════════════════════════════════════
+
+class InferenceRuntime:
+    """Modèles chargés dans un processus d'inférence (une entrée par version)"""
+
+    def __init__(self, app_module):
+        self.app = app_module
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def entry(self, version):
+        """
+        Modèle d'une version : le client envoie une version déjà résolue, le registre
+        n'est lu (sous verrou) que pour une version pas encore chargée
+        """
+        entry = self.models.get(version)
+        if entry is not None:
+            return entry
+        with self.lock:
+            version = self.app.resolve_version(version)
+            if version not in self.models:
+                self.models[version] = self.app.load_model_version(version)
+            return self.models[version]
+
+    def model(self, version):
+        return self.entry(version).model
+
+    def handle(self, request, segments):
+        op = request['op']
+
+        if op == 'predict':
+            shm = segments.get(request['shm'])
+            if shm is None:
+                shm = shared_memory.SharedMemory(name=request['shm'])
+                # Le segment appartient au client : ne pas le supprimer à la sortie de ce processus
+                resource_tracker.unregister(shm._name, 'shared_memory')
+                segments[request['shm']] = shm
+            x = np.ndarray(request['shape'], dtype=request['dtype'], buffer=shm.buf)
+            return self.model(request['version']).predict(x, batch_size=request.get('batch_size'), verbose=0)
+
+        if op == 'load':
+            # Rechargement demandé par un worker HTTP : la version peut être toute récente
+            self.app.invalidate_model_versions()
+            entry = self.entry(request['version'])
+            return {'pid': os.getpid(), 'versions': list(self.models), 'input_size': list(entry.input_size)}
+
+        if op == 'ping':
+            return {'pid': os.getpid(), 'versions': list(self.models)}
+
+        raise ValueError(f"Opération inconnue: {op}")
+
+def serve_connection(conn, runtime):
+    """Traite les requêtes d'une connexion client jusqu'à sa fermeture"""
+    segments = {}
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(('ok', runtime.handle(request, segments)))
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        for shm in segments.values():
+            shm.close()
+        conn.close()
+
+def worker_main(index, address, intra_op_threads, inter_op_threads):
+    """Point d'entrée d'un processus d'inférence"""
+    # Le processus charge le modèle localement, à la demande
+    os.environ['INFERENCE_POOL_ADDRESS'] = ''
+    os.environ['INFERENCE_PROCESSES'] = '0'
+    os.environ['MODEL_LOAD_MODE'] = 'lazy'
+    if intra_op_threads:
+        os.environ['INFERENCE_THREADS'] = str(intra_op_threads)
+        os.environ['OMP_NUM_THREADS'] = str(intra_op_threads)
+
+    import app
+
+    if app.INFERENCE_BACKEND == 'keras' and (intra_op_threads or inter_op_threads):
+        tf = app.import_tensorflow()
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    runtime = InferenceRuntime(app)
+
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family='AF_UNIX', authkey=authkey())
+    app.logger.info(f"🧠 Processus d'inférence {index} prêt sur {address} (pid {os.getpid()})")
+
+    # Préchargement de la version active pendant que les clients se connectent
+    def preload():
+        try:
+            runtime.model(app.read_active_version() or app.MODEL_VERSION)
+        except Exception as e:
+            app.logger.warning(f"⚠️ Préchargement impossible: {e}")
+    threading.Thread(target=preload, daemon=True).start()
+
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=serve_connection, args=(conn, runtime), daemon=True).start()
+
+def serve(processes, address=INFERENCE_POOL_ADDRESS, intra_op_threads=INFERENCE_INTRA_OP_THREADS,
+          inter_op_threads=INFERENCE_INTER_OP_THREADS):
+    """Démarre `processes` processus d'inférence, relance ceux qui s'arrêtent, jusqu'à SIGTERM"""
+    context = mp.get_context('spawn')
+
+    def start(index):
+        worker = context.Process(
+            target=worker_main,
+            args=(index, process_address(address, index), intra_op_threads, inter_op_threads),
+            name=f'inference-{index}',
+            daemon=True
+        )
+        worker.start()
+        return worker
+
+    workers = [start(index) for index in range(processes)]
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Un processus mort (crash, OOM) est relancé : les clients se reconnectent à son socket
+    while not stopping.wait(RESPAWN_CHECK_INTERVAL):
+        for index, worker in enumerate(workers):
+            if not worker.is_alive():
+                logger.warning(f"⚠️ Processus d'inférence {index} arrêté (code {worker.exitcode}), relance")
+                workers[index] = start(index)
+
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join(timeout=10)
+
+# ═══════════════════════════════════════════════════════════
+# CLIENT (WORKERS HTTP)
+# ═══════════════════════════════════════════════════════════
+
+class PoolConnection:
+    """Connexion vers un processus d'inférence, avec son segment de mémoire partagée"""
+
+    def __init__(self, address):
+        self.address = address
+        self.conn = None
+        self.shm = None
+
+    def connect(self):
+        deadline = time.monotonic() + INFERENCE_POOL_CONNECT_TIMEOUT
+        while True:
+            try:
+                self.conn = Client(self.address, family='AF_UNIX', authkey=authkey())
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Pool en cours de démarrage
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def buffer_for(self, x):
+        """Copie `x` dans le segment partagé (agrandi si nécessaire)"""
+        if self.shm is None or self.shm.size < x.nbytes:
+            self.release_buffer()
+            self.shm = shared_memory.SharedMemory(create=True, size=max(x.nbytes, 1))
+        np.ndarray(x.shape, dtype=x.dtype, buffer=self.shm.buf)[...] = x
+        return self.shm.name
+
+    def call(self, request, x=None):
+        if self.conn is None:
+            self.connect()
+        if x is not None:
+            request.update(shm=self.buffer_for(x), shape=x.shape, dtype=x.dtype.str)
+        try:
+            self.conn.send(request)
+            status, payload = self.conn.recv()
+        except (EOFError, OSError):
+            # Processus d'inférence redémarré : nouvelle connexion au prochain appel
+            self.close()
+            raise
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return payload
+
+    def release_buffer(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.release_buffer()
+
+class ConnectionPool:
+    """Connexions réparties sur les processus d'inférence (une instance par processus HTTP)"""
+
+    def __init__(self, address, processes, connections_per_process):
+        self.addresses = [process_address(address, index) for index in range(processes)]
+        self.connections = [
+            PoolConnection(self.addresses[index % processes])
+            for index in range(processes * max(1, connections_per_process))
+        ]
+        self.available = queue.Queue()
+        for connection in self.connections:
+            self.available.put(connection)
+        atexit.register(self.close)
+
+    def call(self, request, x=None):
+        connection = self.available.get()
+        try:
+            try:
+                return connection.call(request, x)
+            except (EOFError, OSError):
+                return connection.call(request, x)
+        finally:
+            self.available.put(connection)
+
+    def broadcast(self, request):
+        """Envoie la requête à chaque processus d'inférence"""
+        responses = []
+        for address in self.addresses:
+            connection = PoolConnection(address)
+            try:
+                responses.append(connection.call(dict(request)))
+            finally:
+                connection.close()
+        return responses
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """Pool de connexions du processus courant (recréé après fork)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(INFERENCE_POOL_ADDRESS, INFERENCE_PROCESSES, INFERENCE_POOL_CONNECTIONS)
+            _pool_pid = os.getpid()
+        return _pool
+
+class InferencePoolClient:
+    """Modèle exécuté par le pool d'inférence, avec la même interface predict() que Keras"""
+
+    def __init__(self, version):
+        self.version = version
+        self.input_shape = None
+
+    def load(self):
+        """Charge (et préchauffe) la version dans tous les processus d'inférence"""
+        responses = get_connection_pool().broadcast({'op': 'load', 'version': self.version})
+        # Forme d'entrée du modèle servi (lue par app.model_input_size)
+        width, height = responses[0]['input_size']
+        self.input_shape = (None, height, width, 3)
+        return responses
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.ascontiguousarray(x)
+        return get_connection_pool().call({'op': 'predict', 'version': self.version, 'batch_size': batch_size}, x)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool de processus d'inférence partagé")
+    parser.add_argument('--processes', type=int, default=INFERENCE_PROCESSES or 1)
+    parser.add_argument('--address', default=INFERENCE_POOL_ADDRESS)
+    parser.add_argument('--intra-op', type=int, default=INFERENCE_INTRA_OP_THREADS,
+                        help="threads intra-op par processus (0 = défaut TensorFlow)")
+    parser.add_argument('--inter-op', type=int, default=INFERENCE_INTER_OP_THREADS,
+                        help="threads inter-op par processus (0 = défaut TensorFlow)")
+    args = parser.parse_args()
+    if not args.address:
+        parser.error("--address ou INFERENCE_POOL_ADDRESS requis (dossier privé, pas /tmp partagé)")
+    authkey()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.info(f"🚀 Pool d'inférence: {args.processes} processus sur {args.address}.*")
+    serve(args.processes, args.address, args.intra_op, args.inter_op)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Métriques du service (histogrammes et compteurs) au format texte Prometheus
+
+Chaque processus enregistre ses mesures en mémoire. Sous gunicorn, chaque worker
+écrit périodiquement un instantané JSON dans METRICS_DIR (créé par gunicorn.conf.py).
+/metrics fusionne les instantanés de tous les workers, y compris ceux déjà
+arrêtés : les compteurs restent croissants après un redémarrage de worker.
+Au démarrage d'un worker, les instantanés des workers arrêtés sont fusionnés dans
+un seul fichier "retired" (le nombre de fichiers relus par /metrics reste borné).
+
+Sans METRICS_DIR (python app.py), seules les mesures du processus courant sont exposées.
+"""
+import os
+import glob
+import json
+import time
+import fcntl
+import bisect
+import atexit
+import threading
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+SNAPSHOT_PREFIX = 'tomato-metrics-'
+RETIRED_SNAPSHOT = f'{SNAPSHOT_PREFIX}retired.json'  # workers arrêtés, fusionnés
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Bornes des histogrammes (secondes, octets)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (16 * 1024, 32 * 1024, 64 * 1024, 128 * 1024, 256 * 1024, 512 * 1024,
+                1024 * 1024, 2 * 1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024)
+
+REGISTRY = {}
+
+# ═══════════════════════════════════════════════════════════
+# TYPES DE MÉTRIQUES
+# ═══════════════════════════════════════════════════════════
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(current, value):
+        return (current or 0) + value
+
+    def render(self, key, value):
+        yield f'{self.name}{format_labels(self.labelnames, key)} {value}'
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [comptes par intervalle (dernier = +Inf), somme]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self.values.items()]
+
+    @staticmethod
+    def merge(current, value):
+        if current is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+
+    def render(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float('inf')), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{self.name}_bucket{format_labels(self.labelnames + ("le",), (*key, le))} {cumulative}'
+        yield f'{self.name}_sum{format_labels(self.labelnames, key)} {total}'
+        yield f'{self.name}_count{format_labels(self.labelnames, key)} {cumulative}'
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for value in values
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+# ═══════════════════════════════════════════════════════════
+# AGRÉGATION ENTRE WORKERS
+# ═══════════════════════════════════════════════════════════
+
+# Identifiant unique du processus (un PID peut être réutilisé par un nouveau worker)
+_process_id = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+def snapshot():
+    """Mesures du processus courant : {nom: [[labels, valeur], ...]}"""
+    return {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+def snapshot_pattern(suffix='.json'):
+    """Instantanés de ce service dans METRICS_DIR (le dossier peut contenir d'autres fichiers)"""
+    return os.path.join(METRICS_DIR, f'{SNAPSHOT_PREFIX}*{suffix}')
+
+def snapshot_path():
+    global _process_id
+    if _process_id is None or not _process_id.startswith(f'{os.getpid()}-'):
+        _process_id = f'{os.getpid()}-{time.time_ns()}'
+    return os.path.join(METRICS_DIR, f'{SNAPSHOT_PREFIX}{_process_id}.json')
+
+def write_snapshot():
+    """Écrit (atomiquement) l'instantané du processus dans METRICS_DIR"""
+    if not METRICS_DIR:
+        return
+    path = snapshot_path()
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+@contextmanager
+def snapshots_locked(operation):
+    """Verrou fcntl sur les instantanés : partagé pour /metrics, exclusif pour la compaction"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, f'{SNAPSHOT_PREFIX}lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def merge_into(merged, data):
+    """Ajoute un instantané ({nom: [[labels, valeur], ...]}) aux mesures fusionnées"""
+    for name, rows in data.items():
+        metric = REGISTRY.get(name)
+        if metric is None:
+            continue
+        values = merged.setdefault(name, {})
+        for labels, value in rows:
+            key = tuple(labels)
+            values[key] = metric.merge(values.get(key), value)
+
+def snapshot_pid(path):
+    """PID du worker d'un instantané ({SNAPSHOT_PREFIX}{pid}-{ns}.json), None pour "retired" """
+    try:
+        return int(os.path.basename(path)[len(SNAPSHOT_PREFIX):].split('-')[0])
+    except ValueError:
+        return None
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def compact_snapshots():
+    """
+    Fusionne les instantanés des workers arrêtés dans RETIRED_SNAPSHOT
+    Les fichiers fusionnés sont notés dans RETIRED_SNAPSHOT avant d'être supprimés :
+    après un arrêt entre les deux, ils sont ignorés par /metrics puis supprimés ici
+    """
+    retired_path = os.path.join(METRICS_DIR, RETIRED_SNAPSHOT)
+    with snapshots_locked(fcntl.LOCK_EX):
+        retired = read_json(retired_path) or {'metrics': {}, 'compacted': []}
+        for name in retired['compacted']:
+            if os.path.exists(os.path.join(METRICS_DIR, name)):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+        merged = {}
+        merge_into(merged, retired['metrics'])
+        dead = []
+        for path in glob.glob(snapshot_pattern()):
+            pid = snapshot_pid(path)
+            if pid is None or pid == os.getpid() or process_alive(pid):
+                continue
+            data = read_json(path)
+            if data is not None:
+                merge_into(merged, data)
+            dead.append(os.path.basename(path))
+        if not dead and not retired['compacted']:
+            return
+
+        tmp_path = f'{retired_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'metrics': {name: [[list(key), value] for key, value in values.items()]
+                            for name, values in merged.items()},
+                'compacted': dead
+            }, f)
+        os.replace(tmp_path, retired_path)
+        for name in dead:
+            os.remove(os.path.join(METRICS_DIR, name))
+
+def ensure_flusher():
+    """Démarre (une fois par processus, après fork) l'écriture périodique des instantanés"""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def flush_loop():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            write_snapshot()
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    try:
+        compact_snapshots()
+    except OSError:
+        pass
+    threading.Thread(target=flush_loop, name='metrics-flush', daemon=True).start()
+    atexit.register(write_snapshot)
+
+def collect():
+    """Mesures fusionnées de tous les workers (ou du seul processus courant)"""
+    merged = {name: {} for name in REGISTRY}
+    if not METRICS_DIR:
+        merge_into(merged, snapshot())
+        return merged
+
+    write_snapshot()
+    with snapshots_locked(fcntl.LOCK_SH):
+        retired = read_json(os.path.join(METRICS_DIR, RETIRED_SNAPSHOT)) or {'metrics': {}, 'compacted': []}
+        merge_into(merged, retired['metrics'])
+        for path in glob.glob(snapshot_pattern()):
+            name = os.path.basename(path)
+            if name == RETIRED_SNAPSHOT or name in retired['compacted']:
+                continue
+            data = read_json(path)
+            if data is not None:
+                merge_into(merged, data)
+    return merged
+
+def render_prometheus():
+    """Format d'exposition texte Prometheus (version 0.0.4)"""
+    lines = []
+    for name, values in collect().items():
+        metric = REGISTRY[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key in sorted(values):
+            lines.extend(metric.render(key, values[key]))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,321 @@
+"""
+Scoring hors ligne d'arborescences d'images (sauvegardes SD des ESP32, tomato/...)
+
+- parcourt récursivement les dossiers d'entrée
+- décode dans un pool de processus (même decode_image que l'API)
+- prédit par grands lots (predict_disease_batch : même modèle, TTA, sévérité)
+- écrit les résultats en JSONL (ou CSV) au fil de l'eau : le fichier de sortie sert de
+  point de reprise, un run interrompu reprend là où il s'est arrêté
+- rapporte le débit et, si les noms de dossiers sont des classes, une matrice de confusion
+
+Usage:
+    python score_images.py tomato/ --output scores.jsonl --batch-size 128 --workers 4
+    python score_images.py /mnt/sd-backups --output sd.csv --model-version v20250101-120000
+    python score_images.py cache/shards --output scores.jsonl   # dataset préparé par dataset_shards.py
+"""
+import os
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+import numpy as np
+
+# Pas d'envoi au backend ni de chargement en arrière-plan dans ce processus
+os.environ.setdefault('SEND_TO_BACKEND', 'false')
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+import app
+from dataset_shards import ShardReader, is_shard_dir
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+OUTPUT_FIELDS = ['path', 'label', 'prediction', 'predictionFr', 'confidence', 'severity',
+                 'diseaseDetected', 'shouldWater', 'modelUsed', 'error']
+
+# ═══════════════════════════════════════════════════════════
+# ENTRÉES
+# ═══════════════════════════════════════════════════════════
+
+def list_images(roots):
+    """Chemins des images sous `roots`, triés (ordre stable pour la reprise)"""
+    paths = []
+    for root in roots:
+        if os.path.isfile(root):
+            paths.append(root)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            paths.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+def label_for(path, dataset_folders):
+    """Classe déduite du dossier parent (nom de classe ou dossier PlantVillage), sinon None"""
+    folder = os.path.basename(os.path.dirname(path))
+    label = dataset_folders.get(folder, folder)
+    return label if label in app.DISEASE_CLASSES else None
+
+def decode_many(paths, size):
+    """Processus de décodage : [(tableau uint8 (H, W, 3) ou None, erreur ou None)] à la taille (W, H)"""
+    decoded = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                decoded.append((app.decode_image(f.read(), size), None))
+        except Exception as e:
+            decoded.append((None, f'{type(e).__name__}: {e}'))
+    return decoded
+
+def init_decoder():
+    # Les processus de décodage n'ont besoin ni du modèle ni du backend
+    os.environ['MODEL_LOAD_MODE'] = 'lazy'
+    os.environ['SEND_TO_BACKEND'] = 'false'
+
+# ═══════════════════════════════════════════════════════════
+# SORTIE AVEC REPRISE
+# ═══════════════════════════════════════════════════════════
+
+def read_checkpoint(output_path):
+    """Enregistrements déjà écrits ; une dernière ligne tronquée (crash) est supprimée"""
+    if not os.path.exists(output_path):
+        return []
+    records = []
+    if output_path.endswith('.csv'):
+        # Même réparation que pour le JSONL : tout ce qui suit le dernier saut de ligne est tronqué
+        with open(output_path, 'rb') as f:
+            valid_bytes = f.read().rfind(b'\n') + 1
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_bytes)
+        with open(output_path, newline='') as f:
+            records = list(csv.DictReader(f))
+        for record in records:
+            record['confidence'] = float(record['confidence']) if record.get('confidence') else None
+        return records
+
+    valid_bytes = 0
+    with open(output_path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_bytes += len(line)
+    with open(output_path, 'r+b') as f:
+        f.truncate(valid_bytes)
+    return records
+
+class ResultWriter:
+    """Écriture en ajout, vidée et synchronisée sur disque après chaque lot"""
+
+    def __init__(self, output_path):
+        self.csv = output_path.endswith('.csv')
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self.file = open(output_path, 'a', newline='' if self.csv else None)
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_FIELDS, extrasaction='ignore')
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.csv:
+                self.writer.writerow(record)
+            else:
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+# ═══════════════════════════════════════════════════════════
+# RAPPORT
+# ═══════════════════════════════════════════════════════════
+
+def confusion_report(records):
+    """Matrice de confusion (lignes = vraie classe) et précision par classe"""
+    classes = app.DISEASE_CLASSES
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for record in records:
+        if record.get('label') and record.get('prediction') in classes:
+            matrix[classes.index(record['label']), classes.index(record['prediction'])] += 1
+    if not matrix.sum():
+        return None
+    totals = matrix.sum(axis=1)
+    return {
+        'classes': classes,
+        'matrix': matrix.tolist(),
+        'accuracy': round(float(np.trace(matrix) / matrix.sum()), 4),
+        'per_class_accuracy': {
+            name: round(float(matrix[i, i] / totals[i]), 4) if totals[i] else None
+            for i, name in enumerate(classes)
+        }
+    }
+
+def print_confusion(report):
+    short = [name.replace('Tomato_', '')[:6] for name in report['classes']]
+    print(f"\n📊 Matrice de confusion (lignes = vraie classe), précision globale {report['accuracy']:.2%}")
+    print(f"{'':<14}" + ''.join(f'{name:>8}' for name in short))
+    for name, row in zip(report['classes'], report['matrix']):
+        print(f"{name.replace('Tomato_', '')[:13]:<14}" + ''.join(f'{count:>8}' for count in row))
+
+# ═══════════════════════════════════════════════════════════
+# SCORING
+# ═══════════════════════════════════════════════════════════
+
+def predict_records(batch, valid, args, stats):
+    """Prédit le lot normalisé `batch` et complète les enregistrements `valid` correspondants"""
+    if not valid:
+        return
+    start = time.perf_counter()
+    results = app.predict_disease_batch(batch[:len(valid)], args.model_version)
+    stats['inference_s'] += time.perf_counter() - start
+    for record, result in zip(valid, results):
+        record.update({field: result[field] for field in OUTPUT_FIELDS[2:-1]})
+
+def score(paths, args, writer, dataset_folders):
+    """Décodage en pool de processus (lots préchargés) + inférence par grands lots"""
+    stats = {'images': 0, 'errors': 0, 'decode_wait_s': 0.0, 'inference_s': 0.0}
+    batches = [paths[i:i + args.batch_size] for i in range(0, len(paths), args.batch_size)]
+    # Taille d'entrée du modèle servi (variante 160px, 128px... : metadata input_size)
+    size = app.input_size_for(args.model_version)
+    batch = app.new_image_buffer(size, args.batch_size)
+    chunk_size = max(1, args.batch_size // args.workers)
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp.get_context('spawn'),
+                             initializer=init_decoder) as pool:
+        pending = deque()
+
+        def submit(batch_paths):
+            pending.append((batch_paths, [pool.submit(decode_many, batch_paths[i:i + chunk_size], size)
+                                          for i in range(0, len(batch_paths), chunk_size)]))
+
+        for batch_paths in batches[:args.prefetch]:
+            submit(batch_paths)
+        next_batch = args.prefetch
+
+        while pending:
+            batch_paths, futures = pending.popleft()
+            start = time.perf_counter()
+            decoded = [item for future in futures for item in future.result()]
+            stats['decode_wait_s'] += time.perf_counter() - start
+
+            if next_batch < len(batches):
+                submit(batches[next_batch])
+                next_batch += 1
+
+            records, valid = [], []
+            for path, (pixels, error) in zip(batch_paths, decoded):
+                record = {'path': os.path.relpath(path, args.relative_to), 'label': label_for(path, dataset_folders)}
+                if error is None:
+                    app.normalize_into(pixels, batch[len(valid)])
+                    valid.append(record)
+                else:
+                    record['error'] = error
+                    stats['errors'] += 1
+                records.append(record)
+
+            predict_records(batch, valid, args, stats)
+            writer.write(records)
+            stats['images'] += len(records)
+            print(f"🧮 {stats['images']}/{len(paths)} images", end='\r')
+    print()
+    return stats
+
+def score_shards(reader, rows, args, writer):
+    """Scoring depuis des shards : ni décodage ni pool de processus, lots lus en memmap"""
+    stats = {'images': 0, 'errors': 0, 'decode_wait_s': 0.0, 'inference_s': 0.0}
+    if tuple(reader.size) != tuple(app.input_size_for(args.model_version)):
+        print(f"⚠️ Shards en {reader.size[0]}x{reader.size[1]} : images redimensionnées à la taille du modèle")
+    batch = app.new_image_buffer(reader.size, args.batch_size)
+
+    for start in range(0, len(rows), args.batch_size):
+        batch_rows = rows[start:start + args.batch_size]
+        read_start = time.perf_counter()
+        app.normalize_into(reader.images(batch_rows), batch[:len(batch_rows)])
+        stats['decode_wait_s'] += time.perf_counter() - read_start
+
+        records = [{'path': os.path.relpath(reader.paths[row], args.relative_to),
+                    'label': reader.classes[reader.labels[row]]} for row in batch_rows]
+        predict_records(batch, records, args, stats)
+        writer.write(records)
+        stats['images'] += len(records)
+        print(f"🧮 {stats['images']}/{len(rows)} images", end='\r')
+    print()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hors ligne d'images (JSONL/CSV avec reprise)")
+    parser.add_argument('inputs', nargs='+',
+                        help="dossiers (parcourus récursivement), fichiers, ou un dossier de shards")
+    parser.add_argument('--output', default='scores.jsonl', help="fichier .jsonl ou .csv (point de reprise)")
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="processus de décodage")
+    parser.add_argument('--prefetch', type=int, default=2, help="lots décodés en avance")
+    parser.add_argument('--model-version', default=None, help="version du registre (défaut: active)")
+    parser.add_argument('--relative-to', default='.', help="racine des chemins écrits dans la sortie")
+    parser.add_argument('--restart', action='store_true', help="ignorer la sortie existante")
+    args = parser.parse_args()
+
+    # Import ici et non au niveau du module : les processus de décodage (spawn) réimportent
+    # ce fichier et n'ont pas besoin de TensorFlow
+    from train import DATASET_FOLDERS
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+
+    previous = read_checkpoint(args.output)
+    done = {record['path'] for record in previous}
+    shards = ShardReader(args.inputs[0]) if len(args.inputs) == 1 and is_shard_dir(args.inputs[0]) else None
+    if shards is not None:
+        rows = [row for row, path in enumerate(shards.paths) if os.path.relpath(path, args.relative_to) not in done]
+        print(f"📦 {len(rows)} image(s) à scorer depuis les shards ({len(previous)} déjà dans {args.output})")
+    else:
+        paths = [path for path in list_images(args.inputs) if os.path.relpath(path, args.relative_to) not in done]
+        print(f"📂 {len(paths)} image(s) à scorer ({len(previous)} déjà dans {args.output})")
+
+    if not app.wait_for_model(timeout=None) or app.active_model is None:
+        print("⚠️ Modèle introuvable : prédictions en mode DÉMO")
+
+    writer = ResultWriter(args.output)
+    started = time.perf_counter()
+    try:
+        if shards is not None:
+            stats = score_shards(shards, rows, args, writer)
+        else:
+            stats = score(paths, args, writer, DATASET_FOLDERS)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+
+    summary = {
+        'output': args.output,
+        'model': app.active_model.name if app.active_model is not None else 'demo_mode',
+        'scored_this_run': stats['images'],
+        'resumed_from': len(previous),
+        'errors': stats['errors'],
+        'elapsed_s': round(elapsed, 2),
+        'images_per_s': round(stats['images'] / elapsed, 2) if elapsed else None,
+        'decode_wait_s': round(stats['decode_wait_s'], 2),
+        'inference_s': round(stats['inference_s'], 2),
+        'confusion': confusion_report(read_checkpoint(args.output))
+    }
+    print(f"⚡ {summary['scored_this_run']} images en {summary['elapsed_s']}s "
+          f"({summary['images_per_s']} images/s, attente décodage {summary['decode_wait_s']}s, "
+          f"inférence {summary['inference_s']}s, {summary['errors']} erreur(s))")
+    if summary['confusion']:
+        print_confusion(summary['confusion'])
+
+    summary_path = os.path.splitext(args.output)[0] + '_summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n✅ Résumé sauvegardé: {summary_path}")
+
+if __name__ == '__main__':
+    main()
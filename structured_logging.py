@@ -0,0 +1,140 @@
+"""
+Logging du service : texte ou JSON structuré, non bloquant et échantillonné
+
+- LOG_FORMAT=text : format historique (asctime - level - message), champs ajoutés en key=value
+- LOG_FORMAT=json : un objet JSON par ligne (un enregistrement complet par requête)
+- LOG_ASYNC : les threads de requête déposent les enregistrements dans une file bornée,
+  un thread dédié les formate et les écrit (pas d'E/S sur le chemin critique ;
+  file pleine = enregistrement abandonné et compté)
+- LOG_SAMPLE_RATE : fraction des requêtes réussies journalisées (les erreurs le sont toujours)
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class TextFormatter(logging.Formatter):
+    """Format historique, suivi des champs structurés (avant l'éventuelle trace)"""
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' | ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par enregistrement : message, niveau, champs et trace éventuelle"""
+
+    def format(self, record):
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'message': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler qui ne bloque jamais : file pleine = enregistrement abandonné"""
+
+    def __init__(self, capacity):
+        super().__init__(queue.Queue(max(1, capacity)))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Même processus : message et trace sont formatés par le thread d'écriture
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_queue_handler = None
+_listener = None
+
+def stop_listener():
+    """Vide la file et arrête le thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def configure_logging(stream=None, log_format=LOG_FORMAT, log_async=LOG_ASYNC, level=LOG_LEVEL):
+    """Configure le logger racine ; retourne le handler installé"""
+    global _queue_handler, _listener
+    stop_listener()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if log_async:
+        _queue_handler = NonBlockingQueueHandler(LOG_QUEUE_SIZE)
+        _listener = QueueListener(_queue_handler.queue, output)
+        _listener.start()
+        handler = _queue_handler
+    else:
+        _queue_handler = None
+        handler = output
+
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+def _restart_listener_after_fork():
+    """Le thread d'écriture ne survit pas au fork (gunicorn --preload) : le recréer"""
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers)
+        _listener.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+atexit.register(stop_listener)
+
+def sampled(sample_rate=None):
+    """Tirage de l'échantillonnage des requêtes réussies"""
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    return rate >= 1 or random.random() < rate
+
+def log_request(logger, message, fields, success=True, exc_info=None):
+    """
+    Un seul enregistrement par requête avec tous ses champs
+    Réussites échantillonnées (LOG_SAMPLE_RATE), erreurs toujours journalisées avec la trace
+    """
+    level = logging.INFO if success else logging.ERROR
+    if not logger.isEnabledFor(level) or (success and not sampled()):
+        return
+    logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+def stats():
+    return {
+        'format': LOG_FORMAT,
+        'async': _queue_handler is not None,
+        'sample_rate': LOG_SAMPLE_RATE,
+        'queue_size': _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        'dropped': _queue_handler.dropped if _queue_handler is not None else 0
+    }
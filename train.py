@@ -3,14 +3,45 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import numpy as np
 import os
+import json
+import sys
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import itertools
+import subprocess
+from datetime import datetime
+
+from dataset_shards import ShardReader
+from image_decode import decode_image
 
 # Configuration
 IMG_SIZE = (224, 224)
+ALPHA = 1.0  # largeur de MobileNetV2 (multiplicateur du nombre de filtres)
+# Résolutions et largeurs disposant de poids ImageNet pour MobileNetV2
+MOBILENET_SIZES = (96, 128, 160, 192, 224)
+MOBILENET_ALPHAS = (0.35, 0.5, 0.75, 1.0, 1.3, 1.4)
 BATCH_SIZE = 32
 EPOCHS = 50
-DATASET_PATH = './data/tomato'  # dossier contenant 10 classes
+DATASET_PATH = './tomato'  # dossier contenant 10 classes (défaut partagé par evaluate.py, export_tflite.py)
 MODEL_SAVE_PATH = './models/tomato_disease_model.h5'
+MODEL_REGISTRY_DIR = './models/registry'  # registre versionné lu par app.py
+CACHE_DIR = './cache/tfdata'  # images décodées et redimensionnées (pipeline tf.data)
+FEATURE_DIR = './cache/features'  # embeddings du backbone gelé (pipeline features)
+FEATURE_AUGMENTATIONS = 2  # variantes augmentées précalculées par image d'entraînement
+VALIDATION_SPLIT = 0.2
+TEST_SPLIT = 0.1  # images jamais vues à l'entraînement ni par les callbacks (evaluate.py, export_tflite.py)
+SEED = 42
+SHUFFLE_BUFFER = 2048  # images décodées en mémoire pour le mélange par époque (~300 Mo en 224x224)
+LEARNING_RATE = 0.001  # pour BATCH_SIZE ; mis à l'échelle pour les lots plus grands
+FINE_TUNE_LEARNING_RATE = 1e-5
+FINE_TUNE_LAYERS = 40  # couches du haut de MobileNetV2 dégelées (blocs 13 à 16 + Conv_1)
+AUTOTUNE = tf.data.AUTOTUNE
 
 CLASSES = [
     "Tomato_bacterial_spot",
@@ -25,28 +56,161 @@ CLASSES = [
     "Tomato_yellow_leaf_curl_virus"
 ]
 
-def create_model(num_classes):
-    """Créer le modèle CNN avec MobileNetV2"""
-    base_model = keras.applications.MobileNetV2(
-        input_shape=(*IMG_SIZE, 3),
-        include_top=False,
-        weights='imagenet'
-    )
-    base_model.trainable = False
+# Correspondance dossiers du dataset (PlantVillage) -> CLASSES
+DATASET_FOLDERS = {
+    "Tomato___Bacterial_spot": "Tomato_bacterial_spot",
+    "Tomato___Early_blight": "Tomato_early_blight",
+    "Tomato___healthy": "Tomato_healthy",
+    "Tomato___Late_blight": "Tomato_late_blight",
+    "Tomato___Leaf_Mold": "Tomato_leaf_mold",
+    "Tomato___Septoria_leaf_spot": "Tomato_septoria_leaf_spot",
+    "Tomato___Spider_mites Two-spotted_spider_mite": "Tomato_spider_mites_two-spotted_spider_mite",
+    "Tomato___Target_Spot": "Tomato_target_spot",
+    "Tomato___Tomato_mosaic_virus": "Tomato_mosaic_virus",
+    "Tomato___Tomato_Yellow_Leaf_Curl_Virus": "Tomato_yellow_leaf_curl_virus"
+}
 
-    model = keras.Sequential([
-        base_model,
-        layers.GlobalAveragePooling2D(),
-        layers.Dropout(0.3),
-        layers.Dense(256, activation='relu'),
-        layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
-    ])
-    return model
+def list_dataset(dataset_path):
+    """Liste (chemin, indice de classe dans CLASSES) pour chaque image du dataset"""
+    samples = []
+    for folder in sorted(os.listdir(dataset_path)):
+        class_name = DATASET_FOLDERS.get(folder, folder)
+        if class_name not in CLASSES:
+            continue
+        folder_path = os.path.join(dataset_path, folder)
+        for filename in sorted(os.listdir(folder_path)):
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                samples.append((os.path.join(folder_path, filename), CLASSES.index(class_name)))
+    return samples
+
+def split_dataset(samples, validation_split=VALIDATION_SPLIT, test_split=TEST_SPLIT, seed=SEED):
+    """
+    Split train/validation/test déterministe et stratifié par classe
+    La validation sert à EarlyStopping/ModelCheckpoint : seul le test est une mesure non biaisée
+    """
+    rng = random.Random(seed)
+    train, validation, test = [], [], []
+    for class_idx in range(len(CLASSES)):
+        class_samples = [sample for sample in samples if sample[1] == class_idx]
+        rng.shuffle(class_samples)
+        n_test = int(len(class_samples) * test_split)
+        n_val = int(len(class_samples) * validation_split)
+        test.extend(class_samples[:n_test])
+        validation.extend(class_samples[n_test:n_test + n_val])
+        train.extend(class_samples[n_test + n_val:])
+    return train, validation, test
+
+def decode_and_resize(path, label):
+    """
+    Décode une image (JPEG ou PNG) et la redimensionne en uint8 (format compact pour le cache)
+    Même décodage que l'API et les shards (image_decode.py, PIL libère le GIL)
+    """
+    def decode(data):
+        return decode_image(data.numpy(), (IMG_SIZE[1], IMG_SIZE[0]))
+
+    image = tf.py_function(decode, [tf.io.read_file(path)], tf.uint8)
+    image.set_shape((*IMG_SIZE, 3))
+    return image, label
+
+def create_augmentation():
+    """Augmentations équivalentes à l'ancien ImageDataGenerator, appliquées par lot"""
+    return keras.Sequential([
+        layers.RandomFlip('horizontal', seed=SEED),
+        layers.RandomRotation(20 / 360, seed=SEED),
+        layers.RandomTranslation(0.2, 0.2, seed=SEED),
+        layers.RandomZoom(0.2, seed=SEED)
+    ], name='augmentation')
+
+def make_dataset(samples, training, cache_path=None, batch_size=BATCH_SIZE):
+    """
+    Pipeline tf.data : décodage parallèle, cache des images redimensionnées,
+    augmentation vectorisée par lot et prefetch
+    Entraînement : chemins mélangés avant décodage (cache sans ordre par classe), puis
+    mélange par époque sur un tampon borné (SHUFFLE_BUFFER) plutôt que sur tout le dataset décodé
+    Supprimer les fichiers de cache si le dataset ou IMG_SIZE change
+    """
+    if training:
+        samples = list(samples)
+        random.Random(SEED).shuffle(samples)
+    paths = [path for path, _ in samples]
+    labels = [label for _, label in samples]
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(decode_and_resize, num_parallel_calls=AUTOTUNE)
+    dataset = dataset.cache(cache_path) if cache_path else dataset.cache()
+
+    if training:
+        dataset = dataset.shuffle(min(len(samples), SHUFFLE_BUFFER), seed=SEED, reshuffle_each_iteration=True)
+
+    return prepare_batches(dataset.batch(batch_size), training)
+
+def prepare_batches(dataset, training):
+    """Lots uint8 -> float32 [0, 1] (+ augmentation vectorisée) et labels one-hot"""
+    augmentation = create_augmentation() if training else None
+
+    def prepare(images, labels):
+        images = tf.cast(images, tf.float32) / 255.0
+        if augmentation is not None:
+            images = augmentation(images, training=True)
+        return images, tf.one_hot(labels, len(CLASSES))
+
+    return dataset.map(prepare, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+def open_shards(shards_dir, split):
+    """Lecteur d'un split de dataset_shards.py, vérifié contre IMG_SIZE et CLASSES"""
+    reader = ShardReader(shards_dir, split)
+    if reader.image_size != tuple(IMG_SIZE):
+        raise ValueError(f"Shards en {reader.image_size[0]}x{reader.image_size[1]}, modèle en "
+                         f"{IMG_SIZE[0]}x{IMG_SIZE[1]} : relancer dataset_shards.py --image-size {IMG_SIZE[0]}")
+    if reader.classes != CLASSES:
+        raise ValueError("Classes des shards différentes de CLASSES : relancer dataset_shards.py")
+    return reader
+
+def make_shard_dataset(reader, training, batch_size=BATCH_SIZE, mode='mmap'):
+    """
+    Pipeline tf.data sur des shards : ni lecture de JPEG ni décodage ni cache,
+    lots lus en memmap (ou séquentiellement), mélangés différemment à chaque époque
+    """
+    epochs = itertools.count()
+
+    def generator():
+        seed = SEED + next(epochs)
+        for images, labels, _ in reader.batches(batch_size, shuffle=training, seed=seed, mode=mode):
+            yield images, labels
+
+    dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+        tf.TensorSpec(shape=(None, *IMG_SIZE, 3), dtype=tf.uint8),
+        tf.TensorSpec(shape=(None,), dtype=tf.int32)
+    ))
+    return prepare_batches(dataset, training)
 
-def train_model():
-    """Entraîner le modèle"""
-    # Prétraitement et augmentation
+def load_datasets(dataset_path=DATASET_PATH, cache_dir=CACHE_DIR, batch_size=BATCH_SIZE, shards_dir=None):
+    """Datasets d'entraînement et de validation (pipeline tf.data, depuis les shards si fournis)"""
+    if shards_dir:
+        train_reader, val_reader = open_shards(shards_dir, 'train'), open_shards(shards_dir, 'validation')
+        print(f"📦 Shards {shards_dir}: {len(train_reader)} images d'entraînement, {len(val_reader)} de validation")
+        return (
+            make_shard_dataset(train_reader, training=True, batch_size=batch_size),
+            make_shard_dataset(val_reader, training=False, batch_size=batch_size)
+        )
+
+    train_samples, val_samples, _ = split_dataset(list_dataset(dataset_path))
+    print(f"📂 {len(train_samples)} images d'entraînement, {len(val_samples)} de validation")
+
+    # Proportions et décodeur dans le nom : un cache tf.data n'est pas revalidé contre la liste d'images
+    size_tag = f'{IMG_SIZE[0]}x{IMG_SIZE[1]}_v{VALIDATION_SPLIT:g}_t{TEST_SPLIT:g}_pil'
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    train_cache = os.path.join(cache_dir, f'train_{size_tag}') if cache_dir else None
+    val_cache = os.path.join(cache_dir, f'validation_{size_tag}') if cache_dir else None
+
+    return (
+        make_dataset(train_samples, training=True, cache_path=train_cache, batch_size=batch_size),
+        make_dataset(val_samples, training=False, cache_path=val_cache, batch_size=batch_size)
+    )
+
+def load_generators(dataset_path=DATASET_PATH, batch_size=BATCH_SIZE):
+    """Ancien pipeline ImageDataGenerator (référence), indices alignés sur CLASSES"""
     datagen = ImageDataGenerator(
         rescale=1./255,
         rotation_range=20,
@@ -54,48 +218,590 @@ def train_model():
         height_shift_range=0.2,
         horizontal_flip=True,
         zoom_range=0.2,
-        validation_split=0.2
+        validation_split=VALIDATION_SPLIT
     )
 
+    # Dossiers listés dans l'ordre de CLASSES (sinon ordre alphabétique des dossiers)
+    folders = {class_name: folder for folder, class_name in DATASET_FOLDERS.items()}
+    classes = [folders[class_name] for class_name in CLASSES]
+
     train_gen = datagen.flow_from_directory(
-        DATASET_PATH,
+        dataset_path,
         target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         class_mode='categorical',
+        classes=classes,
         subset='training'
     )
 
     val_gen = datagen.flow_from_directory(
-        DATASET_PATH,
+        dataset_path,
         target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         class_mode='categorical',
+        classes=classes,
         subset='validation'
     )
+    return train_gen, val_gen
 
-    model = create_model(len(CLASSES))
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=0.001),
-        loss='categorical_crossentropy',
+def create_backbone():
+    """MobileNetV2 gelé (ImageNet) suivi du pooling global : image -> embedding"""
+    base_model = keras.applications.MobileNetV2(
+        input_shape=(*IMG_SIZE, 3),
+        alpha=ALPHA,
+        include_top=False,
+        weights='imagenet'
+    )
+    base_model.trainable = False
+    return base_model
+
+def create_head_layers(num_classes):
+    """Tête de classification entraînable (après le pooling global)"""
+    return [
+        layers.Dropout(0.3),
+        layers.Dense(256, activation='relu'),
+        layers.Dropout(0.3),
+        # Sorties float32 même en précision mixte (softmax stable)
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
+    ]
+
+def create_model(num_classes, head_layers=None):
+    """Créer le modèle CNN avec MobileNetV2 (tête éventuellement déjà entraînée)"""
+    model = keras.Sequential([
+        create_backbone(),
+        layers.GlobalAveragePooling2D(),
+        *(head_layers or create_head_layers(num_classes))
+    ])
+    return model
+
+# ═══════════════════════════════════════════════════════════
+# FEATURE STORE (BACKBONE GELÉ)
+# ═══════════════════════════════════════════════════════════
+
+def feature_store_path(feature_dir, split):
+    # _pil : images décodées par image_decode.py (les anciennes features venaient de tf.image.resize)
+    size_tag = f'{IMG_SIZE[0]}x{IMG_SIZE[1]}' + (f'_a{ALPHA:g}' if ALPHA != 1.0 else '') + '_pil'
+    return os.path.join(feature_dir, f'{split}_mobilenetv2_{size_tag}')
+
+def extract_features(samples, store_path, augmentations=0, batch_size=BATCH_SIZE, reader=None):
+    """
+    Passe unique du backbone gelé sur les images : embeddings float16 dans
+    `<store_path>.npy` (memmap) + index JSON des chemins, labels et variantes
+    Ligne `variant * len(samples) + i` = image i (variante 0 = sans augmentation)
+    `reader` : images lues dans les shards (mêmes échantillons, même ordre) au lieu des JPEG
+    """
+    index_path = store_path + '.json'
+    paths = [path for path, _ in samples]
+    labels = [label for _, label in samples]
+
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index['paths'] == paths and index['augmentations'] == augmentations:
+            print(f"♻️ Features déjà extraites: {store_path}.npy")
+            return index
+
+    backbone = keras.Sequential([create_backbone(), layers.GlobalAveragePooling2D()])
+    augmentation = create_augmentation() if augmentations else None
+    feature_dim = backbone.output_shape[-1]
+    variants = 1 + augmentations
+
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    features = np.lib.format.open_memmap(
+        store_path + '.npy', mode='w+', dtype=np.float16, shape=(len(samples) * variants, feature_dim)
+    )
+
+    if reader is not None:
+        batches = (images for images, _, _ in reader.batches(batch_size))
+    else:
+        dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+        dataset = dataset.map(decode_and_resize, num_parallel_calls=AUTOTUNE).batch(batch_size).prefetch(AUTOTUNE)
+        batches = (images for images, _ in dataset)
+
+    # Chaque lot est décodé une seule fois, puis passé au backbone pour chaque variante
+    start = 0
+    for images in batches:
+        images = tf.cast(images, tf.float32) / 255.0
+        for variant in range(variants):
+            batch = augmentation(images, training=True) if variant else images
+            row = variant * len(samples) + start
+            features[row:row + len(images)] = backbone(batch, training=False).numpy()
+        start += len(images)
+        print(f"🧮 Features: {start}/{len(samples)} images", end='\r')
+    features.flush()
+    del features
+
+    index = {
+        'backbone': 'mobilenetv2',
+        'input_size': list(IMG_SIZE),
+        'alpha': ALPHA,
+        'feature_dim': int(feature_dim),
+        'dtype': 'float16',
+        'augmentations': augmentations,
+        'created_at': datetime.now().isoformat(),
+        'paths': paths,
+        'labels': labels
+    }
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    print(f"\n💾 {len(samples) * variants} embeddings ({feature_dim}) -> {store_path}.npy")
+    return index
+
+def load_features(store_path, with_augmentations=True):
+    """(features memmap float16, labels) d'un feature store"""
+    with open(store_path + '.json') as f:
+        index = json.load(f)
+    features = np.load(store_path + '.npy', mmap_mode='r')
+    labels = np.asarray(index['labels'], dtype=np.int32)
+    if not with_augmentations:
+        return features[:len(labels)], labels
+    return features, np.tile(labels, 1 + index['augmentations'])
+
+def train_head(dataset_path=DATASET_PATH, epochs=EPOCHS, feature_dir=FEATURE_DIR,
+               augmentations=FEATURE_AUGMENTATIONS, batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE,
+               extra_callbacks=(), shards_dir=None):
+    """Entraîne la tête Dense sur les embeddings précalculés puis assemble le modèle complet"""
+    if shards_dir:
+        train_reader, val_reader = open_shards(shards_dir, 'train'), open_shards(shards_dir, 'validation')
+        train_samples, val_samples = train_reader.samples(), val_reader.samples()
+    else:
+        train_reader = val_reader = None
+        train_samples, val_samples, _ = split_dataset(list_dataset(dataset_path))
+    print(f"📂 {len(train_samples)} images d'entraînement, {len(val_samples)} de validation")
+
+    train_store = feature_store_path(feature_dir, 'train')
+    val_store = feature_store_path(feature_dir, 'validation')
+    extract_features(train_samples, train_store, augmentations, batch_size, train_reader)
+    extract_features(val_samples, val_store, 0, batch_size, val_reader)
+
+    x_train, y_train = load_features(train_store)
+    x_val, y_val = load_features(val_store, with_augmentations=False)
+
+    head_layers = create_head_layers(len(CLASSES))
+    head = keras.Sequential([keras.Input(shape=(x_train.shape[1],)), *head_layers])
+    head.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='sparse_categorical_crossentropy',
         metrics=['accuracy']
     )
 
     callbacks = [
         keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True),
         keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3),
-        keras.callbacks.ModelCheckpoint(MODEL_SAVE_PATH, monitor='val_accuracy', save_best_only=True)
+        *extra_callbacks
     ]
 
-    history = model.fit(
-        train_gen,
-        epochs=EPOCHS,
-        validation_data=val_gen,
+    history = head.fit(
+        np.asarray(x_train, dtype=np.float32), y_train,
+        batch_size=batch_size,
+        epochs=epochs,
+        shuffle=True,
+        validation_data=(np.asarray(x_val, dtype=np.float32), y_val),
         callbacks=callbacks
     )
 
-    print(f"\n✅ Modèle sauvegardé: {MODEL_SAVE_PATH}")
+    # Même architecture que create_model : le .h5 reste compatible avec app.py
+    model = create_model(len(CLASSES), head_layers)
+    return model, history
+
+# ═══════════════════════════════════════════════════════════
+# VARIANTES (RÉSOLUTION D'ENTRÉE / LARGEUR) ET REGISTRE
+# ═══════════════════════════════════════════════════════════
+
+def variant_name():
+    """Nom de la variante entraînée, ex. '224px' ou '160px-a0.75' (alias accepté par modelVersion)"""
+    name = f'{IMG_SIZE[0]}px'
+    return name if ALPHA == 1.0 else f'{name}-a{ALPHA:g}'
+
+def variant_model_path():
+    """MODEL_SAVE_PATH pour la variante de référence (224px, alpha 1), sinon un fichier par variante"""
+    if IMG_SIZE == (224, 224) and ALPHA == 1.0:
+        return MODEL_SAVE_PATH
+    base_path, extension = os.path.splitext(MODEL_SAVE_PATH)
+    return f'{base_path}_{variant_name()}{extension}'
+
+def register_model(model_path, metrics=None, registry_dir=MODEL_REGISTRY_DIR):
+    """
+    Copie le modèle dans le registre versionné (un dossier par version + metadata.json)
+    Activer ensuite la version avec POST /reload-model {"version": ...}
+    """
+    version = datetime.now().strftime('v%Y%m%d-%H%M%S')
+    version_dir = os.path.join(registry_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+    shutil.copy2(model_path, os.path.join(version_dir, 'model.h5'))
+
+    metadata = {
+        'version': version,
+        'created_at': datetime.now().isoformat(),
+        'source': os.path.abspath(model_path),
+        'classes': CLASSES,
+        'input_size': list(IMG_SIZE),
+        'alpha': ALPHA,
+        'variant': variant_name(),
+        'artifacts': {'keras': 'model.h5'},
+        'metrics': metrics or {}
+    }
+    with open(os.path.join(version_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"📚 Version enregistrée: {version} ({version_dir})")
+    return version
+
+# ═══════════════════════════════════════════════════════════
+# MULTI-CŒURS, PRÉCISION MIXTE ET FINE-TUNING
+# ═══════════════════════════════════════════════════════════
+
+def cpu_supports_bfloat16():
+    """Instructions bfloat16 natives (AVX512-BF16 / AMX) : sinon bfloat16 est plus lent que float32"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def configure_precision(precision):
+    """Politique Keras globale ; retourne la précision effective"""
+    if precision == 'bfloat16' and not cpu_supports_bfloat16():
+        print("⚠️ CPU sans bfloat16 natif : entraînement en float32")
+        precision = 'float32'
+    keras.mixed_precision.set_global_policy('mixed_bfloat16' if precision == 'bfloat16' else 'float32')
+    return precision
+
+def cluster_spec():
+    """(nombre de processus, index de ce processus) d'après TF_CONFIG (1, 0 sans cluster)"""
+    tf_config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+    workers = tf_config.get('cluster', {}).get('worker', [])
+    return max(1, len(workers)), tf_config.get('task', {}).get('index', 0)
+
+def configure_cpu(replicas=1):
+    """
+    À appeler avant toute opération TensorFlow : répartit les cœurs entre processus et
+    réplicas, et découpe le CPU en `replicas` périphériques logiques (MirroredStrategy)
+    """
+    workers, _ = cluster_spec()
+    threads = max(1, (os.cpu_count() or 1) // (workers * replicas))
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(max(2, replicas))
+    if replicas > 1:
+        cpu = tf.config.list_physical_devices('CPU')[0]
+        tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * replicas)
+    return threads
+
+def create_strategy(replicas=1):
+    """MultiWorkerMirroredStrategy si TF_CONFIG est défini, MirroredStrategy sur CPU logiques, sinon défaut"""
+    if cluster_spec()[0] > 1:
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    if replicas > 1:
+        return tf.distribute.MirroredStrategy([f'/cpu:{i}' for i in range(replicas)])
+    return tf.distribute.get_strategy()
+
+def launch_local_workers(num_workers, argv):
+    """Relance ce script dans `num_workers` processus locaux (MultiWorkerMirroredStrategy)"""
+    ports = []
+    for _ in range(num_workers):
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            ports.append(sock.getsockname()[1])
+    cluster = {'worker': [f'localhost:{port}' for port in ports]}
+
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}}))
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv], env=env))
+    print(f"🧵 {num_workers} processus d'entraînement locaux ({', '.join(cluster['worker'])})")
+    return max(process.wait() for process in processes)
+
+def scaled_learning_rate(base_lr, batch_size, rule='sqrt'):
+    """Taux d'apprentissage pour un lot global `batch_size` (référence : BATCH_SIZE)"""
+    ratio = batch_size / BATCH_SIZE
+    if rule == 'linear':
+        return base_lr * ratio
+    if rule == 'sqrt':
+        return base_lr * ratio ** 0.5
+    return base_lr
+
+def copy_weights(source, target):
+    """Copie couche à couche (indépendante de l'état gelé/dégelé et de la précision des couches)"""
+    for source_layer, target_layer in zip(source.layers, target.layers):
+        if getattr(source_layer, 'layers', None):
+            copy_weights(source_layer, target_layer)
+        else:
+            target_layer.set_weights(source_layer.get_weights())
+
+def unfreeze_top_layers(model, count):
+    """Dégèle les `count` dernières couches du backbone (BatchNormalization restent gelées)"""
+    backbone = model.layers[0]
+    backbone.trainable = True
+    for layer in backbone.layers[:-count]:
+        layer.trainable = False
+    for layer in backbone.layers[-count:]:
+        if isinstance(layer, layers.BatchNormalization):
+            layer.trainable = False
+    return sum(layer.trainable for layer in backbone.layers)
+
+def export_float32(model, model_path):
+    """Sauvegarde un modèle float32 (app.py charge le .h5 sans politique de précision mixte)"""
+    if keras.mixed_precision.global_policy().name != 'float32':
+        keras.mixed_precision.set_global_policy('float32')
+        exported = create_model(len(CLASSES))
+        copy_weights(model, exported)
+        model = exported
+    model.save(model_path)
+
+class EpochTimer(keras.callbacks.Callback):
+    """Durée réelle de chaque époque et débit d'entraînement (images/s)"""
+
+    def __init__(self, phase, batch_size):
+        super().__init__()
+        self.phase = phase
+        self.batch_size = batch_size
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+        self.steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self.started
+        logs = logs or {}
+        self.epochs.append({
+            'epoch': epoch + 1,
+            'seconds': round(seconds, 2),
+            'images_per_s': round(self.steps * self.batch_size / seconds, 1),
+            'val_accuracy': float(logs['val_accuracy']) if 'val_accuracy' in logs else None
+        })
+        print(f"\n⏱️ [{self.phase}] époque {epoch + 1}: {seconds:.1f}s "
+              f"({self.epochs[-1]['images_per_s']} images/s)")
+
+    def summary(self):
+        seconds = [epoch['seconds'] for epoch in self.epochs]
+        val_accuracy = [epoch['val_accuracy'] for epoch in self.epochs if epoch['val_accuracy'] is not None]
+        return {
+            'phase': self.phase,
+            'epochs': len(self.epochs),
+            'total_seconds': round(sum(seconds), 2),
+            'mean_epoch_seconds': round(sum(seconds) / len(seconds), 2) if seconds else None,
+            'best_val_accuracy': max(val_accuracy) if val_accuracy else None,
+            'per_epoch': self.epochs
+        }
+
+def phase_callbacks(model_path, save=True):
+    callbacks = [
+        keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True),
+        keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3)
+    ]
+    if save:
+        callbacks.append(keras.callbacks.ModelCheckpoint(model_path, monitor='val_accuracy', save_best_only=True))
+    return callbacks
+
+def fine_tune(model, train_data, val_data, epochs, initial_epoch, learning_rate,
+              layers_to_unfreeze=FINE_TUNE_LAYERS, strategy=None, batch_size=BATCH_SIZE):
+    """
+    Seconde phase : haut du backbone dégelé, taux d'apprentissage faible
+    Le modèle est reconstruit dans le scope de la stratégie (variables distribuées)
+    """
+    strategy = strategy or tf.distribute.get_strategy()
+    with strategy.scope():
+        tuned = create_model(len(CLASSES))
+        copy_weights(model, tuned)
+        trainable = unfreeze_top_layers(tuned, layers_to_unfreeze)
+        tuned.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+    print(f"\n🔓 Fine-tuning : {trainable} couches du backbone dégelées, lr={learning_rate:g}")
+
+    timer = EpochTimer('fine-tuning', batch_size)
+    history = tuned.fit(
+        train_data,
+        epochs=initial_epoch + epochs,
+        initial_epoch=initial_epoch,
+        validation_data=val_data,
+        callbacks=[*phase_callbacks(None, save=False), timer]
+    )
+    return tuned, history, timer
+
+def train_model(pipeline='tfdata', dataset_path=DATASET_PATH, epochs=EPOCHS, cache_dir=CACHE_DIR,
+                feature_dir=FEATURE_DIR, augmentations=FEATURE_AUGMENTATIONS, batch_size=BATCH_SIZE,
+                fine_tune_epochs=0, fine_tune_layers=FINE_TUNE_LAYERS, lr_scaling='sqrt',
+                strategy=None, model_path=None, register=True, report_path=None, shards_dir=None):
+    """
+    Entraîner le modèle (pipeline 'tfdata', 'features' ou ancien 'generator')
+    puis, si fine_tune_epochs > 0, affiner le haut du backbone
+    `strategy` : tf.distribute (réplicas CPU / processus locaux), `batch_size` : lot global
+    `shards_dir` : images lues dans les shards de dataset_shards.py au lieu de `dataset_path`
+    """
+    strategy = strategy or tf.distribute.get_strategy()
+    workers, worker_index = cluster_spec()
+    chief = worker_index == 0
+    model_path = model_path or variant_model_path()
+    if not chief:
+        # MultiWorkerMirroredStrategy : tous les processus sauvegardent, seul le chef au bon endroit
+        model_path = os.path.join(tempfile.mkdtemp(prefix=f'worker{worker_index}-'), os.path.basename(model_path))
+    if workers > 1:
+        # Caches tf.data / features propres à chaque processus
+        cache_dir = os.path.join(cache_dir, f'worker{worker_index}') if cache_dir else cache_dir
+        feature_dir = os.path.join(feature_dir, f'worker{worker_index}')
+    if pipeline == 'generator' and strategy.num_replicas_in_sync > 1:
+        raise ValueError("Stratégie distribuée : utiliser le pipeline 'tfdata' ou 'features'")
+    if pipeline == 'generator' and shards_dir:
+        raise ValueError("Shards : utiliser le pipeline 'tfdata' ou 'features'")
+
+    learning_rate = scaled_learning_rate(LEARNING_RATE, batch_size, lr_scaling)
+    # Politique fixée par configure_precision(), lue avant export_float32() qui la remet à float32
+    precision = keras.mixed_precision.global_policy().name
+    print(f"📐 Variante {variant_name()} : entrée {IMG_SIZE[0]}x{IMG_SIZE[1]}, alpha {ALPHA:g}")
+    print(f"⚙️ {strategy.num_replicas_in_sync} réplica(s) sur {workers} processus, lot global {batch_size}, "
+          f"lr {learning_rate:g}, précision {precision}")
+
+    started = time.perf_counter()
+    timers = []
+    metrics = {}
+
+    # Le .h5 du checkpoint n'est gardé tel quel que sans fine-tuning ni précision mixte
+    export = pipeline == 'features' or fine_tune_epochs or precision != 'float32'
+
+    if pipeline == 'features':
+        # Tête entraînée localement sur les embeddings (rapide) ; seul le fine-tuning est distribué
+        timer = EpochTimer('head (features)', batch_size)
+        model, history = train_head(dataset_path, epochs, feature_dir, augmentations, batch_size,
+                                    learning_rate, [timer], shards_dir)
+        timers.append(timer.summary())
+        metrics.update(pipeline='features', feature_augmentations=augmentations)
+    else:
+        # Prétraitement et augmentation
+        if pipeline == 'generator':
+            train_data, val_data = load_generators(dataset_path, batch_size)
+        else:
+            train_data, val_data = load_datasets(dataset_path, cache_dir, batch_size, shards_dir)
+
+        with strategy.scope():
+            model = create_model(len(CLASSES))
+            model.compile(
+                optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+                loss='categorical_crossentropy',
+                metrics=['accuracy']
+            )
+
+        timer = EpochTimer('head', batch_size)
+        history = model.fit(
+            train_data,
+            epochs=epochs,
+            validation_data=val_data,
+            callbacks=[*phase_callbacks(model_path, save=not export), timer]
+        )
+        timers.append(timer.summary())
+
+    if fine_tune_epochs:
+        if pipeline == 'features':
+            train_data, val_data = load_datasets(dataset_path, cache_dir, batch_size, shards_dir)
+        fine_tune_lr = scaled_learning_rate(FINE_TUNE_LEARNING_RATE, batch_size, lr_scaling)
+        model, history, timer = fine_tune(model, train_data, val_data, fine_tune_epochs,
+                                          len(history.history['val_accuracy']), fine_tune_lr,
+                                          fine_tune_layers, strategy, batch_size)
+        timers.append(timer.summary())
+        metrics.update(fine_tune_epochs=timer.summary()['epochs'], fine_tune_layers=fine_tune_layers)
+
+    if export:
+        export_float32(model, model_path)
+    print(f"\n✅ Modèle sauvegardé: {model_path}")
+
+    total_seconds = time.perf_counter() - started
+    final_accuracy = float(max(history.history['val_accuracy']))
+    report = {
+        'variant': variant_name(),
+        'pipeline': pipeline,
+        'shards': shards_dir,
+        'replicas': strategy.num_replicas_in_sync,
+        'workers': workers,
+        'precision': precision,
+        'batch_size': batch_size,
+        'learning_rate': learning_rate,
+        'lr_scaling': lr_scaling,
+        'phases': timers,
+        'total_seconds': round(total_seconds, 2),
+        'final_val_accuracy': final_accuracy
+    }
+
+    print(f"\n{'Phase':<18} {'Époques':>8} {'Total':>9} {'s/époque':>9} {'Val. acc.':>10}")
+    for phase in timers:
+        mean = phase.get('mean_epoch_seconds')
+        print(f"{phase['phase']:<18} {phase['epochs']:>8} {phase['total_seconds']:>8.1f}s "
+              f"{(f'{mean:.1f}s' if mean else '-'):>9} {phase['best_val_accuracy']:>10.2%}")
+    print(f"⏱️ Total {total_seconds:.1f}s, précision de validation finale {final_accuracy:.2%}")
+
+    if chief:
+        report_path = report_path or os.path.splitext(model_path)[0] + '_training.json'
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if register:
+            register_model(model_path, {
+                'val_accuracy': final_accuracy,
+                'epochs': sum(phase['epochs'] for phase in timers),
+                'training_seconds': round(total_seconds, 2),
+                'batch_size': batch_size,
+                'replicas': strategy.num_replicas_in_sync,
+                'precision': precision,
+                **metrics
+            })
     return model, history
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Entraînement du modèle de détection des maladies de la tomate")
+    parser.add_argument('--pipeline', choices=['tfdata', 'features', 'generator'], default='tfdata',
+                        help="'features' : backbone gelé exécuté une fois, tête entraînée sur les embeddings")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="cache disque tf.data ('' = cache mémoire)")
+    parser.add_argument('--feature-dir', default=FEATURE_DIR, help="feature store du pipeline 'features'")
+    parser.add_argument('--augmentations', type=int, default=FEATURE_AUGMENTATIONS,
+                        help="variantes augmentées précalculées par image (pipeline 'features')")
+    parser.add_argument('--image-size', type=int, choices=MOBILENET_SIZES, default=IMG_SIZE[0],
+                        help="résolution d'entrée (carrée) ; le coût de MobileNetV2 suit la surface")
+    parser.add_argument('--alpha', type=float, choices=MOBILENET_ALPHAS, default=ALPHA,
+                        help="largeur de MobileNetV2 (0.35 à 1.4)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="taille de lot globale")
+    parser.add_argument('--lr-scaling', choices=['sqrt', 'linear', 'none'], default='sqrt',
+                        help="mise à l'échelle du taux d'apprentissage avec le lot (référence BATCH_SIZE)")
+    parser.add_argument('--fine-tune-epochs', type=int, default=0, help="époques de fine-tuning (0 = désactivé)")
+    parser.add_argument('--fine-tune-layers', type=int, default=FINE_TUNE_LAYERS,
+                        help="couches du haut du backbone dégelées pendant le fine-tuning")
+    parser.add_argument('--replicas', type=int, default=1,
+                        help="réplicas MirroredStrategy sur CPU logiques (cœurs répartis entre eux)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processus locaux (MultiWorkerMirroredStrategy)")
+    parser.add_argument('--precision', choices=['float32', 'bfloat16'], default='float32',
+                        help="bfloat16 : précision mixte si le CPU la supporte nativement")
+    parser.add_argument('--model-path', default=None, help="chemin du .h5 (défaut : selon la variante)")
+    parser.add_argument('--report', default=None, help="rapport JSON (défaut : <modèle>_training.json)")
+    parser.add_argument('--no-register', action='store_true', help="ne pas enregistrer dans le registre")
+    parser.add_argument('--shards', default=None,
+                        help="dataset préparé par dataset_shards.py (remplace --dataset et le cache tf.data)")
+    args = parser.parse_args()
+
+    if args.workers > 1 and 'TF_CONFIG' not in os.environ:
+        sys.exit(launch_local_workers(args.workers, sys.argv[1:]))
+
+    # Variante : lue par les fonctions ci-dessus (backbone, caches, chemin du modèle, métadonnées)
+    IMG_SIZE = (args.image_size, args.image_size)
+    ALPHA = args.alpha
+
+    # Avant toute opération TensorFlow : threads, CPU logiques, stratégie et précision
+    threads = configure_cpu(args.replicas)
+    strategy = create_strategy(args.replicas)
+    precision = configure_precision(args.precision)
+    print(f"🧮 {threads} thread(s) intra-op par réplica, précision {precision}")
+
     print("🚀 Début entraînement modèle tomate...")
-    model, history = train_model()
+    model, history = train_model(
+        args.pipeline, args.dataset, args.epochs, args.cache_dir, args.feature_dir, args.augmentations,
+        batch_size=args.batch_size, fine_tune_epochs=args.fine_tune_epochs,
+        fine_tune_layers=args.fine_tune_layers, lr_scaling=args.lr_scaling, strategy=strategy,
+        model_path=args.model_path, register=not args.no_register, report_path=args.report,
+        shards_dir=args.shards
+    )